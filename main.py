@@ -1,5 +1,8 @@
 if __name__ == '__main__':
 
     import sys
+    # Imported first to measure the time of the other imports
+    from tlh.common import startup_profiler
     from tlh import app
+    startup_profiler.add_milestone('imports')
     sys.exit(app.run())
@@ -0,0 +1,245 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+import json
+import multiprocessing
+import os
+import sys
+from typing import Dict, List, Optional, Set, TextIO, Tuple
+from tlh.const import CUSTOM_MAP_FILES, RomVariant
+
+# Statistics about how much of the code is still assembly, calculated from the .map files of the builds.
+# Each .map file is parsed once into a MapModel that is reused until the file changes.
+
+# Older builds write the map of the USA variant into the root of the repo
+FALLBACK_MAP_FILE = 'tmc.map'
+
+HANDWRITTEN_FILES = {
+    'asm/crt0.o',
+    'asm/veneer.o',
+    'data/data_08000360.o',
+    'asm/code_08000E44.o',
+    'asm/lib/libgcc.o',
+    'asm/code_08000F10.o',
+    'data/data_08000F54.o',
+    'asm/enemy.o',
+    'src/droptables.o',
+    'asm/code_08001A7C.o',
+    'data/gfx/sprite_ptrs.o',
+    'asm/code_08003FC4.o',
+    'asm/code_080043E8.o',
+    'data/gfx/link_animations.o',
+    'asm/code_08007CAC.o',
+    'data/data_08007DF4.o',
+    'asm/player.o',
+    'asm/intr.o',
+    'asm/lib/m4a_asm.o',
+    'asm/lib/libagbsyscall.o',
+}
+
+
+@dataclass
+class MapSection:
+    section: str
+    size: int
+    # Path of the object file relative to the build folder
+    path: str
+
+
+@dataclass
+class MapSymbol:
+    name: str
+    address: int
+    # Distance to the next symbol, None for the last symbol
+    size: Optional[int]
+    # Object file of the section that contains the symbol
+    path: str
+
+
+@dataclass
+class MapModel:
+    sections: List[MapSection] = field(default_factory=list)
+    symbols: List[MapSymbol] = field(default_factory=list)
+
+
+@dataclass
+class AsmFile:
+    folder: str
+    name: str
+    size: int
+
+
+@dataclass
+class AsmStats:
+    src: int = 0
+    asm: int = 0
+    src_data: int = 0
+    data: int = 0
+    non_matching: int = 0
+    asm_funcs: int = 0
+    handwritten: int = 0
+    asm_files: List[AsmFile] = field(default_factory=list)
+
+
+def strip_build_folder(path: str) -> str:
+    '''
+    Turns build/USA/src/player.o into src/player.o
+    '''
+    parts = path.split('/')
+    if parts[0] == 'build' and len(parts) > 2:
+        return '/'.join(parts[2:])
+    return path
+
+
+def parse_map(path: str) -> MapModel:
+    '''
+    Parses the sections and symbols of the rom from the linker script section of the map file.
+    '''
+    model = MapModel()
+    with open(path, 'r') as map:
+        # Skip to the linker script section
+        for line in map:
+            if line.startswith('Linker script and memory map'):
+                break
+        for line in map:
+            if line.startswith('rom'):
+                break
+
+        current_path = ''
+        previous: Optional[MapSymbol] = None
+        for line in map:
+            if line.startswith(' .'):
+                arr = line.split()
+                if len(arr) < 4:
+                    # Section names that are too long are continued on the next line
+                    continue
+                current_path = strip_build_folder(arr[3])
+                model.sections.append(MapSection(arr[0], int(arr[2], 16), current_path))
+            elif line.startswith('  '):
+                arr = line.split()
+                if len(arr) == 2:
+                    symbol = MapSymbol(arr[1], int(arr[0], 16), None, current_path)
+                    if previous is not None:
+                        previous.size = symbol.address - previous.address
+                    model.symbols.append(symbol)
+                    previous = symbol
+            elif line.strip() == '':
+                # End of linker script section
+                break
+    return model
+
+
+# (path, modification time) -> parsed map
+map_cache: Dict[Tuple[str, int], MapModel] = {}
+
+
+def get_map_models(paths: List[str]) -> Dict[str, MapModel]:
+    '''
+    Returns the models of the map files and parses the ones that changed in parallel.
+    '''
+    keys = {path: (path, os.stat(path).st_mtime_ns) for path in paths}
+    missing = [path for path in paths if keys[path] not in map_cache]
+    if len(missing) == 1:
+        map_cache[keys[missing[0]]] = parse_map(missing[0])
+    elif len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=len(missing), mp_context=multiprocessing.get_context('spawn')) as executor:
+            for (path, model) in zip(missing, executor.map(parse_map, missing)):
+                map_cache[keys[path]] = model
+    return {path: map_cache[keys[path]] for path in paths}
+
+
+def calc_stats(model: MapModel, non_matching_funcs: Set[str], asm_funcs: Set[str]) -> AsmStats:
+    stats = AsmStats()
+    # Asm files by (folder, name)
+    asm_files: Dict[Tuple[str, str], AsmFile] = {}
+
+    def add_asm_file(path: str, size: int) -> None:
+        key = (os.path.dirname(path), os.path.basename(path))
+        if key not in asm_files:
+            asm_files[key] = AsmFile(key[0], key[1], 0)
+        asm_files[key].size += size
+
+    for section in model.sections:
+        dir = section.path.split('/')[0]
+        if section.section == '.text':
+            if dir == 'src':
+                stats.src += section.size
+            elif dir == 'asm':
+                if section.path.startswith('asm/src/') or section.path.startswith('asm/lib/'):
+                    stats.src += section.size
+                elif section.path in HANDWRITTEN_FILES:
+                    stats.handwritten += section.size
+                else:
+                    add_asm_file(section.path, section.size)
+                    stats.asm += section.size
+            elif dir == 'data':
+                # scripts
+                stats.src_data += section.size
+            elif dir == '..':
+                # libc
+                stats.src += section.size
+        elif section.section == '.rodata':
+            if dir == 'src':
+                stats.src_data += section.size
+            elif dir == 'data':
+                stats.data += section.size
+
+    for symbol in model.symbols:
+        if symbol.size is None:
+            continue
+        if symbol.name in non_matching_funcs:
+            stats.non_matching += symbol.size
+        elif symbol.name in asm_funcs:
+            stats.asm_funcs += symbol.size
+        else:
+            continue
+        add_asm_file(symbol.path, symbol.size)
+
+    stats.src -= stats.non_matching + stats.asm_funcs
+    stats.asm += stats.non_matching + stats.asm_funcs
+    stats.asm_files = list(asm_files.values())
+    return stats
+
+
+def get_map_file(repo_location: str, variant: RomVariant) -> Optional[str]:
+    path = os.path.join(repo_location, CUSTOM_MAP_FILES[variant])
+    if not os.path.isfile(path) and variant == RomVariant.CUSTOM:
+        path = os.path.join(repo_location, FALLBACK_MAP_FILE)
+    return path if os.path.isfile(path) else None
+
+
+def calc_stats_for_variants(repo_location: str, non_matching_funcs: Set[str], asm_funcs: Set[str], variants: List[RomVariant] = list(CUSTOM_MAP_FILES)) -> Dict[RomVariant, AsmStats]:
+    '''
+    Calculates the stats for all variants whose map file exists.
+    '''
+    paths = {variant: get_map_file(repo_location, variant) for variant in variants}
+    paths = {variant: path for (variant, path) in paths.items() if path is not None}
+    models = get_map_models(list(paths.values()))
+    return {variant: calc_stats(models[path], non_matching_funcs, asm_funcs) for (variant, path) in paths.items()}
+
+
+def write_json(stats: Dict[RomVariant, AsmStats], file: TextIO) -> None:
+    '''
+    Writes the stats with sorted keys and files, so that the output of different commits can be diffed.
+    '''
+    data = {}
+    for (variant, variant_stats) in stats.items():
+        variant_data = asdict(variant_stats)
+        variant_data['asm_files'] = sorted(variant_data['asm_files'], key=lambda file: (file['folder'], file['name']))
+        data[variant.value] = variant_data
+    json.dump(data, file, indent=2, sort_keys=True)
+    file.write('\n')
+
+
+def main():
+    # Usage: python -m plugins.asm_stats.stats <repo> prints the stats of all builds as JSON
+    repo_location = sys.argv[1] if len(sys.argv) > 1 else '.'
+    # Imported here, so that the processes parsing the map files do not need to load Qt
+    from tlh.data.repo_index import RepoIndex
+    index = RepoIndex(repo_location)
+    non_matching_funcs = {func for (_, func) in index.get_nonmatching_funcs()}
+    asm_funcs = {func for (_, func) in index.get_asm_funcs()}
+    write_json(calc_stats_for_variants(repo_location, non_matching_funcs, asm_funcs), sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,22 +3,20 @@ import traceback
 from PySide6.QtGui import QKeySequence
 from plugins.cexplore_bridge.ghidra import improve_decompilation, read_signatures_from_file
 from plugins.cexplore_bridge.code import TypeDefinition, extract_USA_asm, find_globals, get_code, split_code, store_code
-from PySide6.QtCore import QThread, Qt, Signal
+from PySide6.QtCore import Qt, Signal
 from PySide6.QtWidgets import QApplication, QDialog, QDialogButtonBox, QDockWidget
 from plugins.cexplore_bridge.link import generate_cexplore_url
 from tlh.common.ui.close_dock import CloseDock
 from tlh.const import RomVariant
 from tlh.data.database import get_symbol_database
+from tlh.data.repo_index import get_repo_index
 from tlh.data.rom import get_rom
 from tlh.plugin.api import PluginApi
 from tlh.plugin.loader import get_plugin
 from tlh.ui.ui_plugin_cexplore_bridge_dock import Ui_BridgeDock
-from plugins.cexplore_bridge.server import ServerWorker
+from plugins.cexplore_bridge.server import CExploreServer
 import requests
 from tlh.ui.ui_plugin_cexplore_bridge_received_code_dialog import Ui_ReceivedCodeDialog
-import os
-import re
-from tlh import settings
 
 # Set this to true if you know what you are doing and want to skip all confirm dialogs and confirmation messages
 NO_CONFIRMS = False
@@ -96,30 +94,10 @@ class CExploreBridgePlugin:
         self.api.show_message(self.name, 'Wrote to tmp/asm_funcs.html')
 
     def collect_non_matching_funcs(self):
-        result = []
-        src_folder = os.path.join(settings.get_repo_location(), 'src')
-        for root, dirs, files in os.walk(src_folder):
-            for file in files:
-                if file.endswith('.c'):
-                    with open(os.path.join(root, file), 'r') as f:
-                        data = f.read()
-                        # Find all NONMATCH macros
-                        for match in re.findall(r'NONMATCH\(".*",(?: static)?\W*\w*\W*(\w*).*\)', data):
-                            result.append((os.path.relpath(os.path.join(root,file), src_folder), match))
-        return result
+        return get_repo_index().get_nonmatching_funcs()
 
     def collect_asm_funcs(self):
-        result = []
-        src_folder = os.path.join(settings.get_repo_location(), 'src')
-        for root, dirs, files in os.walk(src_folder):
-            for file in files:
-                if file.endswith('.c'):
-                    with open(os.path.join(root, file), 'r') as f:
-                        data = f.read()
-                        # Find all ASM_FUNC macros
-                        for match in re.findall(r'ASM_FUNC\(".*",(?: static)?\W*\w*\W*(\w*).*\)', data):
-                            result.append((os.path.relpath(os.path.join(root,file), src_folder), match))
-        return result
+        return get_repo_index().get_asm_funcs()
 
 class BridgeDock(CloseDock):
 
@@ -128,7 +106,16 @@ class BridgeDock(CloseDock):
         self.api = api
         self.ui = Ui_BridgeDock()
         self.ui.setupUi(self)
-        self.server_thread = None
+        self.server = CExploreServer()
+        self.server.on('connect', lambda data: self.slot_connected())
+        self.server.on('disconnect', lambda data: self.slot_disconnected())
+        self.server.on('c_code', self.slot_received_c_code)
+        self.server.on('extract_data', self.slot_extract_data)
+        self.server.on('fetch_decompilation', self.slot_fetch_decompilation)
+        self.server.on('upload_function', self.slot_download_requested)
+        self.server.signal_error.connect(self.slot_error)
+        self.server.signal_started.connect(self.slot_server_started)
+        self.server.signal_stopped.connect(self.slot_server_stopped)
 
         self.symbols = None
         self.rom = None
@@ -162,20 +149,7 @@ class BridgeDock(CloseDock):
             self.ui.pushButtonStopServer.setVisible(False)
 
     def slot_start_server(self) -> None:
-        self.server_thread = QThread()
-        self.server_worker = ServerWorker()
-        self.server_worker.signal_connected.connect(self.slot_connected)
-        self.server_worker.signal_disconnected.connect(self.slot_disconnected)
-        self.server_worker.signal_error.connect(self.slot_error)
-        self.server_worker.signal_c_code.connect(self.slot_received_c_code)
-        self.server_worker.signal_started.connect(self.slot_server_started)
-        self.server_worker.signal_shutdown.connect(self.slot_server_stopped)
-        self.server_worker.signal_extract_data.connect(self.slot_extract_data)
-        self.server_worker.signal_fetch_decompilation.connect(self.slot_fetch_decompilation)
-        self.server_worker.signal_upload_function.connect(self.slot_download_requested)
-        self.server_worker.moveToThread(self.server_thread)
-        self.server_thread.started.connect(self.server_worker.process)
-        self.server_thread.start()
+        self.server.start()
         self.slot_server_running(True)
 
     def enable_function_group(self, enabled: bool) -> None:
@@ -187,8 +161,7 @@ class BridgeDock(CloseDock):
         self.ui.pushButtonUploadAndDecompile.setEnabled(enabled)
 
     def slot_stop_server(self) -> None:
-        # Shutdown needs to be triggered by the server thread, so send a request
-        requests.get('http://localhost:10241/shutdown')
+        self.server.stop()
 
     def slot_upload_function(self) -> None:
         self.upload_function(True)
@@ -207,8 +180,8 @@ class BridgeDock(CloseDock):
             #self.apply_function_signature(self.ui.lineEditFunctionName.text().strip(), signature)
 
         if NO_CONFIRMS or self.api.show_question('CExplore Bridge', f'Replace code in CExplore with {self.ui.lineEditFunctionName.text().strip()}?'):
-            self.server_worker.slot_send_asm_code(extract_USA_asm(asm))
-            self.server_worker.slot_send_c_code(src)
+            self.server.slot_send_asm_code(extract_USA_asm(asm))
+            self.server.slot_send_c_code(src)
             if not NO_CONFIRMS:
                 self.api.show_message(
                     'CExplore Bridge', f'Uploaded code of {self.ui.lineEditFunctionName.text().strip()}.')
@@ -221,7 +194,7 @@ class BridgeDock(CloseDock):
 
     def slot_download_function(self) -> None:
         self.enable_function_group(False)
-        self.server_worker.slot_request_c_code()
+        self.server.slot_request_c_code()
 
     def slot_received_c_code(self, code: str) -> None:
 
@@ -272,14 +245,12 @@ class BridgeDock(CloseDock):
 
     def slot_server_stopped(self) -> None:
         self.slot_server_running(False)
-        self.server_thread.terminate()
         self.enable_function_group(False)
         self.ui.pushButtonCopyJs.setVisible(True)
         self.ui.labelConnectionStatus.setText('Server stopped.')
 
     def slot_error(self, error: str) -> None:
         self.slot_server_running(False)
-        self.server_thread.terminate()
         self.enable_function_group(False)
         self.ui.pushButtonCopyJs.setVisible(True)
         self.api.show_error('CExplore Bridge', error)
@@ -305,7 +276,7 @@ class BridgeDock(CloseDock):
                 return
             result = r.text
             code = improve_decompilation(result)
-            self.server_worker.slot_add_c_code(code)
+            self.server.slot_add_c_code(code)
         except requests.exceptions.RequestException as e:
             self.api.show_error('CExplore Bridge', 'Could not reach Ghidra server. Did you start the script?')
         except Exception as e:
@@ -367,28 +338,28 @@ class BridgeDock(CloseDock):
             # First need to load symbols
             self.symbols = get_symbol_database().get_symbols(RomVariant.CUSTOM)
             if self.symbols is None:
-                self.server_worker.slot_extracted_data({'status': 'error', 'text': 'No symbols for rom CUSTOM loaded'})
+                self.server.slot_extracted_data({'status': 'error', 'text': 'No symbols for rom CUSTOM loaded'})
                 return
 
         if self.data_extractor_plugin is None:
             self.data_extractor_plugin = get_plugin('data_extractor', 'DataExtractorPlugin')
             if self.data_extractor_plugin is None:
-                self.server_worker.slot_extracted_data({'status': 'error', 'text': 'Data Extractor plugin not loaded'})
+                self.server.slot_extracted_data({'status': 'error', 'text': 'Data Extractor plugin not loaded'})
                 return
 
         if self.rom is None:
             self.rom = get_rom(RomVariant.CUSTOM)
             if self.rom is None:
-                self.server_worker.slot_extracted_data({'status': 'error', 'text': 'CUSTOM rom could not be loaded'})
+                self.server.slot_extracted_data({'status': 'error', 'text': 'CUSTOM rom could not be loaded'})
                 return
 
         try:
             result = self.data_extractor_plugin.instance.extract_data(text, self.symbols, self.rom)
             if result is not None:
-                self.server_worker.slot_extracted_data({'status': 'ok', 'text': result})
+                self.server.slot_extracted_data({'status': 'ok', 'text': result})
         except Exception as e:
             traceback.print_exc()
-            self.server_worker.slot_extracted_data({'status': 'error', 'text': str(e)}) 
+            self.server.slot_extracted_data({'status': 'error', 'text': str(e)}) 
 
 
 class ReceivedDialog(QDialog):
@@ -1,29 +1,18 @@
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
+from tlh.data.repo_index import get_repo_index
 from tlh.settings import get_repo_location
 import os
 import re
 
 
 def find_inc_file(name: str) -> Optional[str]:
-    filename = name + '.inc'
-    search_path = os.path.join(get_repo_location(), 'asm', 'non_matching')
-    for root, dirs, files in os.walk(search_path):
-        if filename in files:
-            return os.path.join(root, filename)
-    return None
+    return get_repo_index().find_inc_file(name)
 
 
 def find_source_file(name: str) -> Optional[str]:
     # Get the source file from tmc.map
-    with open(os.path.join(get_repo_location(), 'tmc.map'), 'r') as f:
-        current_file = None
-        for line in f:
-            if line.startswith(' .text'):
-                current_file = line.split()[3]
-            elif line.strip().endswith(' ' + name):
-                return current_file[0:-2] + '.c'
-        return None
+    return get_repo_index().find_source_file(name)
 
 
 def extract_nonmatching_section(inc_path: str, src_file: str, include_function: bool) -> Tuple[Optional[str], str]:
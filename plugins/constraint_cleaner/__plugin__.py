@@ -1,9 +1,11 @@
 from PySide6.QtCore import QObject, QThread, Signal
 from PySide6.QtWidgets import QMessageBox
 from tlh.const import RomVariant
-from tlh.data.constraints import ConstraintManager, InvalidConstraintError
+from tlh.data.constraints import Constraint, InvalidConstraintError
 from tlh.plugin.api import PluginApi
 from tlh.data.database import get_constraint_database
+from typing import List
+from plugins.constraint_cleaner.cleaner import find_duplicate_constraints, find_invalid_constraint, find_redundant_constraints, find_unfulfilled_constraints, solve
 
 class ConstraintCleanerPlugin:
     name = 'Constraint Cleaner'
@@ -14,16 +16,24 @@ class ConstraintCleanerPlugin:
         self.api = api
 
     def load(self) -> None:
-        #self.action_remove_duplicate = self.api.register_menu_entry('Remove duplicate constraints', self.slot_remove_duplicate)
+        self.action_remove_duplicate = self.api.register_menu_entry('Remove duplicate constraints', self.slot_remove_duplicate)
         self.action_remove_redundant = self.api.register_menu_entry('Remove redundant constraints', self.slot_remove_redundant)
 
     def unload(self) -> None:
-        #self.api.remove_menu_entry(self.action_remove_duplicate)
+        self.api.remove_menu_entry(self.action_remove_duplicate)
         self.api.remove_menu_entry(self.action_remove_redundant)
 
     def slot_remove_duplicate(self) -> None:
-        # TODO
-        pass
+        '''
+        Removes all constraints that link the same addresses as another constraint
+        '''
+        constraint_database = get_constraint_database()
+        duplicates = find_duplicate_constraints(constraint_database.get_constraints())
+        if len(duplicates) == 0:
+            self.api.show_message('Constraint Cleaner', 'There are no duplicate constraints.')
+            return
+        if self.api.show_question('Constraint Cleaner', f'Remove {len(duplicates)} duplicate constraints?'):
+            constraint_database.remove_constraints(duplicates)
 
     def slot_remove_redundant(self) -> None:
         '''
@@ -58,86 +68,47 @@ class RemoveRedundantWorker(QObject):
     signal_progress = Signal(int)
     signal_done = Signal()
     signal_fail = Signal()
-    
-    def process(self) -> None:
-        print('Start processing')
-
-        progress = 0
 
+    def process(self) -> None:
         # Test using a constraint manager with all variations
-        manager = ConstraintManager(
-            {RomVariant.USA, RomVariant.JP, RomVariant.EU, RomVariant.DEMO, RomVariant.DEMO_JP})
+        variants = [RomVariant.USA, RomVariant.JP, RomVariant.EU, RomVariant.DEMO, RomVariant.DEMO_JP]
         constraint_database = get_constraint_database()
-        constraints = constraint_database.get_constraints()
-
-        i = 0
-        count = len(constraints)
-
-
-        for constraint in constraints:
-            if not constraint.enabled:
-                i = i + 1
-                continue
-
-            # test if constraint is redundant
-            va_a = manager.to_virtual(constraint.romA, constraint.addressA)
-            va_b = manager.to_virtual(constraint.romB, constraint.addressB)
-            if va_a == va_b:
-                print(f'Disable {constraint}')
-                constraint.enabled = False
-            else:
-                #print(f'Keep {constraint}')
-                manager.add_constraint(constraint)
-                try:
-                    manager.rebuild_relations()
-                except InvalidConstraintError as e:
-                    print(e)
-                    print(constraint)
-                    self.signal_fail.emit()
-                    return
+        constraints = [constraint for constraint in constraint_database.get_constraints() if constraint.romA in variants and constraint.romB in variants]
+        enabled = [constraint for constraint in constraints if constraint.enabled]
 
-        
-
-            i = i + 1
-            new_progress = (i*50) // count
-            if new_progress != progress:
-                progress = new_progress
-                self.signal_progress.emit(new_progress)
+        # Solve all constraints once and find the redundant ones in the order of their virtual addresses
+        try:
+            manager = solve(variants, enabled)
+        except InvalidConstraintError:
+            self.fail(variants, enabled)
+            return
+        self.signal_progress.emit(30)
 
-        self.signal_progress.emit(50)
+        for constraint in find_redundant_constraints(manager, enabled, lambda progress: self.signal_progress.emit(30 + progress * 40 // 100)):
+            print(f'Disable {constraint}')
+            constraint.enabled = False
 
-        i = 0
         # Test that there are no disabled constraints that are still needed
-        for constraint in constraints:
-            if constraint.enabled:
-                i = i + 1
-                continue
-
-            # test if constraint is redundant
-            va_a = manager.to_virtual(constraint.romA, constraint.addressA)
-            va_b = manager.to_virtual(constraint.romB, constraint.addressB)
-            if va_a != va_b:
+        while True:
+            try:
+                manager = solve(variants, [constraint for constraint in constraints if constraint.enabled])
+            except InvalidConstraintError:
+                self.fail(variants, [constraint for constraint in constraints if constraint.enabled])
+                return
+            needed = find_unfulfilled_constraints(manager, [constraint for constraint in constraints if not constraint.enabled])
+            if len(needed) == 0:
+                break
+            for constraint in needed:
                 print(f'Need to reenable {constraint}')
                 constraint.enabled = True
-                manager.add_constraint(constraint)
-                try:
-                    manager.rebuild_relations()
-                except InvalidConstraintError as e:
-                    print(e)
-                    print(constraint)
-                    self.signal_fail.emit()
-                    return
-
-        
-
-            i = i + 1
-            new_progress = (i*50) // count + 50
-            if new_progress != progress:
-                progress = new_progress
-                self.signal_progress.emit(new_progress)
+        self.signal_progress.emit(100)
 
         constraint_database._write_constraints() # TODO add a public method to update changed constraints in the database?
         constraint_database.constraints_changed.emit()
 
         self.signal_done.emit()
 
+    def fail(self, variants: List[RomVariant], constraints: List[Constraint]) -> None:
+        constraint = find_invalid_constraint(variants, constraints)
+        print(f'Invalid constraint: {constraint}')
+        self.signal_fail.emit()
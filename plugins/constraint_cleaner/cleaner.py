@@ -0,0 +1,113 @@
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from tlh.const import RomVariant
+from tlh.data.constraints import Constraint, ConstraintManager, InvalidConstraintError
+
+
+def get_constraint_key(constraint: Constraint) -> Tuple[Tuple[RomVariant, int], Tuple[RomVariant, int]]:
+    '''
+    Constraints with the same key link the same addresses, no matter which side they are on.
+    '''
+    a = (constraint.romA, constraint.addressA)
+    b = (constraint.romB, constraint.addressB)
+    return (a, b) if a <= b else (b, a)
+
+
+def find_duplicate_constraints(constraints: List[Constraint]) -> List[Constraint]:
+    '''
+    Returns all constraints that link the same addresses as another constraint.
+    The first enabled constraint for each pair of addresses is kept.
+    '''
+    kept: Dict[Tuple, Constraint] = {}
+    duplicates = []
+    for constraint in constraints:
+        key = get_constraint_key(constraint)
+        if key not in kept:
+            kept[key] = constraint
+        elif constraint.enabled and not kept[key].enabled:
+            duplicates.append(kept[key])
+            kept[key] = constraint
+        else:
+            duplicates.append(constraint)
+    return duplicates
+
+
+def solve(variants: List[RomVariant], constraints: List[Constraint]) -> ConstraintManager:
+    manager = ConstraintManager(set(variants))
+    for constraint in constraints:
+        manager.add_constraint(constraint)
+    manager.rebuild_relations()
+    return manager
+
+
+def find_invalid_constraint(variants: List[RomVariant], constraints: List[Constraint]) -> Optional[Constraint]:
+    '''
+    Bisects for the first constraint that cannot be added to the constraints before it.
+    '''
+    def is_valid(count: int) -> bool:
+        try:
+            solve(variants, constraints[:count])
+            return True
+        except InvalidConstraintError:
+            return False
+
+    if is_valid(len(constraints)):
+        return None
+    (low, high) = (0, len(constraints))
+    while high - low > 1:
+        middle = (low + high) // 2
+        if is_valid(middle):
+            low = middle
+        else:
+            high = middle
+    return constraints[high - 1]
+
+
+def find_redundant_constraints(manager: ConstraintManager, constraints: List[Constraint], progress: Callable[[int], None] = lambda progress: None) -> List[Constraint]:
+    '''
+    Returns the constraints that are implied by the other constraints.
+    The manager needs to contain the relations for all of the constraints.
+
+    Relations are only created at addresses of constraints. An address without a relation is at the virtual address
+    following its previous address anyway. An address with a relation needs to be linked to such an address by constraints.
+    Going through the constraints in the order of their virtual addresses, a constraint is redundant if both its
+    addresses are already linked to each other.
+    '''
+    parents: Dict[Hashable, Hashable] = {}
+
+    def find(node: Hashable) -> Hashable:
+        parents.setdefault(node, node)
+        while parents[node] != node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    def get_node(variant: RomVariant, address: int) -> Hashable:
+        node = (variant, address)
+        if node not in parents:
+            virtual_address = manager.to_virtual(variant, address)
+            if virtual_address == manager.to_virtual(variant, address - 1) + 1:
+                # Link all addresses that would be at this virtual address without any new relation
+                parents[node] = find(('virtual', virtual_address))
+            else:
+                parents[node] = node
+        return node
+
+    ordered = sorted(enumerate(constraints), key=lambda item: (manager.to_virtual(item[1].romA, item[1].addressA), item[0]))
+    redundant = []
+    last_progress = 0
+    for (i, (_, constraint)) in enumerate(ordered):
+        a = find(get_node(constraint.romA, constraint.addressA))
+        b = find(get_node(constraint.romB, constraint.addressB))
+        if a == b:
+            redundant.append(constraint)
+        else:
+            parents[a] = b
+        new_progress = (i + 1) * 100 // len(ordered)
+        if new_progress != last_progress:
+            last_progress = new_progress
+            progress(new_progress)
+    return redundant
+
+
+def find_unfulfilled_constraints(manager: ConstraintManager, constraints: List[Constraint]) -> List[Constraint]:
+    return [constraint for constraint in constraints if manager.to_virtual(constraint.romA, constraint.addressA) != manager.to_virtual(constraint.romB, constraint.addressB)]
@@ -3,6 +3,7 @@ import os
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
 
+from PySide6.QtCore import QObject, QThread, Signal
 from PySide6.QtGui import QKeySequence
 from plugins.data_extractor.assets import Assets, get_all_asset_configs, read_assets, write_assets
 from plugins.data_extractor.assets_modification import Asset, insert_new_assets_to_list
@@ -58,6 +59,26 @@ OBJ_SIZES = {
 class BitmaskValue:
     bits: List[str]
 
+
+class ParseStructsWorker(QObject):
+    signal_progress = Signal(int)
+    # Whether structs.json changed
+    signal_done = Signal(bool)
+    signal_fail = Signal(str)
+
+    def __init__(self, incremental: bool) -> None:
+        super().__init__()
+        self.incremental = incremental
+
+    def process(self) -> None:
+        try:
+            changed = generate_struct_definitions(self.incremental, self.signal_progress.emit)
+        except Exception as e:
+            traceback.print_exc()
+            self.signal_fail.emit(str(e))
+            return
+        self.signal_done.emit(changed)
+
 class DataExtractorPlugin:
     name = 'Data Extractor'
     description = 'Extracts data in different formats'
@@ -66,6 +87,7 @@ class DataExtractorPlugin:
         self.api = api
         self.structs = None
         self.unions = None
+        self.parse_structs_thread = None
 
     def load(self) -> None:
         self.api.register_hexview_contextmenu_handler(self.contextmenu_handler)
@@ -79,6 +101,7 @@ class DataExtractorPlugin:
         self.action_export_incbins = self.api.register_menu_entry('Export Incbins', self.slot_export_incbins)
         self.action_remove_unused = self.api.register_menu_entry('Remove unused asset entries', self.slot_remove_unused_assets)
         self.action_parse_structs = self.api.register_menu_entry('Parse structs', self.slot_parse_structs)
+        self.action_parse_all_structs = self.api.register_menu_entry('Parse all structs', self.slot_parse_all_structs)
         load_json_files()
 
     def unload(self) -> None:
@@ -87,6 +110,7 @@ class DataExtractorPlugin:
         self.api.remove_menu_entry(self.action_export_incbins)
         self.api.remove_menu_entry(self.action_remove_unused)
         self.api.remove_menu_entry(self.action_parse_structs)
+        self.api.remove_menu_entry(self.action_parse_all_structs)
 
     def contextmenu_handler(self, controller: HexViewerController, menu: QMenu) -> None:
         menu.addSeparator()
@@ -3002,10 +3026,49 @@ class DataExtractorPlugin:
 
 
     def slot_parse_structs(self) -> None:
-        generate_struct_definitions()
-        # Reload structs.json
-        load_json_files()
-        print('ok')
+        self.parse_structs(True)
+
+    def slot_parse_all_structs(self) -> None:
+        '''
+        Parses all headers again without using the cache.
+        '''
+        self.parse_structs(False)
+
+    def parse_structs(self, incremental: bool) -> None:
+        if self.parse_structs_thread is not None:
+            self.api.show_error(self.name, 'The structs are already being parsed.')
+            return
+        self.parse_structs_dialog = self.api.get_progress_dialog(self.name, 'Parsing structs...', False)
+        self.parse_structs_dialog.show()
+
+        self.parse_structs_thread = QThread()
+        self.parse_structs_worker = ParseStructsWorker(incremental)
+        self.parse_structs_worker.moveToThread(self.parse_structs_thread)
+        self.parse_structs_worker.signal_progress.connect(self.parse_structs_dialog.set_progress)
+        self.parse_structs_worker.signal_done.connect(self.slot_structs_parsed)
+        self.parse_structs_worker.signal_fail.connect(self.slot_parse_structs_failed)
+        self.parse_structs_thread.started.connect(self.parse_structs_worker.process)
+        self.parse_structs_thread.start()
+
+    def finish_parse_structs(self) -> None:
+        self.parse_structs_thread.quit()
+        self.parse_structs_thread.wait()
+        self.parse_structs_thread = None
+        self.parse_structs_worker = None
+        self.parse_structs_dialog.close()
+
+    def slot_structs_parsed(self, changed: bool) -> None:
+        self.finish_parse_structs()
+        if changed:
+            # Reload structs.json
+            load_json_files()
+            print('Parsed structs')
+        else:
+            print('Structs are up to date')
+
+    def slot_parse_structs_failed(self, error: str) -> None:
+        self.finish_parse_structs()
+        self.api.show_error(self.name, f'Could not parse structs: {error}')
 
     def slot_tmp2(self) -> None:
         lines = QApplication.clipboard().text().split('\n')
@@ -1,5 +1,7 @@
+from bisect import bisect_left, bisect_right
 import json
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from sortedcontainers import SortedList
 from tlh import settings
 import os
 
@@ -13,42 +15,183 @@ variant_map = {
     RomVariant.DEMO_JP: 'DEMO_JP',
 }
 
+# Distance between the order keys of neighbouring assets after they are numbered
+ORDER_KEY_GAP = 1 << 32
+
+
 class Assets:
     def __init__(self, assets: any) -> None:
         self.assets = assets
+        # Per variant sorted lists of asset starts and the order keys of the assets belonging to them.
+        # Built lazily and invalidated or patched when the asset list is modified.
+        self.index: Dict[str, Tuple[List[int], List[int], List[int]]] = {}
+        # Per variant order keys of the offsets entries for this variant and their offsets.
+        self.offsets: Dict[str, Tuple[List[int], List[int]]] = {}
+        # Order key of each asset object. The keys are sorted like the asset list, so the rank of a key is the index of its asset.
+        # Inserted assets get a key between their neighbours, so the keys of the other assets do not change.
+        self.keys: Optional[Dict[int, int]] = None
+        self.order: Optional[SortedList] = None
 
     def get_asset_at_of_after(self, addr: int, variant: RomVariant) -> any:
         return self.assets[self.get_index_at_of_after(addr, variant)]
 
     def get_index_at_of_after(self, addr: int, variant: RomVariant) -> any:
-        variant = variant_map[variant]
+        (starts, _, first_keys) = self.get_variant_index(variant_map[variant])
+        pos = bisect_left(starts, addr)
+        if pos == len(starts):
+            return None
+        return self.order.bisect_left(first_keys[pos])
+
+    def get_variant_index(self, variant: str) -> Tuple[List[int], List[int], List[int]]:
+        '''
+        Returns the index for this variant.
+        starts: sorted start addresses of all asset definitions used in this variant
+        keys: the order key of the asset for each start
+        first_keys: the smallest order key of all entries from this position on
+        '''
+        if variant not in self.index:
+            key_list = list(self.get_order())
+            (entries, offsets) = self.calculate_starts(variant)
+            entries = [(start, key_list[i]) for (start, i) in entries]
+            entries.sort()
+            self.offsets[variant] = ([key_list[i] for (i, _) in offsets], [offset for (_, offset) in offsets])
+            keys = [key for (_, key) in entries]
+            self.index[variant] = (
+                [start for (start, _) in entries],
+                keys,
+                calculate_first_indices(keys)
+            )
+        return self.index[variant]
+
+    def get_order(self) -> SortedList:
+        if self.order is None:
+            self.renumber()
+        return self.order
+
+    def renumber(self) -> None:
+        '''
+        Assigns evenly spaced order keys to all assets. The variant indices contain the old keys and are rebuilt.
+        '''
+        self.keys = {id(asset): i * ORDER_KEY_GAP for (i, asset) in enumerate(self.assets)}
+        self.order = SortedList(i * ORDER_KEY_GAP for i in range(len(self.assets)))
+        self.index = {}
+        self.offsets = {}
+
+    def calculate_starts(self, variant: str) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        '''
+        Walks the asset list once and returns (start, index) for every asset definition used in this variant
+        and (index, offset) for every offsets entry that changes the offset of this variant.
+        '''
+        entries = []
+        offsets = []
         current_offset = 0
         for i in range(len(self.assets)):
             asset = self.assets[i]
             if 'offsets' in asset:
                 if variant != RomVariant.USA and variant in asset['offsets']:
                     current_offset = asset['offsets'][variant]
+                    offsets.append((i, current_offset))
             elif 'path' in asset: # Asset definition
-                if 'variants' in asset:
-                    if variant not in asset['variants']:
-                        # This asset is not used in the current variant
-                        continue
-                start = 0
-                if 'start' in asset:
-                    # Apply offset to the start of the USA variant
-                    start = asset['start'] + current_offset
-                elif 'starts' in asset:
-                    # Use start for the current variant
-                    start = asset['starts'][variant]
-
-                if addr <= start:
-                    return i
+                start = self.calculate_start(asset, variant, current_offset)
+                if start is not None:
+                    entries.append((start, i))
+        return (entries, offsets)
+
+    def calculate_start(self, asset: any, variant: str, current_offset: int) -> Optional[int]:
+        if 'variants' in asset:
+            if variant not in asset['variants']:
+                # This asset is not used in the current variant
+                return None
+        start = 0
+        if 'start' in asset:
+            # Apply offset to the start of the USA variant
+            start = asset['start'] + current_offset
+        elif 'starts' in asset:
+            # Use start for the current variant
+            start = asset['starts'][variant]
+        return start
+
+    def calculate_offset_at(self, key: int, variant: str) -> int:
+        '''
+        Returns the offset that is active for the asset with this order key in this variant.
+        '''
+        (keys, offsets) = self.offsets[variant]
+        pos = bisect_left(keys, key)
+        return offsets[pos - 1] if pos > 0 else 0
 
     def insert_before(self, asset: any, next_asset: any) -> None:
+        index = self.find_index(next_asset)
+        if index is None:
+            return
+        key = self.get_key_before(index)
+        if key is None:
+            # No gap left between the neighbours
+            self.renumber()
+            key = self.get_key_before(index)
+        self.assets.insert(index, asset)
+        self.keys[id(asset)] = key
+        self.order.add(key)
+
+        if 'offsets' in asset:
+            # The offsets of all following assets change, so the index needs to be rebuilt.
+            self.index = {}
+            self.offsets = {}
+            return
+        if 'path' not in asset:
+            return
+
+        # Patch the index of all variants that were already built
+        for variant in self.index:
+            (starts, keys, first_keys) = self.index[variant]
+            start = self.calculate_start(asset, variant, self.calculate_offset_at(key, variant))
+            if start is None:
+                continue
+            pos = bisect_right(starts, start)
+            starts.insert(pos, start)
+            keys.insert(pos, key)
+            first_keys.insert(pos, min(key, first_keys[pos]) if pos < len(first_keys) else key)
+            # The smallest keys before this position are non-decreasing, so the ones that are larger than the new key are next to it
+            first = bisect_right(first_keys, key, 0, pos)
+            first_keys[first:pos] = [key] * (pos - first)
+
+    def get_key_before(self, index: int) -> Optional[int]:
+        '''
+        Returns a new order key between the asset at the index and the one before it.
+        '''
+        next_key = self.order[index]
+        previous_key = self.order[index - 1] if index > 0 else next_key - 2 * ORDER_KEY_GAP
+        key = (previous_key + next_key) // 2
+        return key if previous_key < key < next_key else None
+
+    def find_index(self, next_asset: any) -> Optional[int]:
+        '''
+        Returns the index of the asset in the asset list.
+        '''
+        self.get_order()
+        key = self.keys.get(id(next_asset))
+        if key is not None:
+            index = self.order.bisect_left(key)
+            if self.assets[index] is next_asset:
+                return index
+        # Fall back to comparing the contents
         for i in range(len(self.assets)):
             if self.assets[i] == next_asset:
-                self.assets.insert(i, asset)
-                break
+                return i
+        return None
+
+
+def calculate_first_indices(indices: List[int]) -> List[int]:
+    '''
+    For each position calculate the smallest index or order key from this position to the end.
+    The asset list is not necessarily sorted by start, so this returns the first asset in list order with a start at or after an address.
+    '''
+    first_indices = [0] * len(indices)
+    current = None
+    for pos in reversed(range(len(indices))):
+        if current is None or indices[pos] < current:
+            current = indices[pos]
+        first_indices[pos] = current
+    return first_indices
 
 def get_all_asset_configs() -> List[str]:
     return [x for x in os.listdir(os.path.join(settings.get_repo_location(), 'assets')) if x.endswith('.json')]
@@ -1,8 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import hashlib
 import json
+import multiprocessing
+import pickle
 import sys
 import typing
-from dataclasses import dataclass
-from typing import Any, Dict, Optional, List, Set
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, List, Set, Tuple
 from weakref import ReferenceType, ref
 from attr import define
 
@@ -293,8 +298,7 @@ def main():
 def parse_to_json(input_filename, output_filename) -> None:
     with open(input_filename) as input_file:
         text = input_file.read()
-        text = text.replace('__attribute__((packed))', '')
-        text = text.replace('__attribute__((packed, aligned(2)))', '')
+        text = remove_attributes(text)
         ast = pycparser.CParser().parse(text, input_filename)
         v = StructVisitor()
         v.visit(ast)
@@ -307,6 +311,202 @@ if __name__ == '__main__':
     main()
 
 
+def remove_attributes(text: str) -> str:
+    text = text.replace('__attribute__((packed))', '')
+    text = text.replace('__attribute__((packed, aligned(2)))', '')
+    return text
+
+
+# The preprocessed headers are split into segments at the line markers of the preprocessor.
+# The structs and typedefs of each segment are cached by the hash of its text.
+# If only some headers changed, only the segments of those headers need to be parsed again.
+
+STRUCTS_CACHE_PATH = os.path.join('tmp', 'structs_cache.pickle')
+# Parse everything at once if more segments changed, as every segment is parsed with a prelude of all known typedef names
+MAX_INCREMENTAL_SEGMENTS = 32
+
+
+@dataclass
+class Segment:
+    file: str
+    # Lines of the file that are contained in this segment
+    start_line: int
+    end_line: int
+    text: str
+    hash: str = ''
+
+
+@dataclass
+class SegmentResult:
+    structs: Dict[str, typing.Union[Struct, Union]] = field(default_factory=dict)
+    typedefs: Dict[str, Type] = field(default_factory=dict)
+
+
+@dataclass
+class StructsCache:
+    # Hash of the source file including all headers
+    source_hash: str = ''
+    # Hashes of all files that were read by the preprocessor
+    dependencies: Dict[str, str] = field(default_factory=dict)
+    segments: Dict[str, SegmentResult] = field(default_factory=dict)
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def hash_file(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def parse_line_marker(line: str) -> Optional[Tuple[int, str]]:
+    '''
+    Returns the line and file of a line marker like # 12 "include/global.h" 1
+    '''
+    if not line.startswith('# '):
+        return None
+    parts = line.split(' ', 2)
+    if len(parts) < 3 or not parts[1].isdigit() or not parts[2].startswith('"'):
+        return None
+    return (int(parts[1]), parts[2][1:parts[2].index('"', 1)])
+
+
+def split_segments(preprocessed: str) -> List[Segment]:
+    '''
+    Splits the output of the preprocessor into segments of consecutive lines from the same file.
+    Segments without any declarations are dropped.
+    '''
+    segments = []
+    current: Optional[Segment] = None
+    lines: List[str] = []
+    line_number = 0
+
+    def finish_segment() -> None:
+        if current is not None and any(line.strip() != '' for line in lines[1:]):
+            current.end_line = line_number - 1
+            current.text = ''.join(lines)
+            current.hash = hash_text(current.text)
+            segments.append(current)
+
+    for line in preprocessed.splitlines(keepends=True):
+        marker = parse_line_marker(line)
+        if marker is not None:
+            if current is None or current.file != marker[1]:
+                finish_segment()
+                current = Segment(marker[1], marker[0], marker[0], '')
+                lines = [line]
+            else:
+                lines.append(line)
+            line_number = marker[0]
+            continue
+        lines.append(line)
+        line_number += 1
+    finish_segment()
+    return segments
+
+
+def get_dependencies(preprocessed: str) -> Set[str]:
+    '''
+    Returns all files that were included according to the line markers.
+    '''
+    dependencies = set()
+    for line in preprocessed.splitlines():
+        marker = parse_line_marker(line)
+        if marker is not None and not marker[1].startswith('<'):
+            dependencies.add(marker[1])
+    return dependencies
+
+
+def visit_nodes(nodes: List[Any]) -> SegmentResult:
+    visitor = StructVisitor()
+    for node in nodes:
+        visitor.visit(node)
+    return SegmentResult(visitor.structs, visitor.typedefs)
+
+
+def parse_all_segments(segments: List[Segment]) -> List[SegmentResult]:
+    '''
+    Parses all segments at once and assigns the declarations to their segments by their coordinates.
+    '''
+    ast = pycparser.CParser().parse(remove_attributes(''.join(segment.text for segment in segments)), 'structs')
+    nodes: List[List[Any]] = [[] for _ in segments]
+    i = 0
+    for node in ast.ext:
+        coord = node.coord
+        while i < len(segments) - 1 and not (coord.file == segments[i].file and segments[i].start_line <= coord.line <= segments[i].end_line):
+            i += 1
+        nodes[i].append(node)
+    return [visit_nodes(segment_nodes) for segment_nodes in nodes]
+
+
+def parse_segment(segment: Segment, typedef_names: List[str]) -> SegmentResult:
+    '''
+    Parses a single segment. The typedef names that are declared before it need to be known to parse it.
+    '''
+    prelude = ''.join(f'typedef int {name};\n' for name in typedef_names)
+    ast = pycparser.CParser().parse(prelude + remove_attributes(segment.text), segment.file)
+    return visit_nodes(ast.ext[len(typedef_names):])
+
+
+def parse_segments(segments: List[Segment], cached: Dict[str, SegmentResult]) -> Dict[str, SegmentResult]:
+    '''
+    Parses the segments that are not cached yet. Is run in a separate process.
+    Returns the results for all segments by their hash.
+    '''
+    changed = [segment for segment in segments if segment.hash not in cached]
+    if len(changed) > MAX_INCREMENTAL_SEGMENTS:
+        return {segment.hash: result for (segment, result) in zip(segments, parse_all_segments(segments))}
+
+    results = {}
+    typedef_names: Dict[str, None] = {}
+    try:
+        for segment in segments:
+            result = cached.get(segment.hash)
+            if result is None:
+                result = parse_segment(segment, list(typedef_names))
+            results[segment.hash] = result
+            typedef_names.update((name, None) for name in result.typedefs)
+    except pycparser.c_parser.ParseError:
+        # A declaration might be split over multiple segments
+        return {segment.hash: result for (segment, result) in zip(segments, parse_all_segments(segments))}
+    return results
+
+
+def merge_results(results: List[SegmentResult]) -> Dict[str, typing.Union[Struct, Union]]:
+    '''
+    Merges the results of the segments in order. The results are not modified, so that they can still be cached.
+    '''
+    structs = {}
+    typedefs = {}
+    for result in copy.deepcopy(results):
+        structs.update(result.structs)
+        typedefs.update(result.typedefs)
+    typedef_structs(structs, typedefs)
+    link_structs(structs)
+    return structs
+
+
+def read_structs_cache() -> StructsCache:
+    try:
+        with open(STRUCTS_CACHE_PATH, 'rb') as file:
+            cache = pickle.load(file)
+        if isinstance(cache, StructsCache):
+            return cache
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+    return StructsCache()
+
+
+def write_structs_cache(cache: StructsCache) -> None:
+    os.makedirs(os.path.dirname(STRUCTS_CACHE_PATH), exist_ok=True)
+    with open(STRUCTS_CACHE_PATH, 'wb') as file:
+        pickle.dump(cache, file)
+
+
 def collect_all_headers() -> List[str]:
     headers = []
     include_folder = os.path.join(settings.get_repo_location(), 'include')
@@ -314,22 +514,52 @@ def collect_all_headers() -> List[str]:
         for file in files:
             header_path = os.path.relpath(os.path.join(root, file), include_folder)
             headers.append(header_path)
+    # Keep the order stable, so that the source only changes if the headers change
+    headers.sort()
     return headers
 
-def generate_struct_definitions() -> None:
-
+def generate_struct_definitions(incremental: bool = True, progress: Callable[[int], None] = lambda progress: None) -> bool:
+    '''
+    Generates structs.json from the headers of the repo.
+    Returns False if nothing changed since the last time.
+    In incremental mode only the segments of the headers that changed are parsed again.
+    '''
     headers = collect_all_headers()
 
+    source = '#define NENT_DEPRECATED\n' + ''.join(f'#include "{header}"\n' for header in headers)
     with open('tmp/test.c', 'w') as file:
-        file.write('#define NENT_DEPRECATED\n')
-        for header in headers:
-            file.write(f'#include "{header}"\n')
+        file.write(source)
+
+    output_path = get_file_in_database(os.path.join('data_extractor', 'structs.json'))
+    cache = read_structs_cache() if incremental else StructsCache()
+    source_hash = hash_text(source)
+    if (cache.source_hash == source_hash and cache.dependencies and os.path.isfile(output_path)
+            and all(hash_file(path) == file_hash for (path, file_hash) in cache.dependencies.items())):
+        # Neither the list of headers nor any included file changed
+        progress(100)
+        return False
 
     repo_location = settings.get_repo_location()
     # Preprocess file
     subprocess.check_call(['cc', '-E', '-I',  os.path.join(repo_location, 'tools/agbcc'), '-I', os.path.join(repo_location, 'tools/agbcc/include'), '-iquote', os.path.join(repo_location, 'include'), '-nostdinc', '-undef', '-DUSA', '-DREVISION=0', '-DENGLISH', 'tmp/test.c', '-o', 'tmp/test.i'])
+    progress(10)
+
+    with open('tmp/test.i', 'r') as file:
+        preprocessed = file.read()
+    segments = split_segments(preprocessed)
+
+    # Parse in a separate process, so that the UI stays responsive
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        results = executor.submit(parse_segments, segments, cache.segments).result()
+    progress(90)
+
+    data = merge_results([results[segment.hash] for segment in segments])
+    dump_json(data, output_path)
 
-    parse_to_json('tmp/test.i', get_file_in_database(os.path.join('data_extractor', 'structs.json')))
+    dependencies = {path: hash_file(path) for path in get_dependencies(preprocessed)}
+    write_structs_cache(StructsCache(source_hash, dependencies, results))
+    progress(100)
+    return True
 
     # generate_decomp_me_context(headers)
 
@@ -1,5 +1,4 @@
 from dataclasses import dataclass
-import json
 from typing import Any, List, Optional, Union
 import PySide6
 from PySide6.QtCore import QThread, Qt, QAbstractListModel, QObject, Signal
@@ -7,14 +6,14 @@ from PySide6.QtWidgets import QDockWidget, QFileDialog
 from tlh.common.ui.close_dock import CloseDock
 from tlh.plugin.api import PluginApi
 from tlh.ui.ui_plugin_entity_explorer_bridge_dock import Ui_BridgeDock
-from plugins.entity_explorer_bridge.server import ServerWorker
-import requests
+from plugins.entity_explorer_bridge.entity_index import EntityIndex
+from plugins.entity_explorer_bridge.save_state_stream import SaveStateWorker
+from plugins.entity_explorer_bridge.server import EntityExplorerServer
 import tlh.settings as settings
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
 import threading
 import os
-from datetime import datetime
 import subprocess
 
 # PATHS for the entity search. TODO Make configurable
@@ -45,16 +44,24 @@ class EntityExplorerPlugin:
 
 
 class BridgeDock(CloseDock):
+    signal_file_modified = Signal(str)
+    signal_resync = Signal()
 
     def __init__(self, parent, api: PluginApi) -> None:
         super().__init__('', parent)
         self.api = api
         self.ui = Ui_BridgeDock()
         self.ui.setupUi(self)
-        self.server_thread = None
+        self.server = EntityExplorerServer()
+        self.server.on('connect', lambda data: self.slot_connected())
+        self.server.on('request_full_state', lambda data: self.signal_resync.emit())
+        self.server.on('disconnect', lambda data: self.slot_disconnected())
+        self.server.signal_error.connect(self.slot_error)
+        self.server.signal_started.connect(self.slot_server_started)
+        self.server.signal_stopped.connect(self.slot_server_stopped)
 
         self.observer = None
-        self.modified_timer = None
+        self.save_state_thread = None
         self.slot_server_running(False)
 
         self.ui.pushButtonStartServer.clicked.connect(self.slot_start_server)
@@ -92,34 +99,44 @@ class BridgeDock(CloseDock):
             self.api.show_error('Entity Explorer Bridge', 'You need to set the folder where to store the copies.')
             return
 
-        self.server_thread = QThread()
-        self.server_worker = ServerWorker()
-        self.server_worker.signal_connected.connect(self.slot_connected)
-        self.server_worker.signal_disconnected.connect(self.slot_disconnected)
-        self.server_worker.signal_error.connect(self.slot_error)
-        self.server_worker.signal_started.connect(self.slot_server_started)
-        self.server_worker.signal_shutdown.connect(self.slot_server_stopped)
-        self.server_worker.moveToThread(self.server_thread)
-        self.server_thread.started.connect(self.server_worker.process)
-        self.server_thread.start()
+        self.start_save_state_worker()
+        self.server.start()
         self.slot_server_running(True)
         self.set_folders_active(False)
 
+    def start_save_state_worker(self) -> None:
+        copy_folder = self.ui.lineEditSaveFolder.text() if self.ui.checkBoxCopySaves.isChecked() else None
+        self.save_state_thread = QThread()
+        self.save_state_worker = SaveStateWorker(self.server, self.ui.checkBoxStreamDeltas.isChecked(), copy_folder)
+        self.save_state_worker.moveToThread(self.save_state_thread)
+        self.signal_file_modified.connect(self.save_state_worker.slot_file_modified)
+        self.signal_resync.connect(self.save_state_worker.slot_resync)
+        self.save_state_thread.start()
+
+    def stop_save_state_worker(self) -> None:
+        if self.save_state_thread is not None:
+            self.signal_file_modified.disconnect(self.save_state_worker.slot_file_modified)
+            self.signal_resync.disconnect(self.save_state_worker.slot_resync)
+            self.save_state_thread.quit()
+            self.save_state_thread.wait()
+            self.save_state_thread = None
+
     def set_folders_active(self, active: bool) -> None:
         self.ui.lineEditLoadFolder.setEnabled(active)
         self.ui.toolButtonLoadFolder.setEnabled(active)
         self.ui.checkBoxCopySaves.setEnabled(active)
+        self.ui.checkBoxStreamDeltas.setEnabled(active)
         self.ui.lineEditSaveFolder.setEnabled(active)
         self.ui.toolButtonSaveFolder.setEnabled(active)
 
     def slot_stop_server(self) -> None:
-        # Shutdown needs to be triggered by the server thread, so send a request
-        requests.get('http://localhost:10243/shutdown')
+        self.server.stop()
         self.set_folders_active(True)
 
     def slot_connected(self) -> None:
         self.ui.labelConnectionStatus.setText(
             'Connected to Entity Explorer instance.')
+        self.signal_resync.emit()
 
     def slot_disconnected(self) -> None:
         self.ui.labelConnectionStatus.setText(
@@ -133,13 +150,13 @@ class BridgeDock(CloseDock):
 
     def slot_server_stopped(self) -> None:
         self.slot_server_running(False)
-        self.server_thread.terminate()
         self.ui.labelConnectionStatus.setText('Server stopped.')
         self.stop_watchdog()
+        self.stop_save_state_worker()
 
     def slot_error(self, error: str) -> None:
         self.slot_server_running(False)
-        self.server_thread.terminate()
+        self.stop_save_state_worker()
         self.api.show_error('Entity Explorer Bridge', error)
 
     def slot_edit_load_folder(self):
@@ -204,16 +221,8 @@ class BridgeDock(CloseDock):
 
     @debounce(0.1)
     def on_file_modified(self, event):
-        with open(event.src_path, 'rb') as file:
-            bytes = file.read()
-            self.server_worker.slot_send_save_state(event.src_path, bytes)
-
-
-            if self.ui.checkBoxCopySaves.isChecked() and self.ui.lineEditSaveFolder.text():
-                name = os.path.basename(event.src_path)
-                name = datetime.now().strftime('%Y-%m-%d_%H_%M_%S_%f_') + name
-                with open(os.path.join(self.ui.lineEditSaveFolder.text(), name), 'wb') as output:
-                    output.write(bytes)
+        # Reading and sending the save state is done by the save state worker
+        self.signal_file_modified.emit(event.src_path)
 
 
     def slot_search_entity(self) -> None:
@@ -263,6 +272,9 @@ class BridgeDock(CloseDock):
         print(save_game)
         subprocess.Popen([MGBA_PATH, '-t', save_game.save_path, elf_path], cwd=os.path.dirname(MGBA_PATH))
 
+# The index is kept between searches, so that only new save games need to be parsed
+entity_index: Optional[EntityIndex] = None
+
 class SearchEntityWorker(QObject):
     signal_progress = Signal(int)
     signal_done = Signal()
@@ -276,43 +288,21 @@ class SearchEntityWorker(QObject):
 
     def process(self) -> None:
         try:
-
+            global entity_index
             self.save_games: List[SaveGame] = []
             print(f'Searching for kind {self.kind} id {self.id}')
 
-            json_files = []
-
-            for root, dirs, files in os.walk(JSON_PATH):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    json_files.append((file,file_path))
-
-            count = len(json_files)
-            i = 0
-            progress = 0
-            for (file, file_path) in json_files:
-                if self.is_aborted:
-                    return
-                data = json.load(open(file_path, 'r'))
-                times = 0
-                for list in data:
-                    for entity in list:
-                        if self.kind == 9: # Manager
-                            if 'subtype' in entity and entity['type'] == 9 and entity['subtype'] == self.id:
-                                times += 1
-                        else:
-                            if 'kind' in entity and entity['kind'] == self.kind and entity['id'] == self.id:
-                                times += 1
-
-                if times > 0:
-                    save_path = file_path.replace('save_games_json', 'save_games').replace('.json', '.ss1')
-                    name = os.path.join(os.path.basename(os.path.dirname(file_path)), file.replace('.json', '')) + ' ' + str(times)
-                    self.save_games.append(SaveGame(name, save_path, times))
-                i += 1
-                new_progress = (i*100) // count
-                if new_progress != progress:
-                    progress = new_progress
-                    self.signal_progress.emit(new_progress)
+            if entity_index is None:
+                entity_index = EntityIndex(JSON_PATH)
+            entity_index.update(self.signal_progress.emit, lambda: self.is_aborted)
+            if self.is_aborted:
+                return
+
+            for (file, times) in entity_index.search(self.kind, self.id).items():
+                file_path = os.path.join(JSON_PATH, file)
+                save_path = file_path.replace('save_games_json', 'save_games').replace('.json', '.ss1')
+                name = os.path.join(os.path.basename(os.path.dirname(file_path)), os.path.basename(file).replace('.json', '')) + ' ' + str(times)
+                self.save_games.append(SaveGame(name, save_path, times))
 
             self.save_games.sort(key = lambda x:x.name)
             self.signal_done.emit()
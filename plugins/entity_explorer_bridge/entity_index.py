@@ -0,0 +1,192 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import multiprocessing
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Inverted index from entities to the save games in the save_games_json folder that contain them.
+# Only the save games that were added or changed since the last update are parsed again.
+
+INDEX_PATH = os.path.join('tmp', 'entity_index.json')
+INDEX_VERSION = 1
+MANAGER_KIND = 9
+# Number of files parsed by one job of the process pool
+CHUNK_SIZE = 64
+
+
+def get_entity_key(kind: int, id: int, type: Optional[int] = None) -> str:
+    if type is None:
+        return f'{kind}:{id}'
+    return f'{kind}:{id}:{type}'
+
+
+def count_entities(path: str) -> Dict[str, int]:
+    '''
+    Counts how often each entity occurs in the save game.
+    Entities are counted by kind and id as well as by kind, id and type.
+    Managers are counted by their subtype as the id.
+    '''
+    with open(path, 'r') as file:
+        data = json.load(file)
+    counts: Dict[str, int] = {}
+    def add(key: str) -> None:
+        counts[key] = counts.get(key, 0) + 1
+
+    for entities in data:
+        for entity in entities:
+            if 'subtype' in entity and entity.get('type') == MANAGER_KIND:
+                add(get_entity_key(MANAGER_KIND, entity['subtype']))
+            # Managers are only found by their subtype
+            if 'kind' in entity and 'id' in entity and entity['kind'] != MANAGER_KIND:
+                add(get_entity_key(entity['kind'], entity['id']))
+                if 'type' in entity:
+                    add(get_entity_key(entity['kind'], entity['id'], entity['type']))
+    return counts
+
+
+def count_entities_in_files(paths: List[Tuple[str, str]]) -> List[Tuple[str, Optional[Dict[str, int]], Optional[str]]]:
+    '''
+    Returns (file, counts, error) for each (file, path).
+    '''
+    results = []
+    for (file, path) in paths:
+        try:
+            results.append((file, count_entities(path), None))
+        except Exception as e:
+            results.append((file, None, str(e)))
+    return results
+
+
+class EntityIndex:
+    '''
+    Maps each entity key to the save games containing it and how often.
+    The counts per file and their modification times are stored in the index file.
+    '''
+
+    def __init__(self, json_folder: str, index_path: str = INDEX_PATH) -> None:
+        self.json_folder = json_folder
+        self.index_path = index_path
+        # Relative path of the json file -> (mtime, counts)
+        self.files: Dict[str, Tuple[int, Dict[str, int]]] = {}
+        self.entities: Dict[str, Dict[str, int]] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.isfile(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'Could not read entity index: {e}')
+            return
+        if data.get('version') != INDEX_VERSION or data.get('folder') != self.json_folder:
+            return
+        self.files = {file: (entry['mtime'], entry['counts']) for (file, entry) in data['files'].items()}
+        for (file, (_, counts)) in self.files.items():
+            self.add_to_entities(file, counts)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({
+                'version': INDEX_VERSION,
+                'folder': self.json_folder,
+                'files': {file: {'mtime': mtime, 'counts': counts} for (file, (mtime, counts)) in self.files.items()}
+            }, file)
+        os.replace(tmp_path, self.index_path)
+
+    def add_to_entities(self, file: str, counts: Dict[str, int]) -> None:
+        for (key, count) in counts.items():
+            self.entities.setdefault(key, {})[file] = count
+
+    def remove_from_entities(self, file: str) -> None:
+        for key in self.files[file][1]:
+            files = self.entities[key]
+            del files[file]
+            if len(files) == 0:
+                del self.entities[key]
+
+    def find_changed_files(self) -> Tuple[List[Tuple[str, str, int]], List[str]]:
+        '''
+        Returns (file, path, mtime) of the new or modified files and the files that were removed.
+        '''
+        changed = []
+        found = set()
+        for root, dirs, files in os.walk(self.json_folder):
+            for file in files:
+                path = os.path.join(root, file)
+                relpath = os.path.relpath(path, self.json_folder)
+                found.add(relpath)
+                mtime = os.stat(path).st_mtime_ns
+                if relpath not in self.files or self.files[relpath][0] != mtime:
+                    changed.append((relpath, path, mtime))
+        return (changed, [file for file in self.files if file not in found])
+
+    def update(self, progress: Callable[[int], None] = lambda progress: None, is_aborted: Callable[[], bool] = lambda: False) -> int:
+        '''
+        Parses all new or modified files in a process pool.
+        Returns the number of updated files.
+        '''
+        (changed, removed) = self.find_changed_files()
+        for file in removed:
+            self.remove_from_entities(file)
+            del self.files[file]
+        if len(changed) == 0:
+            if len(removed) > 0:
+                self.save()
+            return len(removed)
+
+        mtimes = {file: mtime for (file, _, mtime) in changed}
+        chunks = [[(file, path) for (file, path, _) in changed[i:i + CHUNK_SIZE]] for i in range(0, len(changed), CHUNK_SIZE)]
+        done = 0
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(count_entities_in_files, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                if is_aborted():
+                    for remaining in futures:
+                        remaining.cancel()
+                    break
+                for (file, counts, error) in future.result():
+                    if error is not None:
+                        print(f'Could not read {file}: {error}')
+                        continue
+                    if file in self.files:
+                        self.remove_from_entities(file)
+                    self.files[file] = (mtimes[file], counts)
+                    self.add_to_entities(file, counts)
+                done += CHUNK_SIZE
+                progress(min(done, len(changed)) * 100 // len(changed))
+        # Files parsed before an abort are kept, the rest is parsed on the next update
+        self.save()
+        return len(changed) + len(removed)
+
+    # Queries return the relative paths of the json files and the number of matching entities
+
+    def search(self, kind: int, id: int, type: Optional[int] = None) -> Dict[str, int]:
+        return dict(self.entities.get(get_entity_key(kind, id, type), {}))
+
+    def search_any(self, kind: int, ids: Iterable[int]) -> Dict[str, int]:
+        '''
+        Finds the save games containing any of the ids and sums up their counts.
+        '''
+        result: Dict[str, int] = {}
+        for id in ids:
+            for (file, count) in self.search(kind, id).items():
+                result[file] = result.get(file, 0) + count
+        return result
+
+    def search_all(self, entities: Iterable[Tuple[int, int]]) -> Dict[str, int]:
+        '''
+        Finds the save games containing all of the (kind, id) entities at the same time.
+        The count is the number of the rarest of them.
+        '''
+        result: Optional[Dict[str, int]] = None
+        for (kind, id) in entities:
+            found = self.search(kind, id)
+            if result is None:
+                result = found
+            else:
+                result = {file: min(count, found[file]) for (file, count) in result.items() if file in found}
+        return result or {}
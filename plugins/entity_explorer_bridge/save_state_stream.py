@@ -0,0 +1,126 @@
+from datetime import datetime
+import os
+from typing import Any, Dict, Optional, Tuple
+import zlib
+import numpy as np
+from PySide6.QtCore import QObject
+from plugins.entity_explorer_bridge.server import EntityExplorerServer
+
+# Streaming of save states to Entity Explorer.
+# Instead of the whole save state, only the zlib compressed xor against the last sent state is sent.
+#
+# save_state_full: {'format', 'sequence', 'data'} data is the compressed save state
+# save_state_delta: {'format', 'sequence', 'base', 'data'} data is the compressed xor against the state with the sequence number base
+#
+# The client can emit request_full_state when it missed a state to resync.
+
+COMPRESSION_LEVEL = 1
+
+
+def get_save_state_format(path: str) -> str:
+    return 'bizhawk' if path.endswith('.State') else 'mgba'
+
+
+def xor_bytes(a: bytes, b: bytes) -> bytes:
+    return np.bitwise_xor(np.frombuffer(a, dtype=np.uint8), np.frombuffer(b, dtype=np.uint8)).tobytes()
+
+
+def apply_delta(base: bytes, delta: Dict[str, Any]) -> bytes:
+    '''
+    Restores the save state from the state it is based on and the delta.
+    '''
+    return xor_bytes(base, zlib.decompress(delta['data']))
+
+
+class SaveStateStream:
+    '''
+    Encodes the save states as full states or deltas against the last sent state.
+    '''
+
+    def __init__(self) -> None:
+        self.sequence = 0
+        self.last_format: Optional[str] = None
+        self.last_state: Optional[bytes] = None
+        self.needs_full_state = True
+
+    def resync(self) -> None:
+        '''
+        The next state is sent in full.
+        '''
+        self.needs_full_state = True
+
+    def encode(self, format: str, data: bytes) -> Optional[Tuple[str, Dict[str, Any]]]:
+        '''
+        Returns the event and payload to send for this state or None if it did not change.
+        '''
+        data = bytes(data)
+        can_use_delta = not self.needs_full_state and self.last_format == format and len(self.last_state) == len(data)
+        if can_use_delta and data == self.last_state:
+            return None
+
+        full = zlib.compress(data, COMPRESSION_LEVEL)
+        event = ('save_state_full', {'format': format, 'sequence': self.sequence + 1, 'data': full})
+        if can_use_delta:
+            delta = zlib.compress(xor_bytes(self.last_state, data), COMPRESSION_LEVEL)
+            if len(delta) < len(full):
+                event = ('save_state_delta', {'format': format, 'sequence': self.sequence + 1, 'base': self.sequence, 'data': delta})
+
+        self.sequence += 1
+        self.last_format = format
+        self.last_state = data
+        self.needs_full_state = False
+        return event
+
+    def encode_last_state(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        '''
+        Returns the last state as a full state.
+        '''
+        self.resync()
+        if self.last_state is None:
+            return None
+        (format, data) = (self.last_format, self.last_state)
+        self.last_state = None
+        return self.encode(format, data)
+
+
+class SaveStateWorker(QObject):
+    '''
+    Reads modified save states and sends them to Entity Explorer outside of the UI thread.
+    '''
+
+    def __init__(self, server: EntityExplorerServer, stream_deltas: bool, copy_folder: Optional[str]) -> None:
+        super().__init__()
+        self.server = server
+        self.stream_deltas = stream_deltas
+        self.copy_folder = copy_folder
+        self.stream = SaveStateStream()
+
+    def slot_file_modified(self, path: str) -> None:
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError as e:
+            print(f'Could not read save state {path}: {e}')
+            return
+
+        if self.stream_deltas:
+            self.send(self.stream.encode(get_save_state_format(path), data))
+        else:
+            self.server.slot_send_save_state(path, data)
+
+        if self.copy_folder:
+            name = os.path.basename(path)
+            name = datetime.now().strftime('%Y-%m-%d_%H_%M_%S_%f_') + name
+            with open(os.path.join(self.copy_folder, name), 'wb') as output:
+                output.write(data)
+
+    def slot_resync(self) -> None:
+        '''
+        Sends the last state in full, so that a newly connected client or a client that missed a state can continue.
+        '''
+        if self.stream_deltas:
+            self.send(self.stream.encode_last_state())
+
+    def send(self, event: Optional[Tuple[str, Dict[str, Any]]]) -> None:
+        if event is not None:
+            self.server.send(*event)
@@ -1,19 +1,13 @@
-from dataclasses import dataclass
-from typing import List
-from tlh.const import ROM_OFFSET, RomVariant
+from typing import List, Optional
+from tlh.const import RomVariant
 from tlh.plugin.api import PluginApi
 from tlh.data.database import get_pointer_database, get_symbol_database
-
-
-@dataclass
-class Edge:
-    from_symbol: str
-    from_offset: int
-    to_symbol: str
-    to_offset: int
+from plugins.function_call_graph.graph import CallGraph, build_edges
 
 
 rom_variant = RomVariant.USA
+# Maximum number of symbols to list in a message box
+MAX_LISTED_SYMBOLS = 40
 
 
 class FunctionCallGraphPlugin:
@@ -22,60 +16,76 @@ class FunctionCallGraphPlugin:
 
     def __init__(self, api: PluginApi) -> None:
         self.api = api
+        self.graph: Optional[CallGraph] = None
 
     def load(self) -> None:
         self.action_call_graph = self.api.register_menu_entry(
             'Calculate call graph', self.slot_call_graph)
+        self.action_reachable = self.api.register_menu_entry(
+            'Find functions reached by...', self.slot_find_reachable)
+        self.action_callers = self.api.register_menu_entry(
+            'Find callers of...', self.slot_find_callers)
+        get_pointer_database().pointers_changed.connect(self.slot_invalidate)
+        get_symbol_database().symbols_changed.connect(self.slot_invalidate)
 
     def unload(self) -> None:
         self.api.remove_menu_entry(self.action_call_graph)
+        self.api.remove_menu_entry(self.action_reachable)
+        self.api.remove_menu_entry(self.action_callers)
+        get_pointer_database().pointers_changed.disconnect(self.slot_invalidate)
+        get_symbol_database().symbols_changed.disconnect(self.slot_invalidate)
+
+    def slot_invalidate(self) -> None:
+        self.graph = None
+
+    def get_graph(self) -> Optional[CallGraph]:
+        if self.graph is None:
+            symbol_database = get_symbol_database()
+            if not symbol_database.are_symbols_loaded(rom_variant):
+                self.api.show_error(
+                    self.name, f'Symbols for {rom_variant} rom are not loaded')
+                return None
+
+            symbols = symbol_database.get_symbols(rom_variant)
+            pointers = get_pointer_database().get_pointers(rom_variant)
+            self.graph = CallGraph(build_edges(pointers.get_sorted_pointers(), symbols))
+        return self.graph
 
     def slot_call_graph(self) -> None:
-
-        symbol_database = get_symbol_database()
-
-        pointers = get_pointer_database().get_pointers(rom_variant)
-        if not symbol_database.are_symbols_loaded(rom_variant):
-            self.api.show_error(
-                self.name, f'Symbols for {rom_variant} rom are not loaded')
+        graph = self.get_graph()
+        if graph is None:
             return
 
-        symbols = symbol_database.get_symbols(rom_variant)
-
-        nodes = set()
-        edges: List[Edge] = []
+        # Print graph
+        with open('tmp/call_graph.gml', 'w') as f:
+            graph.write_gml(f)
+        with open('tmp/call_graph.json', 'w') as f:
+            graph.write_json(f)
 
-        for pointer in pointers.get_sorted_pointers():
-            symbol_from = symbols.get_symbol_at(pointer.address)
-            symbol_to = symbols.get_symbol_at(pointer.points_to-ROM_OFFSET)
-            offset_from = pointer.address - symbol_from.address
-            offset_to = pointer.points_to-ROM_OFFSET - symbol_to.address
+        recursive = [component for component in graph.get_strongly_connected_components() if len(component) > 1]
+        for component in recursive:
+            print(f'Symbols reaching each other: {", ".join(component)}')
+        self.api.show_message(self.name, f'Wrote {len(graph.names)} symbols and {len(graph.edges)} edges to tmp/call_graph.gml and tmp/call_graph.json.\n{len(recursive)} groups of symbols reach each other.')
 
-            nodes.add(symbol_from.name)
-            nodes.add(symbol_to.name)
+    def slot_find_reachable(self) -> None:
+        self.find_symbols('Find functions reached by', lambda graph, name: graph.get_reachable(name))
 
-            edges.append(Edge(symbol_from.name, offset_from,
-                         symbol_to.name, offset_to))
+    def slot_find_callers(self) -> None:
+        self.find_symbols('Find callers of', lambda graph, name: graph.get_callers(name))
 
-        # Print graph
-        with open('tmp/call_graph.gml', 'w') as f:
-            f.write('graph [\n')
-            f.write('directed 1\n')
-
-            nodes_with_order = list(nodes)
-
-            for i, node in enumerate(nodes_with_order):
-                f.write('node [\n')
-                f.write(f'id {i}\n')
-                f.write(f'label "{node}"\n')
-                f.write(']\n')
-
-            for edge in edges:
-                f.write('edge [\n')
-                f.write(f'source {nodes_with_order.index(edge.from_symbol)}\n')
-                f.write(f'target {nodes_with_order.index(edge.to_symbol)}\n')
-                f.write(
-                    f'label "{edge.from_symbol} +{edge.from_offset} -> {edge.to_symbol} +{edge.to_offset}"\n')
-                f.write(']\n')
-
-            f.write(']\n')
+    def find_symbols(self, title: str, query) -> None:
+        graph = self.get_graph()
+        if graph is None:
+            return
+        (name, ok) = self.api.show_text_input(title, 'Symbol name')
+        if not ok:
+            return
+        if name not in graph.node_ids:
+            self.api.show_error(self.name, f'{name} is not part of the call graph')
+            return
+        symbols: List[str] = sorted(query(graph, name))
+        print('\n'.join(symbols))
+        listed = '\n'.join(symbols[:MAX_LISTED_SYMBOLS])
+        if len(symbols) > MAX_LISTED_SYMBOLS:
+            listed += '\n...'
+        self.api.show_message(title, f'{len(symbols)} symbols found. See console for the full list.\n{listed}')
@@ -0,0 +1,170 @@
+from dataclasses import dataclass
+import json
+from typing import Dict, Iterable, List, TextIO, Tuple
+import numpy as np
+from tlh.const import ROM_OFFSET
+from tlh.data.pointer import Pointer
+from tlh.data.symbols import SymbolList
+
+
+@dataclass
+class Edge:
+    from_symbol: str
+    from_offset: int
+    to_symbol: str
+    to_offset: int
+
+
+def build_edges(pointers: Iterable[Pointer], symbols: SymbolList) -> List[Edge]:
+    '''
+    Creates an edge from the symbol containing each pointer to the symbol it points to.
+    '''
+    pointers = list(pointers)
+    found = symbols.get_symbols_at([pointer.address for pointer in pointers] + [pointer.points_to - ROM_OFFSET for pointer in pointers])
+    edges = []
+    for pointer in pointers:
+        symbol_from = found.get(pointer.address)
+        symbol_to = found.get(pointer.points_to - ROM_OFFSET)
+        if symbol_from is None or symbol_to is None:
+            continue
+        edges.append(Edge(symbol_from.name, pointer.address - symbol_from.address,
+                          symbol_to.name, pointer.points_to - ROM_OFFSET - symbol_to.address))
+    return edges
+
+
+class CallGraph:
+    '''
+    Graph of the symbols with the edges stored as compressed sparse rows in both directions.
+    '''
+
+    def __init__(self, edges: List[Edge]) -> None:
+        self.edges = edges
+        self.node_ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        sources = np.fromiter((self.get_or_add_node(edge.from_symbol) for edge in edges), dtype=np.int64, count=len(edges))
+        targets = np.fromiter((self.get_or_add_node(edge.to_symbol) for edge in edges), dtype=np.int64, count=len(edges))
+        self.edge_sources = sources
+        self.edge_targets = targets
+        (self.callee_offsets, self.callees) = self.to_csr(sources, targets)
+        (self.caller_offsets, self.callers) = self.to_csr(targets, sources)
+
+    def get_or_add_node(self, name: str) -> int:
+        if name not in self.node_ids:
+            self.node_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.node_ids[name]
+
+    def to_csr(self, sources: np.ndarray, targets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(sources, kind='stable')
+        offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.names)), out=offsets[1:])
+        return (offsets, targets[order])
+
+    def get_callees(self, name: str) -> List[str]:
+        '''
+        Returns the symbols this symbol points to directly.
+        '''
+        node = self.node_ids[name]
+        return [self.names[i] for i in np.unique(self.callees[self.callee_offsets[node]:self.callee_offsets[node + 1]])]
+
+    def get_callers(self, name: str) -> List[str]:
+        '''
+        Returns the symbols that point to this symbol directly.
+        '''
+        node = self.node_ids[name]
+        return [self.names[i] for i in np.unique(self.callers[self.caller_offsets[node]:self.caller_offsets[node + 1]])]
+
+    def get_reachable(self, name: str) -> List[str]:
+        '''
+        Returns all symbols this symbol transitively reaches.
+        '''
+        return self.traverse(self.node_ids[name], self.callee_offsets, self.callees)
+
+    def get_reaching(self, name: str) -> List[str]:
+        '''
+        Returns all symbols that transitively reach this symbol.
+        '''
+        return self.traverse(self.node_ids[name], self.caller_offsets, self.callers)
+
+    def traverse(self, start: int, offsets: np.ndarray, adjacent: np.ndarray) -> List[str]:
+        visited = np.zeros(len(self.names), dtype=bool)
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for next in adjacent[offsets[node]:offsets[node + 1]]:
+                if not visited[next]:
+                    visited[next] = True
+                    stack.append(next)
+        return [self.names[i] for i in np.flatnonzero(visited)]
+
+    def get_strongly_connected_components(self) -> List[List[str]]:
+        '''
+        Returns the groups of symbols that reach each other, e.g. recursive functions.
+        Uses an iterative version of Tarjan's algorithm.
+        '''
+        count = len(self.names)
+        index = np.full(count, -1, dtype=np.int64)
+        lowlink = np.zeros(count, dtype=np.int64)
+        on_stack = np.zeros(count, dtype=bool)
+        stack: List[int] = []
+        components = []
+        next_index = 0
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            # (node, position of the next edge to visit)
+            work = [(root, self.callee_offsets[root])]
+            index[root] = lowlink[root] = next_index
+            next_index += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                (node, edge) = work[-1]
+                if edge < self.callee_offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    next = self.callees[edge]
+                    if index[next] == -1:
+                        index[next] = lowlink[next] = next_index
+                        next_index += 1
+                        stack.append(next)
+                        on_stack[next] = True
+                        work.append((next, self.callee_offsets[next]))
+                    elif on_stack[next]:
+                        lowlink[node] = min(lowlink[node], index[next])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(self.names[member])
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def write_gml(self, file: TextIO) -> None:
+        file.write('graph [\n')
+        file.write('directed 1\n')
+        for (i, name) in enumerate(self.names):
+            file.write(f'node [\nid {i}\nlabel "{name}"\n]\n')
+        for (edge, source, target) in zip(self.edges, self.edge_sources, self.edge_targets):
+            file.write(f'edge [\nsource {source}\ntarget {target}\n')
+            file.write(f'label "{edge.from_symbol} +{edge.from_offset} -> {edge.to_symbol} +{edge.to_offset}"\n]\n')
+        file.write(']\n')
+
+    def write_json(self, file: TextIO) -> None:
+        '''
+        Writes {"nodes": [name], "edges": [{source, target, source_offset, target_offset}]} one entry at a time.
+        '''
+        file.write('{"nodes": [')
+        for (i, name) in enumerate(self.names):
+            file.write((',\n' if i > 0 else '\n') + json.dumps(name))
+        file.write('\n], "edges": [')
+        for (i, (edge, source, target)) in enumerate(zip(self.edges, self.edge_sources, self.edge_targets)):
+            file.write((',\n' if i > 0 else '\n') + json.dumps({'source': int(source), 'target': int(target), 'source_offset': edge.from_offset, 'target_offset': edge.to_offset}))
+        file.write('\n]}\n')
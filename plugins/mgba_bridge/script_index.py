@@ -0,0 +1,177 @@
+from collections import OrderedDict
+import os
+from typing import Dict, List, Optional, Tuple
+from plugins.mgba_bridge.script_disassembler.script_disassembler import Instruction, disassemble_script
+from tlh.data.repo_index import RepoIndex
+
+# Index of the script labels in data/scripts, so that scripts executed in mGBA can be found without reading all script files.
+
+
+def find_script_labels(lines: List[str]) -> Dict[str, int]:
+    '''
+    Returns the line of each SCRIPT_START label.
+    '''
+    labels = {}
+    for (i, line) in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith('SCRIPT_START '):
+            labels.setdefault(stripped[len('SCRIPT_START '):].strip(), i)
+    return labels
+
+
+class ScriptIndex:
+    '''
+    Maps the SCRIPT_START labels to the file and line they are defined in.
+    The lines of the script files are kept, so answering a script event does not need to touch the disk.
+    The script files and their changes are taken from the repo index.
+    '''
+
+    def __init__(self, repo_index: RepoIndex, folder: str) -> None:
+        self.repo_index = repo_index
+        # Relative to the repo
+        self.folder = folder
+        # mtime and lines of each script file
+        self.files: Dict[str, Tuple[int, List[str]]] = {}
+        self.labels: Dict[str, Tuple[str, int]] = {}
+        # Script files named after the script
+        self.file_names: Dict[str, str] = {}
+        # Generation of the repo index the files were read at
+        self.generation: Optional[int] = None
+
+    def update(self) -> None:
+        '''
+        Reads all script files that changed since the last update.
+        '''
+        paths = self.repo_index.list_files(self.folder, ['.inc'])
+        self.generation = self.repo_index.generation
+        files = {}
+        for path in paths:
+            try:
+                mtime = self.repo_index.get_mtime(path)
+                if path in self.files and self.files[path][0] == mtime:
+                    files[path] = self.files[path]
+                    continue
+                with open(path, 'r') as file:
+                    files[path] = (mtime, file.read().split('\n'))
+            except (OSError, UnicodeDecodeError) as e:
+                print(f'Could not read script file {path}: {e}')
+        self.files = files
+
+        labels = {}
+        file_names = {}
+        for path in sorted(files):
+            for (label, line) in find_script_labels(files[path][1]).items():
+                labels.setdefault(label, (path, line))
+            file_names.setdefault(os.path.basename(path)[:-len('.inc')], path)
+        self.labels = labels
+        self.file_names = file_names
+
+    def find_script(self, script_name: str) -> Optional[str]:
+        '''
+        Returns the file containing the script.
+        '''
+        self.repo_index.refresh()
+        if self.generation != self.repo_index.generation:
+            self.update()
+        if script_name in self.file_names:
+            return self.file_names[script_name]
+        if script_name in self.labels:
+            return self.labels[script_name][0]
+        return None
+
+    def get_lines(self, path: str) -> List[str]:
+        return self.files[path][1]
+
+
+class DisassemblyCache:
+    '''
+    Keeps the disassembled instructions of the recently executed scripts.
+    The bytes of the script are part of the key, so a rebuilt rom disassembles changed scripts again.
+    '''
+
+    MAX_ENTRIES = 256
+
+    def __init__(self) -> None:
+        self.instructions: OrderedDict[Tuple[str, int, bytes], List[Instruction]] = OrderedDict()
+
+    def get_instructions(self, script_name: str, address: int, data: bytes) -> List[Instruction]:
+        key = (script_name, address, bytes(data))
+        instructions = self.instructions.get(key)
+        if instructions is not None:
+            self.instructions.move_to_end(key)
+            return instructions
+        (_, instructions) = disassemble_script(data, address)
+        self.instructions[key] = instructions
+        if len(self.instructions) > self.MAX_ENTRIES:
+            self.instructions.popitem(last=False)
+        return instructions
+
+
+def annotate_script(script_lines: List[str], script_name: str, script_offset: int, instructions: List[Instruction]) -> str:
+    '''
+    Prefixes the lines of the script with the offsets of the instructions and marks the current instruction.
+    '''
+    output = ''
+    current_instruction = 0
+    in_correct_script = False
+
+    ifdef_stack = [True]
+
+    for line in script_lines:
+        stripped = line.strip()
+        if stripped.startswith('SCRIPT_START'):
+            in_correct_script = stripped == 'SCRIPT_START ' + script_name
+            output += f'{line}\n'
+            continue
+        if not in_correct_script or stripped.startswith('@') or stripped.endswith(':'):
+            output += f'{line}\n'
+            continue
+
+        if '.ifdef' in stripped:
+            if not ifdef_stack[-1]:
+                ifdef_stack.append(False)
+                output += f'{line}\n'
+                continue
+            # TODO check variant
+            is_usa = stripped.split(' ')[1] == 'USA'
+            ifdef_stack.append(is_usa)
+            output += f'{line}\n'
+            continue
+        if '.ifndef' in stripped:
+            if not ifdef_stack[-1]:
+                ifdef_stack.append(False)
+                output += f'{line}\n'
+                continue
+            is_usa = stripped.split(' ')[1] == 'USA'
+            ifdef_stack.append(not is_usa)
+            output += f'{line}\n'
+            continue
+        if '.else' in stripped:
+            if ifdef_stack[-2]:
+                # If the outermost ifdef is not true, this else does not change the validiness of this ifdef
+                ifdef_stack[-1] = not ifdef_stack[-1]
+            output += f'{line}\n'
+            continue
+        if '.endif' in stripped:
+            ifdef_stack.pop()
+            output += f'{line}\n'
+            continue
+
+        if not ifdef_stack[-1]:
+            # Not defined for this variant
+            output += f'{line}\n'
+            continue
+
+        if current_instruction >= len(instructions):
+            # TODO maybe even not print additional lines?
+            output += f'{line}\n'
+            continue
+        addr = instructions[current_instruction].addr
+        prefix = ''
+        if addr == script_offset:
+            prefix = '>'
+        output += f'{addr:03d}| {prefix}{line}\t\n'
+        current_instruction += 1
+        if stripped.startswith('SCRIPT_END'):
+            break
+    return output
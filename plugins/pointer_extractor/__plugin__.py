@@ -1,31 +1,13 @@
-from typing import Dict, List
-from tlh.data.pointer import Pointer
-from sortedcontainers.sortedlist import SortedKeyList
+from typing import Dict, Set
 from tlh.const import ROM_OFFSET, RomVariant
 from tlh.data.database import get_pointer_database, get_symbol_database
+from tlh.data.repo_index import get_repo_index
 from tlh.plugin.api import PluginApi
 import os
 from tlh import settings
-from dataclasses import dataclass
-from intervaltree import IntervalTree, Interval
-from sortedcontainers import SortedList
-
-@dataclass
-class Incbin:
-    address: int = 0
-    length: int = 0
-    file: str = ''
-
-@dataclass(frozen=True, eq=True) # To make it hashable https://stackoverflow.com/a/52390734
-class MissingLabel:
-    address: int = 0
-    symbol: str = ''
-    offset: int = 0
-    file: str = ''
-
-def incbin_line(addr, length) -> str:
-    return f'\t.incbin "baserom.gba", {"{0:#08x}".format(addr).upper().replace("0X", "0x")}, {"{0:#09x}".format(length).upper().replace("0X", "0x")}\n'
+from plugins.pointer_extractor.extractor import ExtractionError, Incbin, MissingLabel, apply_insertions, assign_pointers_to_incbins, get_insertions, resolve_targets
 
+DIFF_PATH = os.path.join('tmp', 'pointer_extractor.diff')
 
 class PointerExtractorPlugin:
     name = 'Pointer Extractor'
@@ -39,44 +21,28 @@ class PointerExtractorPlugin:
     def load(self) -> None:
         self.action_parse_incbins = self.api.register_menu_entry('Parse files for .incbins', self.slot_parse_incbins)
         self.action_find_pointers = self.api.register_menu_entry('Find unextracted pointers', self.slot_find_pointers)
+        self.action_preview_pointers = self.api.register_menu_entry('Preview pointer extraction', self.slot_preview_pointers)
 
     def unload(self) -> None:
         self.api.remove_menu_entry(self.action_parse_incbins)
         self.api.remove_menu_entry(self.action_find_pointers)
+        self.api.remove_menu_entry(self.action_preview_pointers)
 
     def slot_parse_incbins(self) -> None:
-        incbins = []
+        self.incbins = get_repo_index().get_incbins()
+        self.api.show_message('Pointer Extractor', f'{len(self.incbins)} .incbins found')
 
-        assembly_extensions = ['.inc', '.s']
-        for root, dirs, files in os.walk(settings.get_repo_location()):
-            for file in files:
-                filename, file_extension = os.path.splitext(file)
-                if file_extension in assembly_extensions:
-                    incbins.extend(self.find_incbins(os.path.join(root, file)))
-        self.incbins = IntervalTree(incbins)
-        self.api.show_message('Pointer Extractor', f'{len(incbins)} .incbins found')
-
-    def find_incbins(self, path: str) -> List[Interval]:
-        incbins = []
-        with open(path, 'r') as file:
-            for line in file:
-                line = line.strip()
-                if line.startswith('.incbin "baserom.gba"'):
-                    arr = line.split(',')
-                    if len(arr) == 3:
-                        addr = int(arr[1], 16)
-                        length = int(arr[2], 16)
-                        incbin = Interval(addr, addr+length, path)
-                        incbins.append(incbin)
-                    else:
-                        print(f'Invalid incbin: {line}')
-        return incbins
+    def slot_find_pointers(self) -> None:
+        self.extract_pointers(False)
 
+    def slot_preview_pointers(self) -> None:
+        '''
+        Writes the changes to the assembly files as a diff without changing them
+        '''
+        self.extract_pointers(True)
 
-    def slot_find_pointers(self) -> None:
+    def extract_pointers(self, dry_run: bool) -> None:
         if self.incbins is None:
-            #self.api.show_error('Pointer Extractor', 'Need to parse .incbins first')
-            #return
             self.slot_parse_incbins()
 
         symbol_database = get_symbol_database()
@@ -87,200 +53,58 @@ class PointerExtractorPlugin:
 
         symbols = symbol_database.get_symbols(RomVariant.USA)
 
-        pointers = get_pointer_database().get_pointers(RomVariant.USA)
+        pointers = sorted(get_pointer_database().get_pointers(RomVariant.USA), key=lambda pointer: pointer.address)
+        incbins = [Incbin(interval.begin, interval.end - interval.begin, interval.data) for interval in sorted(self.incbins)]
+        to_extract = assign_pointers_to_incbins(pointers, incbins)
 
-        to_extract: Dict[str, SortedKeyList[Pointer]] = {}
-
-        for pointer in pointers:
-            found = self.incbins.at(pointer.address)
-            if len(found) == 1:
-                interval = found.pop()
-                file = interval.data
-
-                if not file in to_extract:
-                    to_extract[file] = SortedKeyList(key=lambda x:x.address)
-
-                to_extract[file].add(pointer)
-#                print(hex(pointer.address))
-                #print(found.pop())
-            elif len(found) > 1:
-                print(f'Found {len(found)} incbins for address {pointer.address}')
-        
         # Count unextracted pointers
         count = 0
         for file in to_extract:
             print(f'{file}: {len(to_extract[file])}')
             count += len(to_extract[file])
-
-        self.api.show_message('Pointer Extractor', f'{count} unextracted pointers found')
         print(count)
 
-
         # Find symbols that unextracted pointers point to
-        missing_labels = {}
-        count = 0
+        targets = resolve_targets([pointer.points_to - ROM_OFFSET for file in to_extract for pointer in to_extract[file]], symbols)
+        missing_labels: Dict[str, Set[MissingLabel]] = {}
         for file in to_extract:
             for pointer in to_extract[file]:
-
-                symbol = symbols.get_symbol_at(pointer.points_to - ROM_OFFSET)
-                offset = pointer.points_to - ROM_OFFSET - symbol.address
+                target = targets.get(pointer.points_to - ROM_OFFSET)
+                if target is None:
+                    continue
+                (symbol, offset) = target
                 if offset > 1: # Offset 1 is ok for function pointers
-                    print(pointer)
-                    if symbol.file not in missing_labels:
-                        missing_labels[symbol.file] = SortedKeyList(key=lambda x:x.address)
-                    # Insert Missing label if there is not already one
                     label = MissingLabel(pointer.points_to - ROM_OFFSET, symbol.name, offset, symbol.file)
-                    if label not in missing_labels[symbol.file]:
-                        missing_labels[symbol.file].add(label)
-                        count += 1
-                    continue
+                    missing_labels.setdefault(symbol.file, set()).add(label)
 
-        print(f'{count} missing labels')
+        print(f'{sum(len(labels) for labels in missing_labels.values())} missing labels')
+        label_files = {}
         for file in missing_labels:
             print(f'{file}: {len(missing_labels[file])}')
-
-
-        # Insert labels for incbins
-        for path in missing_labels:
-            output_lines = []
-            labels = missing_labels[path]
-            next_label = labels.pop(0)
-
             # Try to find source assembly file
-            asm_path = os.path.join(settings.get_repo_location(), path.replace('.o', '.s'))
+            asm_path = os.path.join(settings.get_repo_location(), file.replace('.o', '.s'))
             if not os.path.isfile(asm_path):
-                print(f'Cannot insert labels in {path}')
-                print(missing_labels[path])
+                print(f'Cannot insert labels in {file}')
+                print(missing_labels[file])
                 continue
+            label_files[os.path.normpath(asm_path)] = sorted(missing_labels[file], key=lambda label: label.address)
+
+        to_extract = {os.path.normpath(file): pointers for (file, pointers) in to_extract.items()}
+        insertions = get_insertions(label_files, to_extract, targets)
+        try:
+            (diff, skipped) = apply_insertions(insertions, dry_run)
+        except ExtractionError as e:
+            print(e)
+            self.api.show_error('Pointer Extractor', str(e))
+            return
 
-            with open(asm_path, 'r') as file:
-                for line in file:
-                    if next_label is not None and line.strip().startswith('.incbin "baserom.gba"'):
-                        arr = line.split(',')
-                        if len(arr) == 3:
-                            addr = int(arr[1], 16)
-                            length = int(arr[2], 16)
-
-                            while next_label is not None and next_label.address < addr:
-                                print(f'Cannot insert {next_label}')
-                                if len(labels) == 0: # Extracted all labels
-                                    next_label = None
-                                    break
-                                next_label = labels.pop(0)
-                                continue
-
-                            while next_label is not None and next_label.address >= addr and next_label.address < addr+length:
-                                # Calculate new incbins
-                                prev_addr = addr
-                                prev_length = next_label.address - addr
-                                after_addr = next_label.address
-                                after_length = addr+length - after_addr
-
-                                if prev_length > 0:
-                                    # print the incbin
-                                    output_lines.append(incbin_line(prev_addr, prev_length))
-                                
-                                # Print the label
-                                label_addr = '{0:#010x}'.format(next_label.address + ROM_OFFSET).upper().replace('0X', '')
-                                output_lines.append(f'gUnk_{label_addr}:: @ {label_addr}\n')
-
-                                addr = after_addr
-                                length = after_length
-
-                                if len(labels) == 0: # Extracted all labels
-                                    next_label = None
-                                    break
-                                next_label = labels.pop(0)
-                                continue
-
-
-                            if length > 0:
-                                output_lines.append(incbin_line(addr, length))
-                            continue
-                    output_lines.append(line)
-
-            while next_label is not None:
-
-                # tmp: print label for script
-                label_addr = '{0:#010x}'.format(next_label.address + ROM_OFFSET).upper().replace('0X', '')
-                print(f'SCRIPT_START script_{label_addr}')
-                print(f'at {next_label.symbol}')
-
-                #print(f'Could not insert {next_label}')
-                if len(labels) == 0: # Extracted all labels
-                    next_label = None
-                    break
-                next_label = labels.pop(0)
-
-            print(f'Write {asm_path}')
-            print(next_label)
-            with open(asm_path, 'w') as file:
-                file.writelines(output_lines)
-
-        print('Extracting pointers')
-
-        # Extract pointers
-        for path in to_extract:
-            output_lines = []
-            pointers = to_extract[path]
-            next_pointer = pointers.pop(0)
-            with open(path, 'r') as file:
-                for line in file:
-                    if next_pointer is not None and line.strip().startswith('.incbin "baserom.gba"'):
-                        arr = line.split(',')
-                        if len(arr) == 3:
-                            addr = int(arr[1], 16)
-                            length = int(arr[2], 16)
-
-                            while next_pointer.address >= addr and next_pointer.address < addr+length:
-                                # Pointer is in this incbin
-                                symbol = symbols.get_symbol_at(next_pointer.points_to - ROM_OFFSET)
-                                offset = next_pointer.points_to - ROM_OFFSET - symbol.address
-                                if offset > 1:
-                                    # Missing label
-                                    if len(pointers) == 0: # Extracted all pointers
-                                        next_pointer = None
-                                        break
-                                    next_pointer = pointers.pop(0)
-                                    continue
-
-                                # Calculate new incbins
-                                prev_addr = addr
-                                prev_length = next_pointer.address - addr
-                                after_addr = next_pointer.address + 4
-                                after_length = addr+length - after_addr
-                                if after_length < 0:
-                                    message = f'Pointer at {hex(next_pointer.address)} crosses over from incbin at {hex(addr)}'
-                                    print(path)
-                                    print(after_length)
-                                    print(message)
-                                    self.api.show_error('Pointer Extractor', message)
-                                    return
-
-                                if prev_length > 0:
-                                    # print the incbin
-                                    output_lines.append(incbin_line(prev_addr, prev_length))
-                                
-                                # Print the pointer
-                                output_lines.append(f'\t.4byte {symbol.name}\n')
-
-
-                                addr = after_addr
-                                length = after_length
-
-                                if len(pointers) == 0: # Extracted all pointers
-                                    next_pointer = None
-                                    break
-                                next_pointer = pointers.pop(0)
-
-                            if length > 0:
-                                output_lines.append(incbin_line(addr, length))
-                            continue
-
-                    output_lines.append(line)
-
-            with open(path, 'w') as file:
-                file.writelines(output_lines)
-            #print(''.join(output_lines))
-        self.api.show_message('Pointer Extractor', f'Done extracting pointers')
+        for insertion in skipped:
+            print(f'Cannot insert {insertion.line.strip()} at {hex(insertion.address)}')
 
+        if dry_run:
+            os.makedirs(os.path.dirname(DIFF_PATH), exist_ok=True)
+            with open(DIFF_PATH, 'w') as file:
+                file.write(diff)
+            self.api.show_message('Pointer Extractor', f'{count} unextracted pointers found.\nThe changes to {len(insertions)} files were written to {DIFF_PATH}.')
+        else:
+            self.api.show_message('Pointer Extractor', f'Extracted pointers and labels in {len(insertions)} files.')
@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import difflib
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+from tlh.const import ROM_OFFSET
+from tlh.data.pointer import Pointer
+from tlh.data.symbols import Symbol, SymbolList
+
+# Extraction of pointers and labels from the .incbins of the assembly files.
+# Pointers, .incbins and symbols are each sorted once and then merged linearly.
+
+
+@dataclass
+class Incbin:
+    address: int = 0
+    length: int = 0
+    file: str = ''
+
+@dataclass(frozen=True, eq=True) # To make it hashable https://stackoverflow.com/a/52390734
+class MissingLabel:
+    address: int = 0
+    symbol: str = ''
+    offset: int = 0
+    file: str = ''
+
+@dataclass
+class Insertion:
+    '''
+    A line that replaces length bytes at the address of an .incbin.
+    '''
+    address: int
+    length: int
+    line: str
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def incbin_line(addr, length) -> str:
+    return f'\t.incbin "baserom.gba", {"{0:#08x}".format(addr).upper().replace("0X", "0x")}, {"{0:#09x}".format(length).upper().replace("0X", "0x")}\n'
+
+
+def label_line(address: int) -> str:
+    label_addr = '{0:#010x}'.format(address + ROM_OFFSET).upper().replace('0X', '')
+    return f'gUnk_{label_addr}:: @ {label_addr}\n'
+
+
+def assign_pointers_to_incbins(pointers: List[Pointer], incbins: List[Incbin]) -> Dict[str, List[Pointer]]:
+    '''
+    Returns the pointers inside of .incbins for each file.
+    Both lists need to be sorted by address.
+    '''
+    to_extract: Dict[str, List[Pointer]] = {}
+    i = 0
+    # Largest end address of the .incbins before the current one to detect overlapping .incbins
+    previous_end = 0
+    current: Optional[Incbin] = None
+    for pointer in pointers:
+        while i < len(incbins) and incbins[i].address <= pointer.address:
+            if current is not None:
+                previous_end = max(previous_end, current.address + current.length)
+            current = incbins[i]
+            i += 1
+        if current is None or pointer.address >= current.address + current.length:
+            if previous_end > pointer.address:
+                to_extract.setdefault(find_incbin_before(incbins, i, pointer.address).file, []).append(pointer)
+            continue
+        if previous_end > pointer.address:
+            print(f'Found multiple incbins for address {pointer.address}')
+            continue
+        to_extract.setdefault(current.file, []).append(pointer)
+    return to_extract
+
+
+def find_incbin_before(incbins: List[Incbin], end: int, address: int) -> Optional[Incbin]:
+    for incbin in reversed(incbins[:end]):
+        if incbin.address <= address < incbin.address + incbin.length:
+            return incbin
+
+
+def resolve_targets(addresses: Iterable[int], symbols: SymbolList) -> Dict[int, Tuple[Symbol, int]]:
+    '''
+    Returns the symbol containing each local address and the offset into it.
+    '''
+    targets = {}
+    for (address, symbol) in symbols.get_symbols_at(addresses).items():
+        targets[address] = (symbol, address - symbol.address)
+    return targets
+
+
+def insert_into_incbins(lines: List[str], insertions: List[Insertion]) -> Tuple[List[str], List[Insertion]]:
+    '''
+    Splits the .incbins at the addresses of the insertions in one pass over the lines.
+    The insertions need to be sorted by address.
+    Returns the new lines and the insertions that are not inside of an .incbin or overlap a previous insertion.
+    '''
+    output_lines = []
+    skipped = []
+    index = 0
+    for line in lines:
+        if index >= len(insertions) or not line.strip().startswith('.incbin "baserom.gba"'):
+            output_lines.append(line)
+            continue
+        arr = line.split(',')
+        if len(arr) != 3:
+            output_lines.append(line)
+            continue
+        addr = int(arr[1], 16)
+        length = int(arr[2], 16)
+
+        while index < len(insertions) and insertions[index].address < addr:
+            skipped.append(insertions[index])
+            index += 1
+
+        while index < len(insertions) and insertions[index].address < addr + length:
+            insertion = insertions[index]
+            index += 1
+            if insertion.address < addr:
+                # Inside of the previous pointer, splitting here would emit these bytes twice
+                skipped.append(insertion)
+                continue
+            after_addr = insertion.address + insertion.length
+            if after_addr > addr + length:
+                raise ExtractionError(f'Pointer at {hex(insertion.address)} crosses over from incbin at {hex(addr)}')
+            if insertion.address > addr:
+                output_lines.append(incbin_line(addr, insertion.address - addr))
+            output_lines.append(insertion.line)
+            length = addr + length - after_addr
+            addr = after_addr
+
+        if length > 0:
+            output_lines.append(incbin_line(addr, length))
+    skipped += insertions[index:]
+    return (output_lines, skipped)
+
+
+def get_insertions(missing_labels: Dict[str, List[MissingLabel]], to_extract: Dict[str, List[Pointer]], targets: Dict[int, Tuple[Symbol, int]]) -> Dict[str, List[Insertion]]:
+    '''
+    Collects the labels and pointers to insert into each assembly file.
+    '''
+    insertions: Dict[str, List[Insertion]] = {}
+    for (path, labels) in missing_labels.items():
+        for label in labels:
+            insertions.setdefault(path, []).append(Insertion(label.address, 0, label_line(label.address)))
+    for (path, pointers) in to_extract.items():
+        for pointer in pointers:
+            target = targets.get(pointer.points_to - ROM_OFFSET)
+            if target is None or target[1] > 1:
+                # Offset 1 is ok for function pointers, otherwise the label needs to be inserted first
+                continue
+            insertions.setdefault(path, []).append(Insertion(pointer.address, 4, f'\t.4byte {target[0].name}\n'))
+    for path in insertions:
+        # Labels at the same address as a pointer come first
+        insertions[path].sort(key=lambda insertion: (insertion.address, insertion.length))
+    return insertions
+
+
+def rewrite_file(path: str, insertions: List[Insertion]) -> Tuple[List[str], List[str], List[Insertion]]:
+    '''
+    Returns the old and new lines of the file and the insertions that were skipped.
+    '''
+    with open(path, 'r') as file:
+        lines = file.readlines()
+    (output_lines, skipped) = insert_into_incbins(lines, insertions)
+    return (lines, output_lines, skipped)
+
+
+def write_atomically(path: str, lines: List[str]) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        file.writelines(lines)
+    os.replace(tmp_path, path)
+
+
+def apply_insertions(insertions: Dict[str, List[Insertion]], dry_run: bool = False) -> Tuple[str, List[Insertion]]:
+    '''
+    Rewrites all files in parallel. No file is written if one of them cannot be rewritten.
+    Returns the diff of all changes and the insertions that were skipped.
+    '''
+    paths = sorted(insertions)
+    with ThreadPoolExecutor() as executor:
+        results = list(executor.map(lambda path: rewrite_file(path, insertions[path]), paths))
+
+    diff = []
+    skipped = []
+    for (path, (lines, output_lines, skipped_insertions)) in zip(paths, results):
+        diff += difflib.unified_diff(lines, output_lines, path, path)
+        skipped += skipped_insertions
+
+    if not dry_run:
+        changed = [(path, output_lines) for (path, (lines, output_lines, _)) in zip(paths, results) if output_lines != lines]
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(lambda item: write_atomically(*item), changed))
+    return (''.join(diff), skipped)
@@ -0,0 +1,108 @@
+from csv import DictWriter
+import os
+from typing import Dict, List
+from PySide6.QtCore import QObject, QThread, Signal
+from tlh import settings
+from tlh.const import RomVariant
+from tlh.data.database import get_pointer_database
+from tlh.data.pointer import Pointer
+from tlh.data.rom import get_rom
+from tlh.plugin.api import PluginApi
+from plugins.pointer_scanner.scanner import MAX_CONFIDENCE, AddressMapper, cross_check, find_candidates, get_new_pointers
+
+REPORT_PATH = os.path.join('tmp', 'pointer_scan.csv')
+
+class PointerScannerPlugin:
+    name = 'Pointer Scanner'
+    description = 'Finds pointers in the linked roms\nand ranks them by confidence'
+
+    def __init__(self, api: PluginApi) -> None:
+        self.api = api
+
+    def load(self) -> None:
+        self.action_scan = self.api.register_menu_entry('Scan for pointers', self.slot_scan)
+
+    def unload(self) -> None:
+        self.api.remove_menu_entry(self.action_scan)
+
+    def slot_scan(self) -> None:
+        '''
+        Scans the linked roms or only the USA rom if no hex viewers are linked
+        '''
+        diff_calculator = self.api.get_linked_diff_calculator()
+        variants = list(diff_calculator.variants) or [RomVariant.USA]
+        # Candidates in a single rom cannot be cross-checked
+        self.min_confidence = MAX_CONFIDENCE if len(variants) > 1 else MAX_CONFIDENCE - 2
+
+        mapper = AddressMapper(diff_calculator.constraint_manager, variants)
+        pointer_database = get_pointer_database()
+        known_addresses = {variant: [pointer.address for pointer in pointer_database.get_pointers(variant)] for variant in variants}
+
+        progress_dialog = self.api.get_progress_dialog(self.name, 'Scanning for pointers...', False)
+        progress_dialog.show()
+
+        self.thread = QThread()
+        self.worker = ScanPointersWorker(variants, mapper, known_addresses, settings.get_username())
+        self.worker.moveToThread(self.thread)
+
+        self.worker.signal_progress.connect(lambda progress: progress_dialog.set_progress(progress))
+        self.worker.signal_done.connect(lambda pointers: (
+            self.thread.quit(),
+            progress_dialog.close(),
+            self.slot_add_pointers(pointers)
+        ))
+        self.worker.signal_fail.connect(lambda message: (
+            self.thread.quit(),
+            progress_dialog.close(),
+            self.api.show_error(self.name, message)
+        ))
+
+        self.thread.started.connect(self.worker.process)
+        self.thread.start()
+
+    def slot_add_pointers(self, pointers: List[Pointer]) -> None:
+        accepted = [pointer for pointer in pointers if pointer.certainty >= self.min_confidence]
+        if len(accepted) == 0:
+            self.api.show_message(self.name, f'No new pointers with confidence {self.min_confidence} found.\nAll {len(pointers)} candidates were written to {REPORT_PATH}.')
+            return
+        if self.api.show_question(self.name, f'Add {len(accepted)} new pointers with confidence {self.min_confidence}?\nAll {len(pointers)} candidates were written to {REPORT_PATH}.'):
+            get_pointer_database().add_pointers(accepted)
+
+
+class ScanPointersWorker(QObject):
+    signal_progress = Signal(int)
+    signal_done = Signal(list)
+    signal_fail = Signal(str)
+
+    def __init__(self, variants: List[RomVariant], mapper: AddressMapper, known_addresses: Dict[RomVariant, List[int]], author: str) -> None:
+        super().__init__()
+        self.variants = variants
+        self.mapper = mapper
+        self.known_addresses = known_addresses
+        self.author = author
+
+    def process(self) -> None:
+        try:
+            results = {}
+            for (i, variant) in enumerate(self.variants):
+                rom = get_rom(variant)
+                if rom is None:
+                    self.signal_fail.emit(f'Rom for {variant} is not loaded')
+                    return
+                results[variant] = find_candidates(rom.bytes)
+                self.signal_progress.emit((i + 1) * 60 // len(self.variants))
+
+            cross_check(results, self.mapper)
+            self.signal_progress.emit(80)
+
+            pointers = get_new_pointers(results, self.known_addresses, 1, self.author)
+            os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+            with open(REPORT_PATH, 'w') as file:
+                writer = DictWriter(file, fieldnames=['rom_variant', 'address', 'points_to', 'confidence'])
+                writer.writeheader()
+                for pointer in pointers:
+                    writer.writerow({'rom_variant': pointer.rom_variant.value, 'address': hex(pointer.address), 'points_to': hex(pointer.points_to), 'confidence': pointer.certainty})
+            self.signal_done.emit(pointers)
+        except Exception as e:
+            print(e)
+            self.signal_fail.emit('Caught exception')
@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+import numpy as np
+from tlh.const import ROM_OFFSET, RomVariant
+from tlh.data.pointer import Pointer
+
+# Finds words in the roms that look like pointers into the rom.
+# Each candidate gets one point of confidence for each of these:
+# - it points into the rom
+# - it points to a word or a thumb function, not to the middle of a word
+# - it is next to another candidate, as pointers are often stored in tables
+# - all other linked variants have a candidate at the same virtual address
+# - the candidates in all linked variants point to the same virtual address
+
+MAX_CONFIDENCE = 5
+
+
+class AddressMapper:
+    '''
+    Snapshot of the relations of a constraint manager to convert many addresses at once.
+    '''
+
+    def __init__(self, constraint_manager, variants: Iterable[RomVariant]) -> None:
+        self.keys_local: Dict[RomVariant, np.ndarray] = {}
+        self.keys_virtual: Dict[RomVariant, np.ndarray] = {}
+        rom_relations = getattr(constraint_manager, 'rom_relations', {})
+        for variant in variants:
+            relations = rom_relations.get(variant)
+            self.keys_local[variant] = np.array(relations.keys_local if relations is not None else [], dtype=np.int64)
+            self.keys_virtual[variant] = np.array(relations.keys_virtual if relations is not None else [], dtype=np.int64)
+
+    def to_virtual(self, variant: RomVariant, local_addresses: np.ndarray) -> np.ndarray:
+        '''
+        Same as ConstraintManager.to_virtual for an array of addresses.
+        '''
+        keys_local = self.keys_local[variant]
+        keys_virtual = self.keys_virtual[variant]
+        local_addresses = np.asarray(local_addresses, dtype=np.int64)
+        if len(keys_local) == 0:
+            return local_addresses
+        index = np.searchsorted(keys_local, local_addresses, side='right') - 1
+        clamped = np.maximum(index, 0)
+        return np.where(index >= 0, keys_virtual[clamped] + local_addresses - keys_local[clamped], local_addresses)
+
+
+@dataclass
+class ScanResult:
+    addresses: np.ndarray
+    values: np.ndarray
+    confidences: np.ndarray
+    virtual_addresses: np.ndarray
+    virtual_targets: np.ndarray
+
+
+def find_candidates(data: bytes) -> ScanResult:
+    '''
+    Finds all aligned words that point into the rom and scores them on their own.
+    '''
+    words = np.frombuffer(data, dtype='<u4', count=len(data) // 4).astype(np.int64)
+    indices = np.flatnonzero((words >= ROM_OFFSET) & (words < ROM_OFFSET + len(data)))
+    addresses = indices * 4
+    values = words[indices]
+
+    confidences = np.ones(len(addresses), dtype=np.int64)
+    confidences += (values & 3) != 2
+    confidences += np.isin(addresses - 4, addresses, assume_unique=True) | np.isin(addresses + 4, addresses, assume_unique=True)
+    return ScanResult(addresses, values, confidences, addresses, values - ROM_OFFSET)
+
+
+def cross_check(results: Dict[RomVariant, ScanResult], mapper: AddressMapper) -> None:
+    '''
+    Raises the confidence of candidates that are at the same virtual address in all variants.
+    '''
+    for (variant, result) in results.items():
+        result.virtual_addresses = mapper.to_virtual(variant, result.addresses)
+        result.virtual_targets = mapper.to_virtual(variant, result.values - ROM_OFFSET)
+    if len(results) < 2:
+        return
+
+    for (variant, result) in results.items():
+        in_all = np.ones(len(result.addresses), dtype=bool)
+        same_target = np.ones(len(result.addresses), dtype=bool)
+        for (other_variant, other) in results.items():
+            if other_variant == variant:
+                continue
+            # Virtual addresses of one variant are unique and sorted, so the candidates can be joined on them
+            (_, indices, other_indices) = np.intersect1d(result.virtual_addresses, other.virtual_addresses, assume_unique=True, return_indices=True)
+            found = np.zeros(len(result.addresses), dtype=bool)
+            found[indices] = True
+            target = np.zeros(len(result.addresses), dtype=bool)
+            target[indices] = result.virtual_targets[indices] == other.virtual_targets[other_indices]
+            in_all &= found
+            same_target &= target
+        result.confidences += in_all
+        result.confidences += in_all & same_target
+
+
+def get_new_pointers(results: Dict[RomVariant, ScanResult], known_addresses: Dict[RomVariant, List[int]], min_confidence: int, author: str) -> List[Pointer]:
+    '''
+    Returns the candidates with at least min_confidence that are not known pointers, the most confident first.
+    '''
+    pointers = []
+    for (variant, result) in results.items():
+        new = (result.confidences >= min_confidence) & ~np.isin(result.addresses, np.array(known_addresses.get(variant, []), dtype=np.int64))
+        for i in np.flatnonzero(new):
+            pointers.append(Pointer(variant, int(result.addresses[i]), int(result.values[i]), int(result.confidences[i]), author, 'Found by pointer scanner'))
+    pointers.sort(key=lambda pointer: (-pointer.certainty, pointer.rom_variant, pointer.address))
+    return pointers
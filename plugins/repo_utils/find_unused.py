@@ -1,7 +1,7 @@
 from typing import List
 import os
-import re
 from tlh import settings
+from tlh.data.repo_index import get_repo_index
 
 from tlh.plugin.api import PluginApi
 
@@ -22,19 +22,11 @@ static_included_files = [
 
 
 def list_all_asm_files() -> List[str]:
-    result = []
-    for root, dirs, files in os.walk(os.path.join(settings.get_repo_location(), 'asm')):
-        for file in files:
-            result.append(os.path.join(root, file))
-
+    index = get_repo_index()
     # TODO would also need to search for .include macros in asm files
     # Also search unused data asm files
-    for root, dirs, files in os.walk(os.path.join(settings.get_repo_location(), 'data')):
-        for file in files:
-            # TODO maybe check for .inc as well
-            if file.endswith('.s'):
-                result.append(os.path.join(root, file))
-    return result
+    # TODO maybe check for .inc as well
+    return index.list_files('asm') + index.list_files('data', ['.s'])
 
 
 def get_linker_files() -> List[str]:
@@ -48,16 +40,7 @@ def get_linker_files() -> List[str]:
 
 
 def list_all_nonmatch_files() -> List[str]:
-    result = []
-    for root, dirs, files in os.walk(os.path.join(settings.get_repo_location(), 'src')):
-        for file in files:
-            with open(os.path.join(root, file), 'r') as f:
-
-                data = f.read()
-                for match in re.findall(r'(?:NONMATCH|ASM_FUNC)\("(.*)"', data):
-                    result.append(os.path.join(settings.get_repo_location(), match))
-
-    return result
+    return get_repo_index().get_included_asm_files()
 
 
 name = 'Find Unused Files'
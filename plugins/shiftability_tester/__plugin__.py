@@ -5,7 +5,12 @@ from tlh.data.rom import Rom, get_rom
 from PySide6.QtCore import QObject, QThread, Qt, Signal
 from tlh.plugin.api import PluginApi
 from os import path
-from tlh.data.database import get_pointer_database
+from tlh.data.database import get_pointer_database, get_symbol_database
+from typing import List
+from plugins.shiftability_tester.shiftability import Shift, find_mismatches, group_by_symbol, parse_shifts
+
+END_OF_USED_DATA = 0xde7da4
+DEFAULT_SHIFTS = '0x108:0x10000'
 
 class ShiftabilityTesterPlugin:
     name = 'Shiftability Tester'
@@ -26,11 +31,20 @@ class ShiftabilityTesterPlugin:
         self.api.remove_menu_entry(self.action_next_location)
 
     def slot_test_shiftability(self) -> None:
+        (text, ok) = self.api.show_text_input('Shiftability Tester', f'Locations and lengths of the inserted space as location:length separated by commas.\nLeave empty to use {DEFAULT_SHIFTS}.')
+        if not ok:
+            return
+        try:
+            shifts = parse_shifts(text or DEFAULT_SHIFTS)
+        except ValueError:
+            self.api.show_error('Shiftability Tester', f'Could not parse shifts: {text}')
+            return
+
         progress_dialog = self.api.get_progress_dialog('Shiftability Tester', 'Testing shiftability...', False)
         progress_dialog.show()
         
         self.thread = QThread()
-        self.worker = TestShiftabilityWorker()
+        self.worker = TestShiftabilityWorker(shifts)
         self.worker.moveToThread(self.thread)
 
         self.worker.signal_progress.connect(lambda progress: progress_dialog.set_progress(progress))
@@ -57,7 +71,7 @@ class ShiftabilityTesterPlugin:
         if len(self.locations) == 0:
             self.api.show_error('Shiftability Tester', 'Shiftability not tested yet or all locations visited.')
             return
-        location = self.locations.pop(0) - 2 # as we shift by 0x10000, this should be moved
+        location = self.locations.pop(0)
 
         # TODO add this in better to the plugin api: find linked usa controller
 
@@ -78,89 +92,42 @@ class TestShiftabilityWorker(QObject):
     signal_fail = Signal(str)
     signal_locations = Signal(list)
 
+    def __init__(self, shifts: List[Shift]) -> None:
+        super().__init__()
+        self.shifts = shifts
+
     def process(self) -> None:
         try:
-            print('start')
-            # Load shifted rom
             rom_original = get_rom(RomVariant.USA)
-            print('Load shifted')
             rom_path = path.join(settings.get_repo_location(), 'tmc.gba')
-            print(rom_path)
             if not path.isfile(rom_path):
                 self.signal_fail.emit(f'Shifted rom expected at {rom_path}')
-                return           
+                return
             rom_shifted = Rom(rom_path)
-            print('Shifted rom loaded')
-
-
-            pointerlist = get_pointer_database().get_pointers(RomVariant.USA)
-
-            END_OF_USED_DATA = 0xde7da4
-
-            errors = []
-            locations = []
-
-            shift_location = 0x108
-            shift_length = 0x10000
-
-            take_long_time = True
-
-            progress = 0
-            for i in range(END_OF_USED_DATA):
-                orig = rom_original.get_byte(i)
-                shifted_i = i
-                if i >= shift_location:
-                    #print('SHIFT')
-                    shifted_i += shift_length
-                #print(i, shifted_i)
-                shifted = rom_shifted.get_byte(shifted_i)
-
-                if orig != shifted:
-                    pointers = pointerlist.get_pointers_at(i)
-
-                    # Test if pointer
-                    if len(pointers) > 0:
-                        assert shifted == orig + 1
-                        # TODO parse the full pointer
-                        continue
-                    
-                    print(f'{hex(i-2)}\t{orig}\t{shifted}')
-                    errors.append((i, orig, shifted))
-                    locations.append(i)
-                    #self.signal_fail.emit(f'Failed at {hex(i)}: {orig} {shifted}')
-                    #break
-                else:
-
-                    if take_long_time:
-                        if rom_original.get_byte(i+1) != 0x8:
-                            # Certainly not a pointer here
-                            continue
-                        pointers = pointerlist.get_pointers_at(i)
-                        if len(pointers) > 0:
-                            if pointers[0].address == i -2:
-                                errors.append((i, orig, shifted))
-                                locations.append(i)
-                                print(f'missing shift at {hex(i-2)}')
-
-                        
-
-
-                    #if len(pointers) > 0:
-                        # TODO test that pointer was shifted
-                        #pass
-
-                new_progress = i * 100 // END_OF_USED_DATA
-                if new_progress != progress:
-                    progress = new_progress
-                    self.signal_progress.emit(new_progress)
-
-
-
-            if len(errors) == 0:
+            self.signal_progress.emit(30)
+
+            pointer_addresses = [pointer.address for pointer in get_pointer_database().get_pointers(RomVariant.USA)]
+            self.signal_progress.emit(50)
+
+            try:
+                mismatches = find_mismatches(rom_original.bytes, rom_shifted.bytes, self.shifts, pointer_addresses, END_OF_USED_DATA)
+            except ValueError as e:
+                self.signal_fail.emit(str(e))
+                return
+            self.signal_progress.emit(90)
+
+            symbol_database = get_symbol_database()
+            symbols = symbol_database.get_symbols(RomVariant.USA) if symbol_database.are_symbols_loaded(RomVariant.USA) else None
+            for (name, group) in group_by_symbol(mismatches, symbols).items():
+                print(f'{name}: {len(group)} errors')
+                for mismatch in group:
+                    print(f'\t{hex(mismatch.address)}\t{mismatch.kind}\t{hex(mismatch.original)}\t{hex(mismatch.shifted)}\texpected {hex(mismatch.expected)}')
+
+            if len(mismatches) == 0:
                 self.signal_done.emit()
             else:
-                self.signal_locations.emit(locations)
-                self.signal_fail.emit(f'{len(errors)} errors found.')
+                self.signal_locations.emit([mismatch.address for mismatch in mismatches])
+                self.signal_fail.emit(f'{len(mismatches)} errors found.')
         except Exception as e:
             print(e)
             self.signal_fail.emit('Caught exception')
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from tlh.const import ROM_OFFSET
+from tlh.data.symbols import SymbolList
+
+# Compares the original rom with a rom that has .space inserted at some locations.
+# All bytes outside of pointers need to be the same after accounting for the inserted space
+# and all pointers into the rom need to point to the shifted address of their target.
+
+# Pointers with values in this range point into the rom
+ROM_WINDOW_SIZE = 0x2000000
+
+
+@dataclass
+class Shift:
+    location: int
+    length: int
+
+
+@dataclass
+class Mismatch:
+    address: int
+    # byte: A byte outside of a pointer changed
+    # pointer: A pointer does not point to the shifted target
+    # missing_shift: A pointer was not shifted at all
+    kind: str
+    original: int
+    shifted: int
+    expected: int
+
+
+def parse_shifts(text: str) -> List[Shift]:
+    '''
+    Parses shifts in the format location:length separated by commas.
+    '''
+    shifts = []
+    for part in text.split(','):
+        if part.strip() == '':
+            continue
+        (location, length) = part.split(':')
+        shifts.append(Shift(int(location, 0), int(length, 0)))
+    return sorted(shifts, key=lambda shift: shift.location)
+
+
+def shift_addresses(addresses: np.ndarray, shifts: List[Shift]) -> np.ndarray:
+    '''
+    Returns the addresses in the shifted rom for addresses in the original rom.
+    Data at the location of a shift is moved behind the inserted space.
+    '''
+    addresses = np.asarray(addresses, dtype=np.int64)
+    if len(shifts) == 0:
+        return addresses
+    locations = np.array([shift.location for shift in shifts], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum([shift.length for shift in shifts], dtype=np.int64)))
+    return addresses + offsets[np.searchsorted(locations, addresses, side='right')]
+
+
+def align_shifted_rom(shifted: np.ndarray, shifts: List[Shift], end: int) -> np.ndarray:
+    '''
+    Removes the inserted space, so that the shifted rom can be compared to the first end bytes of the original rom.
+    '''
+    total_length = sum(shift.length for shift in shifts)
+    if len(shifted) < end + total_length:
+        raise ValueError(f'Shifted rom is too small: {hex(len(shifted))} < {hex(end + total_length)}')
+
+    aligned = np.empty(end, dtype=np.uint8)
+    start = 0
+    offset = 0
+    for shift in shifts + [Shift(end, 0)]:
+        stop = min(shift.location, end)
+        if stop > start:
+            aligned[start:stop] = shifted[start + offset:stop + offset]
+            start = stop
+        offset += shift.length
+    return aligned
+
+
+def read_words(data: np.ndarray, addresses: np.ndarray) -> np.ndarray:
+    words = np.zeros(len(addresses), dtype=np.int64)
+    for i in range(4):
+        words |= data[addresses + i].astype(np.int64) << (8 * i)
+    return words
+
+
+def find_mismatches(original: bytes, shifted: bytes, shifts: List[Shift], pointer_addresses: Iterable[int], end: int) -> List[Mismatch]:
+    '''
+    Returns all mismatches in the first end bytes of the original rom sorted by address.
+    '''
+    original_data = np.frombuffer(original, dtype=np.uint8)[:end]
+    aligned = align_shifted_rom(np.frombuffer(shifted, dtype=np.uint8), shifts, end)
+    pointers = np.unique(np.fromiter(pointer_addresses, dtype=np.int64))
+    pointers = pointers[(pointers >= 0) & (pointers + 4 <= end)]
+
+    # Join the differing bytes with the sorted pointer addresses to find the bytes outside of pointers
+    different = np.flatnonzero(original_data != aligned)
+    containing = np.searchsorted(pointers, different, side='right') - 1
+    in_pointer = (containing >= 0) & (different < pointers[np.maximum(containing, 0)] + 4) if len(pointers) > 0 else np.zeros(len(different), dtype=bool)
+    different = different[~in_pointer]
+
+    mismatches = [Mismatch(int(address), 'byte', int(original_data[address]), int(aligned[address]), int(original_data[address])) for address in different]
+
+    # Check that all pointers into the rom point to the shifted target
+    original_values = read_words(original_data, pointers)
+    shifted_values = read_words(aligned, pointers)
+    expected_values = original_values.copy()
+    into_rom = (original_values >= ROM_OFFSET) & (original_values < ROM_OFFSET + ROM_WINDOW_SIZE)
+    expected_values[into_rom] = shift_addresses(original_values[into_rom] - ROM_OFFSET, shifts) + ROM_OFFSET
+    for i in np.flatnonzero(shifted_values != expected_values):
+        kind = 'missing_shift' if shifted_values[i] == original_values[i] else 'pointer'
+        mismatches.append(Mismatch(int(pointers[i]), kind, int(original_values[i]), int(shifted_values[i]), int(expected_values[i])))
+
+    mismatches.sort(key=lambda mismatch: mismatch.address)
+    return mismatches
+
+
+def group_by_symbol(mismatches: List[Mismatch], symbols: Optional[SymbolList]) -> Dict[str, List[Mismatch]]:
+    '''
+    Groups the mismatches by the name of the symbol containing them.
+    '''
+    groups: Dict[str, List[Mismatch]] = {}
+    for mismatch in mismatches:
+        name = 'unknown'
+        if symbols is not None:
+            symbol = symbols.get_symbol_at(mismatch.address)
+            if symbol is not None and symbol.address <= mismatch.address:
+                name = symbol.name
+        groups.setdefault(name, []).append(mismatch)
+    return groups
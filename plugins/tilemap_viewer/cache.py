@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import json
+import os
+from typing import Any, Callable, Generic, Hashable, Iterable, Tuple, TypeVar
+
+T = TypeVar('T')
+
+class LRUCache(Generic[T]):
+    '''
+    Keeps the most recently used entries up to max_size.
+    '''
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, T] = OrderedDict()
+
+    def get(self, key: Hashable, create: Callable[[], T]) -> T:
+        '''
+        Returns the entry for the key and creates it if it is not yet cached.
+        '''
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = create()
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return value
+
+    def discard(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def get_mtimes(paths: Iterable[str]) -> Tuple[int, ...]:
+    '''
+    Returns the modification times of the files, so that entries read from them can be keyed by them.
+    '''
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+class JsonCache:
+    '''
+    Caches parsed json files until they are modified.
+    '''
+
+    def __init__(self, max_size: int) -> None:
+        self.cache: LRUCache[Any] = LRUCache(max_size)
+
+    def load(self, path: str) -> Any:
+        def read():
+            with open(path, 'r') as file:
+                return json.load(file)
+        return self.cache.get((str(path), os.stat(path).st_mtime_ns), read)
+
+    def clear(self) -> None:
+        self.cache.clear()
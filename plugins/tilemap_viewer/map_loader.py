@@ -0,0 +1,500 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+import numpy as np
+import os
+import PIL.Image
+from PIL.Image import Image
+from plugins.tilemap_viewer.asm_data_file import AsmDataFile
+from plugins.tilemap_viewer.cache import JsonCache, LRUCache, get_mtimes
+from plugins.tilemap_viewer.ids import area_ids, room_ids
+from plugins.tilemap_viewer.renderer import META_TILE_SIZE, MISSING_COLOR, TILE_SIZE, TILEMAP_CHUNK_SIZE, apply_256_color_palette, arrange_chunks, arrange_grid, assemble_metatiles, build_palette_table, gray_to_rgba, read_tile_attrs, render_colored_tiles, render_metatile_map, render_metatile_map_region, render_tiles
+from plugins.tilemap_viewer.tiled_scene import CHUNK_SIZE, ChunkSource
+
+# Loads the maps of the rooms from the assets extracted into the build folder.
+# This does not depend on any widgets, so that maps can also be rendered in other processes.
+
+class Palette:
+    palette: List[int] = []
+    def __init__(self) -> None:
+        self.palette = [255, 0, 255] * 32
+    
+    def read_from_file(self, path: str) -> None:
+        self.palette = []
+        with open(path, 'r') as f:
+            if f.readline().strip() != 'JASC-PAL':
+                raise Exception(f'Unknown palette file: {path}')
+            f.readline() # TODO what does this line say (0100) max value in hex or something?
+            num_colors = int(f.readline().strip())
+            for i in range(0, num_colors):
+                (r, g, b) = f.readline().split()
+                self.palette.append(int(r))
+                self.palette.append(int(g))
+                self.palette.append(int(b))
+        #print(self.palette)
+
+UNDEFINED_PALETTE = Palette()
+
+class PaletteSet:
+    palettes: List[Palette] # 16 bg, 16 obj
+
+    def __init__(self) -> None:
+        self.palettes = [None]*32
+        # The palette files this set was read from.
+        self.sources: List[str] = []
+        # Modification times of the sources when they were read.
+        self.mtimes: Tuple[int, ...] = ()
+
+    def get_palette(self, index: int) -> Palette:
+        palette = None
+        if index < len(self.palettes):
+            palette = self.palettes[index]
+        if palette is None:
+            print(f'Palette {index} not found.')
+            return UNDEFINED_PALETTE
+        return palette
+
+    def render_palettes(self) -> None:
+        for i, palette in enumerate(self.palettes):
+            if palette is None:
+                continue
+            img = PIL.Image.new('RGB', (len(palette.palette)//3,1))
+            for j in range(0, len(palette.palette)//3):
+                img.putpixel((j, 0), (
+                    palette.palette[j*3+0],
+                    palette.palette[j*3+1],
+                    palette.palette[j*3+2],
+                ))
+
+            img.save(f'/tmp/mc/palette_{i}.png')
+
+    def get_palette_table(self) -> np.ndarray:
+        return build_palette_table([None if palette is None else palette.palette for palette in self.palettes])
+
+    def fill_undefined(self, palette_set: 'PaletteSet') -> None:
+        """Fill undefined palettes from another palette set"""
+        for i, palette in enumerate(self.palettes):
+            if palette is None:
+                self.palettes[i] = palette_set.palettes[i]
+        self.sources += palette_set.sources
+
+
+def read_palette_set(file: AsmDataFile, index: int, assets_folder: str) -> PaletteSet:
+    symbol_name = file.symbols['gPaletteGroups'].entries[index].attributes[0]
+    symbol = file.symbols[symbol_name]
+    print(f'Read palette set from symbol {symbol_name}.')
+    palette_set = PaletteSet()
+    for entry in symbol.entries:
+        print(entry)
+        palette_id = int(entry.attributes_dict['palette'][4:])
+        offset = 0
+        if 'offset' in entry.attributes_dict:
+            offset = int(entry.attributes_dict['offset'], 0)
+        count = int(entry.attributes_dict['count'], 0)
+        for i in range(0, count):
+            print(f'Read palette {palette_id + i} to {offset+i}.')
+            palette = Palette()
+            palette_path = os.path.join(assets_folder, 'palettes', f'gPalette_{palette_id+i}.pal')
+            palette.read_from_file(palette_path)
+            palette_set.palettes[offset+i] = palette
+            palette_set.sources.append(palette_path)
+    return palette_set
+
+
+class VRAM:
+    # The VRAM in tiles form storing the pixel values of the 8x8 tiles in a (tiles, 8, 8) array.
+    pixels: np.ndarray
+    # Which tiles were loaded into the VRAM.
+    defined: np.ndarray
+    # The colored (tiles, 8, 8, 4) tiles after applying 256 colors.
+    colors: np.ndarray
+
+    def __init__(self) -> None:
+        self.pixels = np.zeros((0, TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+        self.defined = np.zeros(0, dtype=bool)
+        self.colors = None
+        # The palette set that was used to calculate the colors.
+        self.colors_key = None
+
+    def add_tileset(self, image: Image, addr: int) -> None:
+        (width, height) = image.size
+        index = addr // (TILE_SIZE * TILE_SIZE // 2) # 4 bit per pixel
+        if width != TILE_SIZE:
+            raise Exception(f'Tileset images with width of {width} not yet supported.')
+        data = np.asarray(image, dtype=np.uint8)
+        if data.ndim != 2:
+            raise Exception(f'Tileset images with mode {image.mode} not yet supported.')
+        tile_height = height // TILE_SIZE
+
+        last_index = index + tile_height
+        if len(self.pixels) < last_index:
+            missing = last_index - len(self.pixels)
+            self.pixels = np.concatenate((self.pixels, np.zeros((missing, TILE_SIZE, TILE_SIZE), dtype=np.uint8)))
+            self.defined = np.concatenate((self.defined, np.zeros(missing, dtype=bool)))
+        self.pixels[index:last_index] = data[:tile_height*TILE_SIZE].reshape(tile_height, TILE_SIZE, TILE_SIZE)
+        self.defined[index:last_index] = True
+        self.colors = None
+        self.colors_key = None
+
+    def get_colors(self) -> np.ndarray:
+        '''
+        Returns the colored tiles or the tiles as gray levels if no colors were applied.
+        '''
+        if self.colors is not None:
+            return self.colors
+        return gray_to_rgba(self.pixels)
+
+    def render_vram(self) -> np.ndarray:
+        vram_width = 32
+        tiles = self.get_colors().copy()
+        tiles[~self.defined] = MISSING_COLOR
+        return arrange_grid(tiles, vram_width)
+
+    def apply_256_colors(self, palette_set: PaletteSet) -> None:
+        self.colors = apply_256_color_palette(self.pixels, palette_set.get_palette_table())
+
+class MetaTileset:
+    # The rendered (metatiles, 16, 16, 4) metatiles.
+    images: np.ndarray
+
+    def __init__(self, path: str, vram: VRAM, vram_offset: int, palette_set: PaletteSet) -> None:
+        self.vram = vram
+        self.palette_set = palette_set
+        tile_number_offset = vram_offset // (TILE_SIZE * TILE_SIZE // 2)
+        tile_attrs = read_tile_attrs(path)
+        tiles = render_tiles(vram.pixels, vram.defined, tile_attrs, tile_number_offset, palette_set.get_palette_table())
+        self.images = assemble_metatiles(tiles)
+
+    def render_meta_tileset(self) -> np.ndarray:
+        metatileset_width = 16
+        print(f'Render {len(self.images)} metatiles.')
+        return arrange_grid(self.images, metatileset_width)
+
+
+class MetaTilemap:
+    def __init__(self, path: str, metaTileset: MetaTileset) -> None:
+        self.metaTileset = metaTileset
+        self.metatiles = read_tile_attrs(path)
+
+    def render_meta_tile_map(self, width_in_metatiles: str) -> np.ndarray:
+        if width_in_metatiles <= 0:
+            return None
+        return render_metatile_map(self.metatiles, self.metaTileset.images, width_in_metatiles)
+
+    def get_chunk_source(self, width_in_metatiles: int) -> ChunkSource:
+        '''
+        Renders the map in chunks of 16x16 metatiles when they are needed.
+        '''
+        height = (len(self.metatiles) + (width_in_metatiles - 1)) // width_in_metatiles
+        chunk_metatiles = CHUNK_SIZE // META_TILE_SIZE
+
+        def render_chunk(chunk_x: int, chunk_y: int) -> np.ndarray:
+            return render_metatile_map_region(self.metatiles, self.metaTileset.images, width_in_metatiles, chunk_x * chunk_metatiles, chunk_y * chunk_metatiles, chunk_metatiles, chunk_metatiles)
+
+        return ChunkSource(width_in_metatiles * META_TILE_SIZE, height * META_TILE_SIZE, CHUNK_SIZE, render_chunk)
+
+
+
+class Tilemap:
+    # The tile attributes of the map.
+    tile_attrs: np.ndarray
+
+    def __init__(self, path: str, vram: VRAM, vram_offset: int) -> None:
+        self.vram = vram
+        # Keep the colors the tiles had when loading the map.
+        self.colors = vram.get_colors()
+        self.tile_number_offset = vram_offset // (TILE_SIZE * TILE_SIZE // 2)
+        self.tile_attrs = read_tile_attrs(path)
+
+    def get_width_in_chunks(self, width_in_tiles: int) -> int:
+        if width_in_tiles % TILEMAP_CHUNK_SIZE != 0:
+            width_in_tiles = ((width_in_tiles + TILEMAP_CHUNK_SIZE - 1) // TILEMAP_CHUNK_SIZE) * TILEMAP_CHUNK_SIZE
+            print(f'Increase width to {width_in_tiles} to fit 256x256 chunks')
+        return width_in_tiles // TILEMAP_CHUNK_SIZE
+
+    def render_tiles(self, start: int, end: int) -> np.ndarray:
+        return render_colored_tiles(self.colors, self.vram.defined, self.tile_attrs[start:end], self.tile_number_offset)
+
+    def render_tilemap(self, width_in_tiles: int) -> np.ndarray:
+        width_in_chunks = self.get_width_in_chunks(width_in_tiles)
+        width_in_tiles = width_in_chunks * TILEMAP_CHUNK_SIZE
+        tilemap_height = (len(self.tile_attrs) + (width_in_tiles-1)) // width_in_tiles
+
+        print(f'Render {len(self.tile_attrs)} tiles.')
+        return arrange_chunks(self.render_tiles(0, len(self.tile_attrs)), width_in_tiles)[:tilemap_height * TILE_SIZE]
+
+    def get_chunk_source(self, width_in_tiles: int) -> ChunkSource:
+        '''
+        Renders the 256x256 chunks of the map when they are needed.
+        '''
+        width_in_chunks = self.get_width_in_chunks(width_in_tiles)
+        width_in_tiles = width_in_chunks * TILEMAP_CHUNK_SIZE
+        tilemap_height = (len(self.tile_attrs) + (width_in_tiles-1)) // width_in_tiles
+        chunk_tiles = TILEMAP_CHUNK_SIZE * TILEMAP_CHUNK_SIZE
+
+        def render_chunk(chunk_x: int, chunk_y: int) -> np.ndarray:
+            start = (chunk_y * width_in_chunks + chunk_x) * chunk_tiles
+            chunk = arrange_chunks(self.render_tiles(start, start + chunk_tiles), TILEMAP_CHUNK_SIZE)
+            # Crop the chunk at the bottom of the map.
+            return chunk[:tilemap_height * TILE_SIZE - chunk_y * CHUNK_SIZE]
+
+        return ChunkSource(width_in_tiles * TILE_SIZE, tilemap_height * TILE_SIZE, CHUNK_SIZE, render_chunk)
+
+
+def get_area_path(area: int) -> str:
+    return f'maps/areas/{area:03}_{get_area_name(area)}'
+
+def get_room_path(area: int, room: int) -> str:
+    return f'maps/areas/{area:03}_{get_area_name(area)}/rooms/{room:02}_{get_room_name(area, room)}'
+
+def get_area_name(area: int) -> str:
+    id = area_ids[area]
+    start_char = 5 # Remove AREA_ at the start.
+    # To camel case.
+    result = ''
+    for i in range(start_char, len(id)):
+        if id[i] == '_':
+            continue
+        if i != start_char and id[i-1] != '_':
+            result += id[i].lower()
+        else:
+            result += id[i].upper()
+    return result
+
+def get_room_name(area: int, room: int) -> str:
+    area_id = area_ids[area]
+    id = room_ids[area][room]
+    start_char = len(area_id) # Remove ROOM_ and area name at the start
+    # To camel case.
+    result = ''
+    for i in range(start_char, len(id)):
+        if id[i] == '_':
+            continue
+        if i != start_char and id[i-1] != '_':
+            result += id[i].lower()
+        else:
+            result += id[i].upper()
+    return result
+
+
+@dataclass
+class RoomMap:
+    map_type: str
+    map_path: Path
+    use_256_colors_bg: bool
+    width: int # in metatiles
+    vram: VRAM
+    # Identifies the rendered vram image.
+    vram_key: Tuple
+    metatileset: Optional[MetaTileset] = None
+    # Identifies the rendered metatileset image.
+    metatileset_key: Optional[Tuple] = None
+    metatilemap: Optional[MetaTilemap] = None
+    tilemap: Optional[Tilemap] = None
+    errors: List[str] = field(default_factory=list)
+    # All files the map was loaded from.
+    sources: Set[str] = field(default_factory=set)
+
+    def render(self) -> Optional[np.ndarray]:
+        '''
+        Renders the whole map if it can be rendered as an image.
+        '''
+        if self.metatilemap is not None:
+            return self.metatilemap.render_meta_tile_map(self.width)
+        if self.tilemap is not None:
+            return self.tilemap.render_tilemap(self.width * 2)
+        return None
+
+
+class MapLoader:
+    '''
+    Loads the maps of rooms and caches tilesets, palette sets and metatilesets that can be shared between maps.
+    '''
+
+    def __init__(self, repo_location: str) -> None:
+        self.repo_location = repo_location
+        self.assets_folder = Path(repo_location) / 'build' / 'USA' / 'assets' # TODO handle different variants?
+        self.palette_groups_path = os.path.join(repo_location, 'data', 'gfx', 'palette_groups.s')
+
+        self.json_cache = JsonCache(64)
+        self.palette_groups_file = None
+        self.palette_groups_mtime = None
+        # The file modification times are part of the keys, so that re-extracted assets are read again.
+        # (palette set id, palette groups mtime) -> PaletteSet
+        self.palette_set_cache: LRUCache[PaletteSet] = LRUCache(16)
+        # (tileset area, tileset id, tile mtimes) -> VRAM
+        self.tileset_cache: LRUCache[VRAM] = LRUCache(8)
+        # (metatileset area, tileset key, vram offset, metatile type, metatileset mtime) -> MetaTileset
+        self.metatileset_cache: LRUCache[MetaTileset] = LRUCache(16)
+        # (metatilemap path, metatilemap mtime, metatileset key) -> MetaTilemap
+        self.metatilemap_cache: LRUCache[MetaTilemap] = LRUCache(8)
+
+    def load_json(self, path: Path, sources: Set[str]) -> any:
+        sources.add(str(path))
+        return self.json_cache.load(path)
+
+    def get_room_config(self, area: int, room: int) -> any:
+        return self.json_cache.load(self.assets_folder / get_room_path(area, room) / 'config.json')
+
+    def get_map_types(self, area: int, room: int) -> List[str]:
+        return [map['type'] for map in self.get_room_config(area, room)['maps']]
+
+    def load_map(self, area: int, room: int, map_type: str) -> RoomMap:
+        use_256_colors_bg = area in [0x20, 0x2d] # TODO detect this by map type?
+        if 'special' in map_type:
+            use_256_colors_bg = True
+        errors: List[str] = []
+        sources: Set[str] = set()
+
+        # TODO modify depending on map type
+        if map_type == 'map_top' or map_type == 'map_top_special':
+            vram_offset = 0x4000 # top maps index tiles starting at 0x4000
+        else:
+            vram_offset = 0
+
+        # Find out tileset.
+        print(f'--- {area} / {room}')
+        area_config = self.load_json(self.assets_folder / get_area_path(area) / 'config.json', sources)
+        room_path = self.assets_folder / get_room_path(area, room)
+        room_config = self.load_json(room_path / 'config.json', sources)
+        tileset_id = 0
+        if 'tileset' in room_config:
+            tileset_id = room_config['tileset']
+        else:
+            errors.append(f'No tileset in room config for {room_ids[area][room]}. Assuming tileset 0.')
+        tileset_area = area
+        tileset_area_config = area_config
+        if 'tileset_ref' in area_config: # Handle tileset reference.
+            tileset_area = area_config['tileset_ref']
+            tileset_area_config = self.load_json(self.assets_folder / get_area_path(tileset_area) / 'config.json', sources)
+
+        # Check that the tileset exists in this area.
+        if tileset_id not in tileset_area_config['tilesets']:
+            if len(tileset_area_config['tilesets']) == 0:
+                raise Exception(f'No tilesets defined for area {area_ids[tileset_area]}.')
+            replacement_tileset = tileset_area_config['tilesets'][0]
+            errors.append(f'No tileset with id {tileset_id} in area {area_ids[tileset_area]} (requested by room {room_ids[area][room]}). Using tileset {replacement_tileset} instead.')
+            tileset_id = replacement_tileset
+
+        (vram, palette_set, tileset_key) = self.load_tileset(tileset_area, tileset_id, room, sources)
+        if use_256_colors_bg:
+            if vram.colors_key != tileset_key:
+                vram.apply_256_colors(palette_set)
+                vram.colors_key = tileset_key
+        else:
+            # Show the tiles without colors.
+            vram.colors = None
+            vram.colors_key = None
+
+        map_path = self.find_map_path(area, room, room_path, room_config, map_type, sources)
+        width = 42
+        if 'width' in room_config:
+            width = room_config['width'] // 16
+        else:
+            errors.append(f'No width defined for room {room_ids[area][room]}. Assuming 42.')
+
+        room_map = RoomMap(map_type, map_path, use_256_colors_bg, width, vram, tileset_key + (use_256_colors_bg,), errors=errors, sources=sources)
+        if use_256_colors_bg:
+            if map_type == 'map_bottom_special' or map_type == 'map_top_special':
+                room_map.tilemap = Tilemap(map_path, vram, vram_offset)
+        else:
+            (metatileset, metatileset_key) = self.load_metatileset(area_config['metatileset'], map_type, vram, vram_offset, palette_set, tileset_key, sources)
+            room_map.metatileset = metatileset
+            room_map.metatileset_key = metatileset_key
+            metatilemap_key = (str(map_path), os.stat(map_path).st_mtime_ns, metatileset_key)
+            room_map.metatilemap = self.metatilemap_cache.get(metatilemap_key, lambda: MetaTilemap(map_path, metatileset))
+        return room_map
+
+    def load_tileset(self, tileset_area: int, tileset_id: int, room: int, sources: Set[str]) -> Tuple[VRAM, PaletteSet, Tuple]:
+        tileset_path = self.assets_folder / get_area_path(tileset_area) / 'tilesets' / str(tileset_id)
+        tileset_config = self.load_json(tileset_path / 'config.json', sources)
+
+        if not 'palette_set' in tileset_config:
+            raise Exception(f'No palette set in tileset config for {room_ids[tileset_area][room]}.')
+        palette_set_id = tileset_config['palette_set']
+        palette_set = self.load_palette_set(palette_set_id)
+        sources.update(palette_set.sources)
+
+        entries = []
+        for entry in tileset_config['tiles']:
+            if 'src' in entry:
+                entry_path = tileset_path / (entry['src'] + '.png')
+            elif 'ref' in entry:
+                entry_path = self.assets_folder / (entry['ref'] + '.png')
+            else:
+                raise Exception(f'Neither src nor ref in tiles definition.')
+
+            offset = int(entry['dest'], 0) - 0x6000000
+            entries.append((entry_path, offset))
+            sources.add(str(entry_path))
+
+        def read_vram() -> VRAM:
+            vram = VRAM()
+            for (entry_path, offset) in entries:
+                with PIL.Image.open(entry_path) as image:
+                    vram.add_tileset(image, offset)
+            return vram
+        tiles_mtimes = get_mtimes(entry_path for (entry_path, offset) in entries)
+        vram = self.tileset_cache.get((tileset_area, tileset_id, tiles_mtimes), read_vram)
+        return (vram, palette_set, (tileset_area, tileset_id, tiles_mtimes, palette_set_id, palette_set.mtimes))
+
+    def load_palette_set(self, palette_set_id: int) -> PaletteSet:
+        palette_groups_mtime = os.stat(self.palette_groups_path).st_mtime_ns
+        if self.palette_groups_file is None or self.palette_groups_mtime != palette_groups_mtime:
+            self.palette_groups_file = AsmDataFile(self.palette_groups_path)
+            self.palette_groups_mtime = palette_groups_mtime
+
+        def read() -> PaletteSet:
+            common_palette_set = read_palette_set(self.palette_groups_file, 0xb, self.assets_folder)
+            tileset_palette_set = read_palette_set(self.palette_groups_file, palette_set_id, self.assets_folder)
+            tileset_palette_set.fill_undefined(common_palette_set)
+            tileset_palette_set.sources.append(self.palette_groups_path)
+            tileset_palette_set.mtimes = get_mtimes(tileset_palette_set.sources)
+            return tileset_palette_set
+        # Which palette files are used is only known after reading the set, so they are checked afterwards.
+        key = (palette_set_id, palette_groups_mtime)
+        palette_set = self.palette_set_cache.get(key, read)
+        if get_mtimes(palette_set.sources) != palette_set.mtimes:
+            self.palette_set_cache.discard(key)
+            palette_set = self.palette_set_cache.get(key, read)
+        return palette_set
+
+    def load_metatileset(self, metatileset_area: int, map_type: str, vram: VRAM, vram_offset: int, palette_set: PaletteSet, tileset_key: Tuple, sources: Set[str]) -> Tuple[MetaTileset, Tuple]:
+        # TODO fix metatileset for 256 color bgs
+        metatileset_path = self.assets_folder / get_area_path(metatileset_area) / 'metatileset'
+        metatileset_config = self.load_json(metatileset_path / 'config.json', sources)
+
+        metatile_type = 'tiles_bottom'
+        if map_type == 'map_top':
+            metatile_type = 'tiles_top'
+
+        if not metatile_type in metatileset_config:
+            raise Exception(f'{metatile_type} not found in metatileset for area {area_ids[metatileset_area]}.')
+
+        config = metatileset_config[metatile_type]
+
+        if 'src' in config:
+            metatileset_path = metatileset_path / (config['src'] + '.bin')
+        elif 'ref' in config:
+            metatileset_path = self.assets_folder / (config['ref'] + '.bin')
+        else:
+            raise Exception(f'Neither src nor ref in metatileset definition.')
+        sources.add(str(metatileset_path))
+
+        key = (metatileset_area,) + tileset_key + (vram_offset, metatile_type, os.stat(metatileset_path).st_mtime_ns)
+        metatileset = self.metatileset_cache.get(key, lambda: MetaTileset(metatileset_path, vram, vram_offset, palette_set))
+        return (metatileset, key)
+
+    def find_map_path(self, area: int, room: int, room_path: Path, room_config: any, map_type: str, sources: Set[str]) -> Path:
+        for map in room_config['maps']:
+            if map['type'] == map_type:
+                if 'src' in map:
+                    map_path = room_path / (map['src'] + '.bin')
+                elif 'ref' in map:
+                    map_path = self.assets_folder / (map['ref'] + '.bin')
+                else:
+                    raise Exception(f'Neither src nor ref in map definition.')
+                sources.add(str(map_path))
+                return map_path
+
+        raise Exception(f'No {map_type} map found for room {room_ids[area][room]}.')
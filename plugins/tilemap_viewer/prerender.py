@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import multiprocessing
+import os
+from typing import Dict, List, Optional, Tuple
+import PIL.Image
+from PySide6.QtCore import QObject, Signal
+from plugins.tilemap_viewer.ids import area_ids, room_ids
+from plugins.tilemap_viewer.map_loader import MapLoader
+
+# Renders all maps in a process pool and stores them in a cache folder, so that switching rooms only needs to load an image.
+
+CACHE_FOLDER = os.path.join('tmp', 'tilemap_cache')
+THUMBNAIL_SIZE = 256
+
+
+def get_map_key(area: int, room: int, map_type: str) -> str:
+    return f'{area}/{room}/{map_type}'
+
+
+def hash_files(paths: List[str]) -> str:
+    '''
+    Hashes the paths and contents of all files the map was rendered from.
+    '''
+    sha = hashlib.sha1()
+    for path in sorted(paths):
+        sha.update(path.encode('utf-8'))
+        with open(path, 'rb') as file:
+            sha.update(file.read())
+    return sha.hexdigest()
+
+
+def get_modification_times(paths: List[str]) -> Dict[str, int]:
+    return {path: os.stat(path).st_mtime_ns for path in sorted(paths)}
+
+
+class RenderCache:
+    '''
+    Index of the rendered maps in the cache folder.
+    Each entry stores the hash of the files the map was rendered from and their modification times.
+    '''
+
+    def __init__(self, folder: str = CACHE_FOLDER) -> None:
+        self.folder = folder
+        self.index_path = os.path.join(folder, 'index.json')
+        self.index: Dict[str, any] = {}
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as file:
+                self.index = json.load(file)
+
+    def get_entry(self, area: int, room: int, map_type: str) -> Optional[any]:
+        '''
+        Returns the entry for the map if none of the files it was rendered from were modified.
+        '''
+        entry = self.index.get(get_map_key(area, room, map_type))
+        if entry is None:
+            return None
+        try:
+            if get_modification_times(entry['files'].keys()) != entry['files']:
+                return None
+        except OSError:
+            return None
+        if not os.path.isfile(self.get_render_path(entry)):
+            return None
+        return entry
+
+    def get_render_path(self, entry: any) -> str:
+        return os.path.join(self.folder, entry['hash'] + '.png')
+
+    def get_thumbnail_path(self, entry: any) -> str:
+        return os.path.join(self.folder, entry['hash'] + '_thumb.png')
+
+    def save(self) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.index, file)
+        os.replace(tmp_path, self.index_path)
+
+
+def list_maps(loader: MapLoader) -> List[Tuple[int, int, str]]:
+    '''
+    Returns (area, room, map type) for all maps of all rooms that have a config.
+    '''
+    maps = []
+    for area in range(len(area_ids)):
+        for room in range(len(room_ids[area])):
+            try:
+                map_types = loader.get_map_types(area, room)
+            except OSError:
+                continue
+            for map_type in map_types:
+                maps.append((area, room, map_type))
+    return maps
+
+
+# Each process of the pool keeps one loader, so that tilesets can be reused between the maps of an area.
+worker_loader: MapLoader = None
+
+def init_worker(repo_location: str) -> None:
+    global worker_loader
+    worker_loader = MapLoader(repo_location)
+
+
+def prerender_maps(folder: str, maps: List[Tuple[int, int, str]]) -> List[Tuple[str, Optional[any], str]]:
+    '''
+    Renders the maps into the cache folder.
+    Returns (key, entry, error) for each map.
+    '''
+    results = []
+    for (area, room, map_type) in maps:
+        key = get_map_key(area, room, map_type)
+        try:
+            results.append((key, prerender_map(folder, area, room, map_type), None))
+        except Exception as e:
+            results.append((key, None, str(e)))
+    return results
+
+
+def prerender_map(folder: str, area: int, room: int, map_type: str) -> Optional[any]:
+    room_map = worker_loader.load_map(area, room, map_type)
+    image = room_map.render()
+    if image is None:
+        return None
+
+    entry = {
+        'hash': hash_files(room_map.sources),
+        'files': get_modification_times(room_map.sources),
+        'width': room_map.width,
+    }
+    render_path = os.path.join(folder, entry['hash'] + '.png')
+    thumbnail_path = os.path.join(folder, entry['hash'] + '_thumb.png')
+    if not os.path.isfile(render_path) or not os.path.isfile(thumbnail_path):
+        pil_image = PIL.Image.fromarray(image, 'RGBA')
+        pil_image.save(render_path + '.tmp', 'PNG', optimize=True)
+        os.replace(render_path + '.tmp', render_path)
+        pil_image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        pil_image.save(thumbnail_path + '.tmp', 'PNG', optimize=True)
+        os.replace(thumbnail_path + '.tmp', thumbnail_path)
+    return entry
+
+
+class PrerenderWorker(QObject):
+    signal_progress = Signal(int)
+    signal_done = Signal(int, int)
+    signal_fail = Signal(str)
+
+    def __init__(self, repo_location: str, cache: RenderCache) -> None:
+        super().__init__()
+        self.repo_location = repo_location
+        self.cache = cache
+
+    def process(self) -> None:
+        try:
+            maps = list_maps(MapLoader(self.repo_location))
+            if len(maps) == 0:
+                self.signal_fail.emit(f'No maps found in the build folder of {self.repo_location}.')
+                return
+            os.makedirs(self.cache.folder, exist_ok=True)
+
+            # Render all maps of an area in the same process.
+            areas: Dict[int, List[Tuple[int, int, str]]] = {}
+            for map in maps:
+                areas.setdefault(map[0], []).append(map)
+
+            rendered = 0
+            failed = 0
+            finished = 0
+            with ProcessPoolExecutor(initializer=init_worker, initargs=(self.repo_location,), mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(prerender_maps, self.cache.folder, area_maps) for area_maps in areas.values()]
+                for future in as_completed(futures):
+                    for (key, entry, error) in future.result():
+                        finished += 1
+                        if error is not None:
+                            print(f'Could not render {key}: {error}')
+                            failed += 1
+                        elif entry is not None:
+                            self.cache.index[key] = entry
+                            rendered += 1
+                    self.signal_progress.emit(finished * 100 // len(maps))
+
+            self.cache.save()
+            self.signal_done.emit(rendered, failed)
+        except Exception as e:
+            self.signal_fail.emit(str(e))
@@ -0,0 +1,194 @@
+from typing import List, Tuple
+import numpy as np
+from PySide6.QtGui import QImage
+
+# Renders tiles, metatiles and maps as numpy arrays.
+# Images are (height, width, 4) RGBA arrays of uint8, lists of tiles are (count, 8, 8) or (count, 8, 8, 4) arrays.
+
+TILE_SIZE = 8
+META_TILE_SIZE = 16
+TILEMAP_CHUNK_SIZE = 32 # 256x256 pixel chunks of 32x32 tiles
+
+MISSING_COLOR = (255, 0, 255, 255)
+TRANSPARENT_COLOR = (0, 0, 0, 0)
+
+NUM_PALETTES = 32
+NUM_COLORS = 16
+
+
+def read_tile_attrs(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype='<u2')
+
+
+def decode_tile_attrs(tile_attrs: np.ndarray, tile_number_offset: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Splits the tile attributes into tile numbers, palette indices, horizontal and vertical flips.
+    '''
+    tile_attrs = tile_attrs.astype(np.int32)
+    tile_numbers = (tile_attrs & 0x03FF) + tile_number_offset
+    palette_indices = (tile_attrs & 0xF000) >> 0xC
+    horizontal_flips = (tile_attrs & 0x0400) > 0
+    vertical_flips = (tile_attrs & 0x0800) > 0
+    return (tile_numbers, palette_indices, horizontal_flips, vertical_flips)
+
+
+def build_palette_table(palettes: List[List[int]]) -> np.ndarray:
+    '''
+    Converts the palettes (lists of r, g, b values) into a (32, 16, 4) RGBA lookup table.
+    Missing palettes and colors are magenta.
+    '''
+    table = np.empty((NUM_PALETTES, NUM_COLORS, 4), dtype=np.uint8)
+    table[:, :] = MISSING_COLOR
+    for i, palette in enumerate(palettes[:NUM_PALETTES]):
+        if palette is None:
+            continue
+        colors = np.array(palette[:NUM_COLORS * 3], dtype=np.uint8).reshape(-1, 3)
+        table[i, :len(colors), :3] = colors
+    return table
+
+
+def lookup_tiles(pixels: np.ndarray, defined: np.ndarray, tile_numbers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Fetches the (count, 8, 8) pixels for the tile numbers and a mask which of them exist in the VRAM.
+    '''
+    found = (tile_numbers >= 0) & (tile_numbers < len(defined))
+    clipped = np.where(found, tile_numbers, 0)
+    found &= defined[clipped]
+    return (pixels[clipped], found)
+
+
+def apply_16_color_palettes(pixels: np.ndarray, palette_indices: np.ndarray, palette_table: np.ndarray) -> np.ndarray:
+    '''
+    Colors 4bpp tiles stored as 16 gray levels in inverted order using the palette of each tile.
+    '''
+    color_indices = 15 - pixels // 16
+    return palette_table[palette_indices[:, None, None], color_indices]
+
+
+def apply_256_color_palette(pixels: np.ndarray, palette_table: np.ndarray) -> np.ndarray:
+    '''
+    Colors 8bpp tiles stored as 256 gray levels in inverted order using the whole bg palette set.
+    '''
+    return palette_table.reshape(-1, 4)[255 - pixels.astype(np.int32)]
+
+
+def apply_flips(tiles: np.ndarray, horizontal_flips: np.ndarray, vertical_flips: np.ndarray) -> np.ndarray:
+    tiles = tiles.copy()
+    tiles[horizontal_flips] = tiles[horizontal_flips][:, :, ::-1]
+    tiles[vertical_flips] = tiles[vertical_flips][:, ::-1, :]
+    return tiles
+
+
+def gray_to_rgba(pixels: np.ndarray) -> np.ndarray:
+    rgba = np.empty(pixels.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = pixels[..., None]
+    rgba[..., 3] = 255
+    return rgba
+
+
+def render_tiles(pixels: np.ndarray, defined: np.ndarray, tile_attrs: np.ndarray, tile_number_offset: int, palette_table: np.ndarray) -> np.ndarray:
+    '''
+    Renders 4bpp tiles for each tile attribute into a (count, 8, 8, 4) array.
+    '''
+    (tile_numbers, palette_indices, horizontal_flips, vertical_flips) = decode_tile_attrs(tile_attrs, tile_number_offset)
+    (tile_pixels, found) = lookup_tiles(pixels, defined, tile_numbers)
+    tiles = apply_16_color_palettes(tile_pixels, palette_indices, palette_table)
+    tiles[~found] = MISSING_COLOR
+    return apply_flips(tiles, horizontal_flips, vertical_flips)
+
+
+def render_colored_tiles(colors: np.ndarray, defined: np.ndarray, tile_attrs: np.ndarray, tile_number_offset: int) -> np.ndarray:
+    '''
+    Renders already colored tiles for each tile attribute into a (count, 8, 8, 4) array.
+    '''
+    (tile_numbers, _, horizontal_flips, vertical_flips) = decode_tile_attrs(tile_attrs, tile_number_offset)
+    (tiles, found) = lookup_tiles(colors, defined, tile_numbers)
+    tiles[~found] = MISSING_COLOR
+    return apply_flips(tiles, horizontal_flips, vertical_flips)
+
+
+def assemble_metatiles(tiles: np.ndarray) -> np.ndarray:
+    '''
+    Combines each four consecutive tiles into a (count, 16, 16, 4) array of metatiles.
+    An incomplete metatile at the end is transparent.
+    '''
+    count = (len(tiles) + 3) // 4
+    if len(tiles) % 4 != 0:
+        tiles = np.concatenate((tiles, np.zeros((count * 4 - len(tiles),) + tiles.shape[1:], dtype=np.uint8)))
+        tiles[(count - 1) * 4:] = TRANSPARENT_COLOR
+    return tiles.reshape(count, 2, 2, TILE_SIZE, TILE_SIZE, 4).transpose(0, 1, 3, 2, 4, 5).reshape(count, META_TILE_SIZE, META_TILE_SIZE, 4)
+
+
+def arrange_grid(images: np.ndarray, width: int) -> np.ndarray:
+    '''
+    Arranges (count, h, w, 4) images in rows of width images into one image.
+    '''
+    (count, h, w) = images.shape[:3]
+    height = (count + (width - 1)) // width
+    if count < width * height:
+        images = np.concatenate((images, np.zeros((width * height - count, h, w, 4), dtype=np.uint8)))
+    return np.ascontiguousarray(images.reshape(height, width, h, w, 4).transpose(0, 2, 1, 3, 4).reshape(height * h, width * w, 4))
+
+
+def arrange_chunks(tiles: np.ndarray, width_in_tiles: int) -> np.ndarray:
+    '''
+    Arranges tiles that are stored in chunks of 32x32 tiles into one image.
+    '''
+    chunk_tiles = TILEMAP_CHUNK_SIZE * TILEMAP_CHUNK_SIZE
+    count = (len(tiles) + chunk_tiles - 1) // chunk_tiles
+    if len(tiles) < count * chunk_tiles:
+        tiles = np.concatenate((tiles, np.zeros((count * chunk_tiles - len(tiles), TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)))
+    chunk_size = TILEMAP_CHUNK_SIZE * TILE_SIZE
+    chunks = tiles.reshape(count, TILEMAP_CHUNK_SIZE, TILEMAP_CHUNK_SIZE, TILE_SIZE, TILE_SIZE, 4).transpose(0, 1, 3, 2, 4, 5).reshape(count, chunk_size, chunk_size, 4)
+    return arrange_grid(chunks, width_in_tiles // TILEMAP_CHUNK_SIZE)
+
+
+def gather_metatiles(metatiles: np.ndarray, metatile_images: np.ndarray) -> np.ndarray:
+    '''
+    Fetches the rendered (count, 16, 16, 4) metatile images for the metatile ids of a map.
+    Metatile ids outside the metatileset are transparent.
+    '''
+    found = metatiles < len(metatile_images)
+    images = metatile_images[np.where(found, metatiles, 0)]
+    images[~found] = TRANSPARENT_COLOR
+    return images
+
+
+def render_metatile_map(metatiles: np.ndarray, metatile_images: np.ndarray, width_in_metatiles: int) -> np.ndarray:
+    '''
+    Renders the map of metatile ids using the rendered (count, 16, 16, 4) metatile images.
+    '''
+    return arrange_grid(gather_metatiles(metatiles, metatile_images), width_in_metatiles)
+
+
+def get_grid_indices(count: int, width: int, x: int, y: int, region_width: int, region_height: int) -> np.ndarray:
+    '''
+    Returns the indices of the elements in a region of a grid with rows of width elements.
+    Indices of elements outside of the grid are -1.
+    '''
+    height = (count + (width - 1)) // width
+    rows = np.arange(y, min(y + region_height, height))
+    columns = np.arange(x, min(x + region_width, width))
+    indices = rows[:, None] * width + columns[None, :]
+    return np.where(indices < count, indices, -1)
+
+
+def render_metatile_map_region(metatiles: np.ndarray, metatile_images: np.ndarray, width_in_metatiles: int, x: int, y: int, region_width: int, region_height: int) -> np.ndarray:
+    '''
+    Renders a region of the map of metatile ids given in metatiles.
+    '''
+    indices = get_grid_indices(len(metatiles), width_in_metatiles, x, y, region_width, region_height)
+    if indices.size == 0:
+        return np.zeros((indices.shape[0] * META_TILE_SIZE, indices.shape[1] * META_TILE_SIZE, 4), dtype=np.uint8)
+    images = gather_metatiles(metatiles[np.maximum(indices, 0).ravel()], metatile_images)
+    images[indices.ravel() < 0] = TRANSPARENT_COLOR
+    return arrange_grid(images, indices.shape[1])
+
+
+def to_qimage(image: np.ndarray) -> QImage:
+    '''
+    Wraps the RGBA buffer into a QImage that owns a copy of the data.
+    '''
+    image = np.ascontiguousarray(image)
+    (height, width) = image.shape[:2]
+    return QImage(image.data, width, height, width * 4, QImage.Format_RGBA8888).copy()
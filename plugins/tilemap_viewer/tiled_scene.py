@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QPainter, QPixmap
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsScene, QGraphicsView, QStyleOptionGraphicsItem, QWidget
+from plugins.tilemap_viewer.renderer import to_qimage
+
+# Size of the chunks in pixels that are rendered separately.
+CHUNK_SIZE = 256
+# How many rendered chunks are kept before the ones farthest from the viewport are evicted.
+MAX_CACHED_CHUNKS = 64
+
+
+@dataclass
+class ChunkSource:
+    '''
+    A map that can render square chunks of itself.
+    '''
+    width: int # in pixels
+    height: int # in pixels
+    chunk_size: int
+    # Renders the chunk at (chunk_x, chunk_y) into a (height, width, 4) array.
+    # Chunks at the right and bottom border may be smaller than chunk_size.
+    render_chunk: Callable[[int, int], np.ndarray]
+
+    @property
+    def chunk_columns(self) -> int:
+        return (self.width + self.chunk_size - 1) // self.chunk_size
+
+    @property
+    def chunk_rows(self) -> int:
+        return (self.height + self.chunk_size - 1) // self.chunk_size
+
+
+def get_chunks_in_rect(source: ChunkSource, x: float, y: float, width: float, height: float) -> List[Tuple[int, int]]:
+    '''
+    Returns all chunks that intersect with the rect.
+    '''
+    first_x = max(0, int(x) // source.chunk_size)
+    first_y = max(0, int(y) // source.chunk_size)
+    last_x = min(source.chunk_columns - 1, int(x + width) // source.chunk_size)
+    last_y = min(source.chunk_rows - 1, int(y + height) // source.chunk_size)
+    return [(chunk_x, chunk_y) for chunk_y in range(first_y, last_y + 1) for chunk_x in range(first_x, last_x + 1)]
+
+
+def get_chunks_to_evict(chunks: List[Tuple[int, int]], chunk_size: int, center_x: float, center_y: float, max_chunks: int) -> List[Tuple[int, int]]:
+    '''
+    Returns the chunks farthest away from the center so that at most max_chunks remain.
+    '''
+    if len(chunks) <= max_chunks:
+        return []
+    def distance(chunk: Tuple[int, int]) -> float:
+        dx = (chunk[0] + 0.5) * chunk_size - center_x
+        dy = (chunk[1] + 0.5) * chunk_size - center_y
+        return dx * dx + dy * dy
+    return sorted(chunks, key=distance, reverse=True)[:len(chunks) - max_chunks]
+
+
+class TiledMapItem(QGraphicsItem):
+    '''
+    Renders the chunks of the map lazily when they become visible.
+    '''
+
+    def __init__(self, source: ChunkSource, max_cached_chunks: int = MAX_CACHED_CHUNKS) -> None:
+        super().__init__()
+        self.source = source
+        self.max_cached_chunks = max_cached_chunks
+        self.chunks: Dict[Tuple[int, int], QPixmap] = {}
+        # Needed so that exposedRect only contains the area that needs to be repainted.
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self.source.width, self.source.height)
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget = None) -> None:
+        rect = option.exposedRect
+        for (chunk_x, chunk_y) in get_chunks_in_rect(self.source, rect.x(), rect.y(), rect.width(), rect.height()):
+            painter.drawPixmap(chunk_x * self.source.chunk_size, chunk_y * self.source.chunk_size, self.get_chunk(chunk_x, chunk_y))
+        self.evict_chunks(self.get_visible_rect(rect))
+
+    def get_chunk(self, chunk_x: int, chunk_y: int) -> QPixmap:
+        key = (chunk_x, chunk_y)
+        if key not in self.chunks:
+            self.chunks[key] = QPixmap.fromImage(to_qimage(self.source.render_chunk(chunk_x, chunk_y)))
+        return self.chunks[key]
+
+    def get_visible_rect(self, fallback: QRectF) -> QRectF:
+        '''
+        Returns the area of the map that is currently shown in the first view.
+        '''
+        if self.scene() is not None:
+            for view in self.scene().views():
+                return view.mapToScene(view.viewport().rect()).boundingRect()
+        return fallback
+
+    def evict_chunks(self, visible_rect: QRectF) -> None:
+        center = visible_rect.center()
+        for key in get_chunks_to_evict(list(self.chunks.keys()), self.source.chunk_size, center.x(), center.y(), self.max_cached_chunks):
+            del self.chunks[key]
+
+
+def show_tiled_map(graphicsView: QGraphicsView, source: ChunkSource) -> TiledMapItem:
+    '''
+    Replaces the scene of the graphics view with a scene only containing the tiled map.
+    '''
+    scene = QGraphicsScene(graphicsView)
+    item = TiledMapItem(source)
+    scene.addItem(item)
+    scene.setSceneRect(item.boundingRect())
+    graphicsView.setScene(scene)
+    return item
@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+
+# Paints four linked hex viewers like when scrolling and reports the time per frame.
+# Usage: python tests/benchmark_hex_area.py [frames]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtWidgets import QApplication
+from tlh.hexviewer.ui.hex_area import HexAreaWidget
+from test_hex_area import fill, render
+
+VIEWERS = 4
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    app = QApplication.instance() or QApplication([])
+    widgets = []
+    for i in range(VIEWERS):
+        widget = HexAreaWidget(None)
+        widget.resize(1000, 1000)
+        fill(widget, i)
+        widgets.append(widget)
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        for widget in widgets:
+            # Scroll by one line, the lines that stay on the screen are drawn from the row cache
+            bytes_per_line = widget.bytes_per_line
+            widget.display_data = widget.display_data[bytes_per_line:] + widget.display_data[:bytes_per_line]
+            widget.display_labels = widget.display_labels[1:] + widget.display_labels[:1]
+            render(widget)
+    elapsed = time.perf_counter() - start
+    print(f'{elapsed / frames * 1000:.1f}ms per frame for {len(widgets)} viewers with {len(widgets[0].display_data)} bytes each')
+
+
+if __name__ == '__main__':
+    main()
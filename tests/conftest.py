@@ -0,0 +1,11 @@
+import os
+import pytest
+from PySide6.QtWidgets import QApplication
+
+# Widgets are painted without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def app():
+    return QApplication.instance() or QApplication([])
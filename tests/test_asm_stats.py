@@ -0,0 +1,65 @@
+import io
+import json
+import os
+from plugins.asm_stats import stats
+from tlh.const import CUSTOM_MAP_FILES, RomVariant
+
+
+MAP = '''Archive member included to satisfy reference by file (symbol)
+
+Linker script and memory map
+
+rom             0x08000000  0x1000000
+ .text          0x08000000       0x40 build/{0}/asm/crt0.o
+                0x08000000                _start
+ .text          0x08000040      0x100 build/{0}/src/enemy/octorok.o
+                0x08000040                Octorok_Init
+                0x08000080                Octorok_Action
+                0x080000c0                Octorok_Matched
+ .text          0x08000140       0x20 build/{0}/asm/code_08000140.o
+                0x08000140                sub_08000140
+ .rodata        0x08000160       0x10 build/{0}/data/data_08000160.o
+                0x08000160                gUnk_08000160
+
+Discarded input sections
+'''
+
+
+def write_map(repo, variant: RomVariant) -> str:
+    path = os.path.join(repo, CUSTOM_MAP_FILES[variant])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(MAP.format(variant.value))
+    return path
+
+
+def test_parse_map(tmp_path) -> None:
+    model = stats.parse_map(write_map(str(tmp_path), RomVariant.CUSTOM))
+    assert [section.path for section in model.sections] == ['asm/crt0.o', 'src/enemy/octorok.o', 'asm/code_08000140.o', 'data/data_08000160.o']
+    assert [(symbol.name, symbol.size) for symbol in model.symbols] == [
+        ('_start', 0x40), ('Octorok_Init', 0x40), ('Octorok_Action', 0x40), ('Octorok_Matched', 0x80), ('sub_08000140', 0x20), ('gUnk_08000160', None)
+    ]
+
+
+def test_calc_stats(tmp_path) -> None:
+    model = stats.parse_map(write_map(str(tmp_path), RomVariant.CUSTOM))
+    result = stats.calc_stats(model, {'Octorok_Init'}, {'Octorok_Action'})
+    assert (result.non_matching, result.asm_funcs, result.handwritten) == (0x40, 0x40, 0x40)
+    assert (result.src, result.asm, result.data) == (0x100 - 0x80, 0x20 + 0x80, 0x10)
+    assert [(file.folder, file.name, file.size) for file in result.asm_files] == [('asm', 'code_08000140.o', 0x20), ('src/enemy', 'octorok.o', 0x80)]
+
+
+def test_all_variants(tmp_path) -> None:
+    repo = str(tmp_path)
+    write_map(repo, RomVariant.CUSTOM)
+    write_map(repo, RomVariant.CUSTOM_EU)
+    stats.map_cache.clear()
+    result = stats.calc_stats_for_variants(repo, {'Octorok_Init'}, set())
+    assert list(result) == [RomVariant.CUSTOM, RomVariant.CUSTOM_EU]
+    assert len(stats.map_cache) == 2
+
+    file = io.StringIO()
+    stats.write_json(result, file)
+    data = json.loads(file.getvalue())
+    assert data['CUSTOM_EU']['non_matching'] == 0x40
+    assert data['CUSTOM']['asm_files'][0] == {'folder': 'asm', 'name': 'code_08000140.o', 'size': 0x20}
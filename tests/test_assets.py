@@ -0,0 +1,91 @@
+import pytest
+from plugins.data_extractor.assets import Assets
+from tlh.const import RomVariant
+
+
+def get_index_linear(assets: list, addr: int, variant: str) -> int:
+    # Reference implementation walking the whole list
+    current_offset = 0
+    for i in range(len(assets)):
+        asset = assets[i]
+        if 'offsets' in asset:
+            if variant != 'USA' and variant in asset['offsets']:
+                current_offset = asset['offsets'][variant]
+        elif 'path' in asset:
+            if 'variants' in asset and variant not in asset['variants']:
+                continue
+            start = 0
+            if 'start' in asset:
+                start = asset['start'] + current_offset
+            elif 'starts' in asset:
+                start = asset['starts'][variant]
+            if addr <= start:
+                return i
+    return None
+
+
+def create_assets() -> list:
+    return [
+        {'path': 'a.bin', 'start': 0x100, 'size': 0x10},
+        {'path': 'b.bin', 'start': 0x110, 'size': 0x10},
+        {'offsets': {'EU': -0x8, 'JP': 0x20}},
+        {'path': 'c.bin', 'start': 0x120, 'size': 0x10},
+        {'path': 'd_usa.bin', 'variants': ['USA', 'JP'], 'start': 0x130, 'size': 0x10},
+        {'path': 'd_eu.bin', 'variants': ['EU'], 'start': 0x130, 'size': 0x20},
+        {'path': 'e.bin', 'starts': {'USA': 0x140, 'EU': 0x148, 'JP': 0x160, 'DEMO_USA': 0x90, 'DEMO_JP': 0x140}, 'size': 0x10},
+        {'offsets': {'EU': 0x8}},
+        {'path': 'f.bin', 'start': 0x150, 'size': 0x10},
+    ]
+
+
+def assert_same_as_linear(assets: Assets) -> None:
+    for variant in [RomVariant.USA, RomVariant.EU, RomVariant.JP, RomVariant.DEMO, RomVariant.DEMO_JP]:
+        name = {RomVariant.DEMO: 'DEMO_USA'}.get(variant, variant.value)
+        for addr in range(0x80, 0x190, 4):
+            assert assets.get_index_at_of_after(addr, variant) == get_index_linear(assets.assets, addr, name)
+
+
+def test_get_index_at_of_after():
+    assets = Assets(create_assets())
+    assert assets.get_index_at_of_after(0x100, RomVariant.USA) == 0
+    assert assets.get_index_at_of_after(0x101, RomVariant.USA) == 1
+    assert assets.get_index_at_of_after(0x131, RomVariant.USA) == 6
+    assert assets.get_index_at_of_after(0x200, RomVariant.USA) is None
+    assert assets.get_asset_at_of_after(0x127, RomVariant.EU)['path'] == 'd_eu.bin'
+    # Assets that are not sorted by start are found in list order
+    assert assets.get_index_at_of_after(0x80, RomVariant.DEMO) == 0
+    assert_same_as_linear(assets)
+
+
+def test_insert_before():
+    assets = Assets(create_assets())
+    assert_same_as_linear(assets)
+
+    next_asset = assets.get_asset_at_of_after(0x125, RomVariant.USA)
+    assets.insert_before({'path': 'new.bin', 'start': 0x124, 'size': 0xc}, next_asset)
+    assert assets.assets[4]['path'] == 'new.bin'
+    assert assets.get_asset_at_of_after(0x121, RomVariant.USA)['path'] == 'new.bin'
+    assert_same_as_linear(assets)
+
+    # Insert by an equal, but not identical asset
+    assets.insert_before({'path': 'new2.bin', 'variants': ['EU'], 'start': 0x10, 'size': 0x4}, {'path': 'a.bin', 'start': 0x100, 'size': 0x10})
+    assert assets.assets[0]['path'] == 'new2.bin'
+    assert_same_as_linear(assets)
+
+    # Inserting offsets changes the starts of all following assets
+    assets.insert_before({'offsets': {'JP': 0x40}}, assets.assets[-1])
+    assert_same_as_linear(assets)
+
+
+def test_insert_patches_index(monkeypatch):
+    assets = Assets(create_assets())
+    assert_same_as_linear(assets)
+    monkeypatch.setattr(assets, 'calculate_starts', lambda variant: pytest.fail('The index was rebuilt'))
+
+    # More inserts at the same position than there are gaps between the order keys
+    next_asset = assets.assets[3]
+    for i in range(40):
+        assets.insert_before({'path': f'new{i}.bin', 'start': 0x11c, 'size': 0x1}, next_asset)
+    monkeypatch.undo()
+    assert [asset['path'] for asset in assets.assets[3:44]] == [f'new{i}.bin' for i in range(40)] + ['c.bin']
+    assert_same_as_linear(assets)
@@ -0,0 +1,169 @@
+import asyncio
+import socket
+import threading
+import time
+import aiohttp
+import socketio
+from tlh.common import bridge_server
+from tlh.common.bridge_server import BridgeServer, coalesce_events
+
+TIMEOUT = 30
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def process_events_until(app, condition) -> None:
+    end = time.time() + TIMEOUT
+    while not condition():
+        assert time.time() < end, 'Timed out'
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def start_server(app, server: BridgeServer) -> None:
+    started = []
+    errors = []
+    server.signal_started.connect(lambda: started.append(True))
+    server.signal_error.connect(errors.append)
+    server.start()
+    process_events_until(app, lambda: started or errors)
+    assert errors == []
+
+
+def stop_server(app, server: BridgeServer) -> None:
+    stopped = []
+    server.signal_stopped.connect(lambda: stopped.append(True))
+    server.stop()
+    process_events_until(app, lambda: stopped)
+    assert not server.running
+
+
+def run_client(client) -> threading.Thread:
+    thread = threading.Thread(target=lambda: asyncio.run(client()))
+    thread.start()
+    return thread
+
+
+def test_coalesce_events() -> None:
+    events = [('script', 1), ('connect', None), ('script', 2), ('c_code', 'a'), ('c_code', 'b'), ('script', 3)]
+    assert coalesce_events(events, {'script'}) == [('connect', None), ('c_code', 'a'), ('c_code', 'b'), ('script', 3)]
+    assert coalesce_events(events, set()) == events
+
+
+def test_http_load(app) -> None:
+    count = 5000
+    port = get_free_port()
+    server = BridgeServer(port)
+    server.add_route('/event', 'event')
+    received = []
+    batches = []
+    def handle(data):
+        received.append(int(data['id']))
+    server.on('event', handle)
+    server.signal_events.connect(batches.append)
+    start_server(app, server)
+
+    async def client():
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64)) as session:
+            async def send(i):
+                async with session.get(f'http://localhost:{port}/event', params={'id': i}) as response:
+                    assert await response.text() == 'ok'
+            await asyncio.gather(*(send(i) for i in range(count)))
+
+    thread = run_client(client)
+    process_events_until(app, lambda: len(received) == count)
+    thread.join()
+
+    assert sorted(received) == list(range(count))
+    assert len(batches) < count
+    stop_server(app, server)
+
+
+def test_socketio_load(app) -> None:
+    count = 5000
+    port = get_free_port()
+    server = BridgeServer(port, coalesced_events=['position'])
+    received = []
+    positions = []
+    connected = []
+    server.on('connect', lambda data: connected.append(True))
+    server.on('c_code', received.append)
+    server.on('position', positions.append)
+    start_server(app, server)
+
+    async def client():
+        sio = socketio.AsyncClient()
+        await sio.connect(f'http://localhost:{port}', transports=['websocket'])
+        for i in range(count):
+            await sio.emit('c_code', i)
+            await sio.emit('position', i)
+        # Wait for an answer from the server, so that all events were received before disconnecting
+        answer = asyncio.Event()
+        sio.on('done', lambda *args: answer.set())
+        await sio.emit('c_code', 'done')
+        await asyncio.wait_for(answer.wait(), TIMEOUT)
+        await sio.disconnect()
+
+    thread = run_client(client)
+    process_events_until(app, lambda: len(received) == count + 1)
+    server.send('done')
+    thread.join()
+
+    assert connected == [True]
+    # Events of a client arrive in order
+    assert received == list(range(count)) + ['done']
+    # Only the last position of each batch is delivered
+    assert positions[-1] == count - 1
+    assert positions == sorted(positions)
+    assert len(positions) < count
+    stop_server(app, server)
+
+
+def test_backpressure(app, monkeypatch) -> None:
+    count = 200
+    # More requests than fit into the queue need to wait instead of being dropped
+    monkeypatch.setattr(bridge_server, 'MAX_PENDING_EVENTS', 8)
+    port = get_free_port()
+    server = BridgeServer(port)
+    server.add_route('/event', 'event')
+    received = []
+    def slow_handler(data):
+        # A slow Qt thread delays the clients instead of queueing up events
+        time.sleep(0.0005)
+        received.append(data)
+    server.on('event', slow_handler)
+    start_server(app, server)
+
+    async def client():
+        async with aiohttp.ClientSession() as session:
+            async def send():
+                async with session.get(f'http://localhost:{port}/event') as response:
+                    assert response.status == 200
+            await asyncio.gather(*(send() for i in range(count)))
+
+    thread = run_client(client)
+    process_events_until(app, lambda: len(received) == count)
+    thread.join()
+    stop_server(app, server)
+
+
+def test_port_in_use(app) -> None:
+    port = get_free_port()
+    first = BridgeServer(port)
+    start_server(app, first)
+
+    second = BridgeServer(port)
+    errors = []
+    second.signal_error.connect(errors.append)
+    second.start()
+    process_events_until(app, lambda: errors)
+    assert not second.running
+
+    stop_server(app, first)
+    # The port can be used again after the server was stopped
+    start_server(app, second)
+    stop_server(app, second)
@@ -0,0 +1,76 @@
+import os
+import sys
+from PySide6.QtCore import QEventLoop, QTimer
+from tlh.builder import pipeline
+from tlh.builder.ui import BuilderWidget
+from tlh.const import RomVariant
+
+
+def write_file(path, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def bump_mtime(path) -> None:
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_output_buffer() -> None:
+    buffer = pipeline.OutputBuffer()
+    encoded = 'first\r\nsecönd\nthird'.encode('utf-8')
+    split = encoded.index('ö'.encode('utf-8')) + 1
+    assert buffer.feed(encoded[:split]) == ['first']
+    assert buffer.feed(encoded[split:]) == ['secönd']
+    assert buffer.finish() == ['third']
+    assert buffer.finish() == []
+
+
+def test_output_tracker(tmp_path) -> None:
+    rom = str(tmp_path / 'tmc.gba')
+    map = str(tmp_path / 'build' / 'USA' / 'tmc.map')
+    missing = str(tmp_path / 'tmc_eu.gba')
+    write_file(rom, b'rom')
+    write_file(map, b'map')
+    outputs = {RomVariant.CUSTOM: (rom, map), RomVariant.CUSTOM_EU: (missing, str(tmp_path / 'tmc_eu.map'))}
+
+    tracker = pipeline.OutputTracker()
+    tracker.snapshot([path for paths in outputs.values() for path in paths])
+    assert pipeline.get_changed_outputs(tracker, outputs).is_empty()
+
+    # The first build that writes a file is always a change
+    write_file(rom, b'new rom')
+    write_file(missing, b'eu')
+    changes = pipeline.get_changed_outputs(tracker, outputs)
+    assert (changes.roms, changes.maps) == ([RomVariant.CUSTOM, RomVariant.CUSTOM_EU], [])
+
+    # Writing the same content again is not
+    tracker.snapshot([path for paths in outputs.values() for path in paths])
+    bump_mtime(rom)
+    write_file(map, b'new map')
+    changes = pipeline.get_changed_outputs(tracker, outputs)
+    assert (changes.roms, changes.maps) == ([], [RomVariant.CUSTOM])
+    assert changes.get_variants() == [RomVariant.CUSTOM]
+
+
+def test_builder_streams_output(app, monkeypatch) -> None:
+    monkeypatch.setattr('tlh.builder.ui.get_build_outputs', lambda: {})
+    monkeypatch.setattr('tlh.settings.get_repo_location', lambda: os.getcwd())
+    monkeypatch.setattr('tlh.settings.get_build_command', lambda: f'"{sys.executable}" -c "import sys; print(\'<a>\'); print(\'tmc.gba: OK\'); sys.stderr.write(\'warning: x\')"')
+
+    widget = BuilderWidget()
+    done = []
+    widget.signal_outputs_changed.connect(done.append)
+    loop = QEventLoop()
+    widget.process.finished.connect(loop.quit)
+    QTimer.singleShot(10000, loop.quit)
+    widget.doCompile()
+    loop.exec()
+
+    assert '<a>' in widget.stdoutText.toPlainText()
+    assert 'tmc.gba: OK' in widget.stdoutText.toPlainText()
+    assert 'No roms changed.' in widget.stdoutText.toPlainText()
+    assert widget.stderrText.toPlainText().strip() == 'warning: x'
+    assert widget.compileButton.isEnabled()
+    assert done == []
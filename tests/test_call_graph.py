@@ -0,0 +1,49 @@
+import io
+import json
+from sortedcontainers import SortedKeyList
+from plugins.function_call_graph.graph import CallGraph, Edge, build_edges
+from tlh.const import RomVariant
+from tlh.data.pointer import Pointer
+from tlh.data.symbols import Symbol, SymbolList
+
+
+def create_graph() -> CallGraph:
+    # main -> a -> b -> c -> a, b -> d, e -> d
+    calls = [('main', 'a'), ('a', 'b'), ('b', 'c'), ('c', 'a'), ('b', 'd'), ('e', 'd'), ('a', 'b')]
+    return CallGraph([Edge(source, 0, target, 0) for (source, target) in calls])
+
+
+def test_build_edges() -> None:
+    symbols = SymbolList(SortedKeyList([Symbol(0x100, 'main'), Symbol(0x200, 'a')], key=lambda symbol: symbol.address))
+    pointers = [Pointer(RomVariant.USA, 0x110, 0x08000201), Pointer(RomVariant.USA, 0x204, 0x08000100), Pointer(RomVariant.USA, 0x10, 0x08000100)]
+    assert build_edges(pointers, symbols) == [Edge('main', 0x10, 'a', 1), Edge('a', 4, 'main', 0)]
+
+
+def test_queries() -> None:
+    graph = create_graph()
+    assert graph.get_callees('b') == ['c', 'd']
+    assert sorted(graph.get_callers('d')) == ['b', 'e']
+    assert sorted(graph.get_reachable('main')) == ['a', 'b', 'c', 'd']
+    # Recursion reaches itself
+    assert sorted(graph.get_reachable('a')) == ['a', 'b', 'c', 'd']
+    assert sorted(graph.get_reaching('d')) == ['a', 'b', 'c', 'e', 'main']
+    assert graph.get_reachable('d') == []
+
+
+def test_strongly_connected_components() -> None:
+    components = create_graph().get_strongly_connected_components()
+    assert sorted(sorted(component) for component in components) == [['a', 'b', 'c'], ['d'], ['e'], ['main']]
+
+
+def test_writers() -> None:
+    graph = create_graph()
+    output = io.StringIO()
+    graph.write_json(output)
+    data = json.loads(output.getvalue())
+    assert data['nodes'] == graph.names
+    assert [(data['nodes'][edge['source']], data['nodes'][edge['target']]) for edge in data['edges']] == [(edge.from_symbol, edge.to_symbol) for edge in graph.edges]
+
+    output = io.StringIO()
+    graph.write_gml(output)
+    assert output.getvalue().count('edge [') == len(graph.edges)
+    assert 'label "main +0 -> a +0"' in output.getvalue()
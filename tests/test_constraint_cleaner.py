@@ -0,0 +1,67 @@
+import random
+from plugins.constraint_cleaner.cleaner import find_duplicate_constraints, find_invalid_constraint, find_redundant_constraints, find_unfulfilled_constraints, solve
+from tlh.const import RomVariant
+from tlh.data.constraints import Constraint
+
+VARIANTS = [RomVariant.USA, RomVariant.JP, RomVariant.EU]
+
+
+def get_relations(manager):
+    return {variant: [(relation.local_address, relation.virtual_address) for relation in manager.rom_relations[variant].relations] for variant in VARIANTS}
+
+
+def test_find_duplicate_constraints() -> None:
+    a = Constraint(RomVariant.USA, 10, RomVariant.JP, 20)
+    b = Constraint(RomVariant.JP, 20, RomVariant.USA, 10, enabled=False)
+    c = Constraint(RomVariant.USA, 10, RomVariant.JP, 21)
+    d = Constraint(RomVariant.USA, 10, RomVariant.JP, 21)
+    assert find_duplicate_constraints([a, b, c, d]) == [b, d]
+    # An enabled constraint is kept instead of a disabled one
+    assert find_duplicate_constraints([b, a]) == [b]
+
+
+def test_find_redundant_transitive() -> None:
+    constraints = [
+        Constraint(RomVariant.USA, 10, RomVariant.JP, 20),
+        Constraint(RomVariant.JP, 20, RomVariant.EU, 30),
+        Constraint(RomVariant.USA, 10, RomVariant.EU, 30),
+        # Already at the same virtual address due to the previous constraints
+        Constraint(RomVariant.USA, 50, RomVariant.JP, 60),
+        Constraint(RomVariant.USA, 70, RomVariant.JP, 90),
+    ]
+    manager = solve(VARIANTS, constraints)
+    assert find_redundant_constraints(manager, constraints) == [constraints[2], constraints[3]]
+
+
+def test_find_redundant_random() -> None:
+    rng = random.Random(1)
+    for _ in range(20):
+        # Offsets between the roms that grow with the address, so that the constraints are consistent
+        offsets = {variant: sorted(rng.randrange(0, 50) for _ in range(5)) for variant in VARIANTS}
+        def to_local(variant, address):
+            return address + offsets[variant][min(address // 200, 4)]
+        constraints = []
+        for _ in range(40):
+            address = rng.randrange(0, 1000)
+            (a, b) = rng.sample(VARIANTS, 2)
+            constraints.append(Constraint(a, to_local(a, address), b, to_local(b, address)))
+        manager = solve(VARIANTS, constraints)
+
+        redundant = find_redundant_constraints(manager, constraints)
+        kept = [constraint for constraint in constraints if constraint not in redundant]
+        reduced = solve(VARIANTS, kept)
+        assert find_unfulfilled_constraints(reduced, constraints) == []
+        assert get_relations(reduced) == get_relations(manager)
+
+
+def test_find_invalid_constraint() -> None:
+    constraints = [
+        Constraint(RomVariant.USA, 10, RomVariant.JP, 20),
+        Constraint(RomVariant.USA, 30, RomVariant.JP, 40),
+        Constraint(RomVariant.USA, 30, RomVariant.JP, 45),
+        Constraint(RomVariant.USA, 60, RomVariant.JP, 70),
+    ]
+    # Conflicts are only detected when no rom variant can advance
+    variants = [RomVariant.USA, RomVariant.JP]
+    assert find_invalid_constraint(variants, constraints) == constraints[2]
+    assert find_invalid_constraint(variants, constraints[:2]) is None
@@ -1,7 +1,7 @@
 
 
 from tlh.const import RomVariant
-from tlh.data.constraints import Constraint, ConstraintManager, RomVariantNotAddedError, InvalidConstraintError
+from tlh.data.constraints import Constraint, ConstraintManager, RomVariantNotAddedError, InvalidConstraintError, SolveCancelledError
 import pytest
 
 # The tables in this file are showing the configuration of the constraints
@@ -661,4 +661,38 @@ def x_test_many_relations():
         assert_j_e_address(manager, 2*i,i,2*i)
 
 
+
+def test_progress_and_cancel():
+    manager = ConstraintManager({RomVariant.EU, RomVariant.JP})
+    for i in range(0, 10):
+        add_j_e_constraint(manager, 10 * i, 20 * i)
+    progress = []
+    manager.rebuild_relations(progress.append)
+    assert progress == sorted(progress)
+    assert progress[-1] == 100
+    assert_j_e_address(manager, 180, 90, 180)
+
+    calls = []
+    with pytest.raises(SolveCancelledError):
+        manager.rebuild_relations(is_cancelled=lambda: calls.append(True) or len(calls) > 3)
+
+
+def test_replace_relations():
+    manager = ConstraintManager({RomVariant.EU, RomVariant.JP})
+    add_j_e_constraint(manager, 10, 20)
+    manager.rebuild_relations()
+
+    # The relations of the already added variants are kept until they are solved again
+    manager.add_missing_variants({RomVariant.EU, RomVariant.JP, RomVariant.USA})
+    assert_j_e_address(manager, 20, 10, 20)
+    assert_same_address(manager, RomVariant.USA, 20)
+
+    solved = ConstraintManager({RomVariant.EU, RomVariant.JP, RomVariant.USA})
+    add_u_j_constraint(solved, 30, 10)
+    add_j_e_constraint(solved, 10, 20)
+    solved.rebuild_relations()
+    manager.replace_relations(solved)
+    assert_differing_address(manager, RomVariant.USA, 30, 30)
+    assert_j_e_address(manager, 30, 10, 20)
+
 # endregion
\ No newline at end of file
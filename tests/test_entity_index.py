@@ -0,0 +1,75 @@
+import json
+import os
+from plugins.entity_explorer_bridge.entity_index import EntityIndex, count_entities
+
+
+def write_save_game(folder, name, entities, mtime_offset=0) -> None:
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(entities, file)
+    if mtime_offset != 0:
+        mtime = os.stat(path).st_mtime_ns + mtime_offset
+        os.utime(path, ns=(mtime, mtime))
+
+
+def enemy(id, type=0):
+    return {'kind': 3, 'id': id, 'type': type}
+
+
+def manager(subtype):
+    return {'type': 9, 'subtype': subtype}
+
+
+def test_count_entities(tmp_path) -> None:
+    write_save_game(str(tmp_path), 'a.json', [[enemy(1), enemy(1, 2)], [enemy(5), manager(7)], [{'kind': 6}]])
+    assert count_entities(os.path.join(str(tmp_path), 'a.json')) == {
+        '3:1': 2, '3:1:0': 1, '3:1:2': 1, '3:5': 1, '3:5:0': 1, '9:7': 1
+    }
+
+
+def test_search(tmp_path) -> None:
+    folder = os.path.join(str(tmp_path), 'save_games_json')
+    write_save_game(folder, 'area/a.json', [[enemy(1), enemy(1, 2)], [enemy(5), manager(7)]])
+    write_save_game(folder, 'area/b.json', [[enemy(5)], [manager(7), manager(7)]])
+    write_save_game(folder, 'c.json', [[enemy(2)]])
+    index = EntityIndex(folder, os.path.join(str(tmp_path), 'index.json'))
+    assert index.update() == 3
+
+    a = os.path.join('area', 'a.json')
+    b = os.path.join('area', 'b.json')
+    assert index.search(3, 1) == {a: 2}
+    assert index.search(3, 1, 2) == {a: 1}
+    assert index.search(9, 7) == {a: 1, b: 2}
+    assert index.search(3, 4) == {}
+    assert index.search_any(3, [1, 2, 5]) == {a: 3, b: 1, 'c.json': 1}
+    assert index.search_all([(3, 5), (9, 7)]) == {a: 1, b: 1}
+    assert index.search_all([(3, 1), (3, 2)]) == {}
+
+
+def test_incremental_update(tmp_path) -> None:
+    folder = os.path.join(str(tmp_path), 'save_games_json')
+    index_path = os.path.join(str(tmp_path), 'index.json')
+    write_save_game(folder, 'a.json', [[enemy(1)]])
+    write_save_game(folder, 'b.json', [[enemy(1)]])
+    index = EntityIndex(folder, index_path)
+    index.update()
+    assert index.update() == 0
+
+    # Changed and removed files
+    write_save_game(folder, 'a.json', [[enemy(2)]], 1000000000)
+    os.remove(os.path.join(folder, 'b.json'))
+    write_save_game(folder, 'c.json', [[enemy(1)]])
+    assert index.update() == 3
+    assert index.search(3, 1) == {'c.json': 1}
+    assert index.search(3, 2) == {'a.json': 1}
+
+    # The index is loaded from the index file
+    loaded = EntityIndex(folder, index_path)
+    assert loaded.update() == 0
+    assert loaded.search(3, 1) == {'c.json': 1}
+    assert loaded.entities == index.entities
+
+    # Index files for other folders are ignored
+    other = EntityIndex(os.path.join(str(tmp_path), 'other'), index_path)
+    assert other.files == {}
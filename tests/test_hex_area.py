@@ -0,0 +1,78 @@
+from PySide6.QtGui import QColor, QImage
+from tlh.data.annotations import Annotation
+from tlh.data.constraints import Constraint
+from tlh.hexviewer.display_byte import DisplayByte
+from tlh.hexviewer.ui.hex_area import HexAreaWidget
+
+BACKGROUND = QColor(0, 40, 0)
+
+
+def fill(widget: HexAreaWidget, seed: int) -> None:
+    rows = widget.number_of_lines_on_screen()
+    data = []
+    for i in range(rows * widget.bytes_per_line):
+        value = (i * 7 + seed) % 256
+        data.append(DisplayByte(
+            '%02X' % value,
+            BACKGROUND if value == 8 or i % 5 == 0 else None,
+            i % 16 < 4,
+            [Annotation(color=QColor(255, 0, 0))] if i % 11 == 0 else [],
+            [Constraint(enabled=i % 2 == 0)] if i % 13 == 0 else [],
+            []
+        ))
+    widget.display_data = data
+    widget.display_labels = ['%08X' % (row * widget.bytes_per_line) for row in range(rows)]
+
+
+def render(widget: HexAreaWidget) -> QImage:
+    image = QImage(widget.size(), QImage.Format_ARGB32)
+    image.fill(0)
+    widget.render(image)
+    return image
+
+
+def has_color(image: QImage, x: int, y: int, width: int, height: int, color: QColor) -> bool:
+    return any(image.pixelColor(x + dx, y + dy) == color for dx in range(width) for dy in range(height))
+
+
+def test_paint(app) -> None:
+    widget = HexAreaWidget(None)
+    widget.resize(600, 200)
+    fill(widget, 0)
+    image = render(widget)
+    (width, height) = (widget.byte_width, widget.line_height)
+    # The first byte has a background, the second does not
+    assert has_color(image, widget.label_length, 0, width, height, BACKGROUND)
+    assert not has_color(image, widget.label_length + width, 0, width, height, BACKGROUND)
+    # Selection rects around the first four bytes of each line
+    assert has_color(image, widget.label_length - 4, 0, 2, height, widget.selection_color.color())
+    assert not has_color(image, widget.label_length + 5 * width - 4, 0, 2, height, widget.selection_color.color())
+
+
+def get_rows(widget: HexAreaWidget) -> set:
+    bytes_per_line = widget.bytes_per_line
+    return {tuple(byte.text for byte in widget.display_data[i:i + bytes_per_line]) for i in range(0, len(widget.display_data), bytes_per_line)}
+
+
+def test_paint_caches_rows(app) -> None:
+    '''
+    Lines whose text did not change are drawn from the row cache when scrolling.
+    '''
+    widget = HexAreaWidget(None)
+    widget.resize(1000, 1000)
+    fill(widget, 0)
+    render(widget)
+    rows = dict(widget.glyphs.rows)
+    assert len(rows) == len(get_rows(widget))
+
+    # Repainting the same lines does not render any row again
+    render(widget)
+    assert all(widget.glyphs.rows[key] is row for (key, row) in rows.items())
+    assert len(widget.glyphs.rows) == len(rows)
+
+    # Scrolling by one line renders only the new line
+    bytes_per_line = widget.bytes_per_line
+    widget.display_data = widget.display_data[bytes_per_line:] + [DisplayByte('%02X' % i, None, False, [], [], []) for i in range(bytes_per_line)]
+    render(widget)
+    assert len(widget.glyphs.rows) == len(rows) + 1
+    assert all(widget.glyphs.rows[key] is row for (key, row) in rows.items())
@@ -0,0 +1,80 @@
+import os
+from plugins.mgba_bridge import script_index
+from plugins.mgba_bridge.script_index import DisassemblyCache, ScriptIndex, annotate_script, find_script_labels
+from tlh.data.repo_index import RepoIndex
+
+
+def write_file(path, text) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+def test_find_script_labels() -> None:
+    lines = ['@ comment', 'SCRIPT_START script_08001000', '\tStart', 'SCRIPT_END', 'SCRIPT_START script_08001100 ', 'SCRIPT_END']
+    assert find_script_labels(lines) == {'script_08001000': 1, 'script_08001100': 4}
+
+
+def test_script_index(tmp_path) -> None:
+    repo = str(tmp_path)
+    folder = os.path.join(repo, 'data', 'scripts')
+    write_file(os.path.join(folder, 'a', 'scripts.inc'), 'SCRIPT_START script_08001000\nSCRIPT_END\nSCRIPT_START script_08001100\nSCRIPT_END\n')
+    write_file(os.path.join(folder, 'b', 'script_08001100.inc'), 'SCRIPT_START script_08001100\nSCRIPT_END\n')
+    write_file(os.path.join(repo, 'data', 'data_08000000.s'), 'SCRIPT_START script_08001300\n')
+    repo_index = RepoIndex(repo)
+    index = ScriptIndex(repo_index, os.path.join('data', 'scripts'))
+
+    assert index.find_script('script_08001000') == os.path.join(folder, 'a', 'scripts.inc')
+    # A file named after the script takes precedence
+    assert index.find_script('script_08001100') == os.path.join(folder, 'b', 'script_08001100.inc')
+    # Prefixes of labels do not match
+    assert index.find_script('script_0800') is None
+    # Only the script folder is searched
+    assert index.find_script('script_08001300') is None
+    assert index.get_lines(os.path.join(folder, 'a', 'scripts.inc'))[0] == 'SCRIPT_START script_08001000'
+
+    # Changes are only picked up after the repo index was invalidated
+    path = os.path.join(folder, 'a', 'scripts.inc')
+    write_file(path, 'SCRIPT_START script_08001200\nSCRIPT_END\n')
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 1000000000,) * 2)
+    assert index.find_script('script_08001200') is None
+    repo_index.invalidate(path)
+    assert index.find_script('script_08001200') == path
+    assert index.find_script('script_08001000') is None
+
+
+def test_disassembly_cache(monkeypatch) -> None:
+    calls = []
+    disassemble_script = script_index.disassemble_script
+    def count_calls(data, address):
+        calls.append(address)
+        return disassemble_script(data, address)
+    monkeypatch.setattr(script_index, 'disassemble_script', count_calls)
+
+    cache = DisassemblyCache()
+    data = bytearray(b'\x00\x00\xff\xff\x00\x00')
+    instructions = cache.get_instructions('script_08001000', 0x1000, data)
+    assert [instruction.addr for instruction in instructions] == [0, 2]
+    assert cache.get_instructions('script_08001000', 0x1000, data) is instructions
+    assert len(calls) == 1
+    # The script changed in the rebuilt rom
+    cache.get_instructions('script_08001000', 0x1000, b'\xff\xff\x00\x00')
+    assert len(calls) == 2
+
+    # Only the most recently used scripts are kept
+    monkeypatch.setattr(DisassemblyCache, 'MAX_ENTRIES', 2)
+    cache.get_instructions('script_08001000', 0x1000, data)
+    cache.get_instructions('script_08001100', 0x1100, data)
+    assert len(cache.instructions) == 2
+    cache.get_instructions('script_08001000', 0x1000, data)
+    assert len(calls) == 3
+    cache.get_instructions('script_08001000', 0x1000, b'\xff\xff\x00\x00')
+    assert len(calls) == 4
+
+
+def test_annotate_script() -> None:
+    lines = ['SCRIPT_START script_08001000', '\tStart', 'SCRIPT_END', 'SCRIPT_START script_08001100', '\t.2byte 0x0000', 'SCRIPT_END', '\t.2byte 0x0000']
+    cache = DisassemblyCache()
+    instructions = cache.get_instructions('script_08001100', 0x1100, b'\x00\x00\xff\xff\x00\x00')
+    output = annotate_script(lines, 'script_08001100', 2, instructions)
+    assert output == 'SCRIPT_START script_08001000\n\tStart\nSCRIPT_END\nSCRIPT_START script_08001100\n000| \t.2byte 0x0000\t\n002| >SCRIPT_END\t\n'
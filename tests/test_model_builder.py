@@ -0,0 +1,92 @@
+from PySide6.QtCore import QEventLoop, QObject, QThread, QTimer
+from tlh.hexviewer.display_byte import DisplayByte
+from tlh.hexviewer.model_builder import LineModel, LineModelBuilder
+
+
+class FakeController:
+    def __init__(self) -> None:
+        self.generation = 0
+
+    def build_line(self, virtual_address: int) -> LineModel:
+        return LineModel('%08X' % virtual_address, [DisplayByte('%02X' % (virtual_address & 0xff), None, False, [], [], [])])
+
+
+class Receiver(QObject):
+    def __init__(self) -> None:
+        super().__init__()
+        self.results = []
+        self.failed = []
+
+    def slot_lines_built(self, controller, generation, lines) -> None:
+        self.results.append((controller, generation, lines))
+
+    def slot_lines_failed(self, controller, generation, addresses) -> None:
+        self.failed.append((generation, addresses))
+
+
+def wait_until(condition) -> None:
+    loop = QEventLoop()
+    timer = QTimer()
+    timer.timeout.connect(lambda: condition() and loop.quit())
+    timer.start(5)
+    QTimer.singleShot(2000, loop.quit)
+    loop.exec()
+    timer.stop()
+
+
+def test_build_lines(app):
+    thread = QThread()
+    builder = LineModelBuilder()
+    builder.moveToThread(thread)
+    receiver = Receiver()
+    builder.signal_lines_built.connect(receiver.slot_lines_built)
+    thread.start()
+    try:
+        controller = FakeController()
+        addresses = list(range(0, 40 * 16, 16))
+        builder.request(controller, 0, addresses)
+        wait_until(lambda: sum(len(lines) for (_, _, lines) in receiver.results) == 40)
+        assert all(generation == 0 for (_, generation, _) in receiver.results)
+        assert all(len(lines) <= LineModelBuilder.CHUNK_SIZE for (_, _, lines) in receiver.results)
+        built = {}
+        for (_, _, lines) in receiver.results:
+            built.update(lines)
+        assert sorted(built) == addresses
+        assert built[32].label == '00000020'
+
+        # Lines requested for an outdated generation are not built
+        receiver.results.clear()
+        controller.generation = 1
+        builder.request(controller, 0, addresses)
+        builder.request(controller, 1, [16])
+        wait_until(lambda: len(receiver.results) > 0)
+        assert [(generation, list(lines)) for (_, generation, lines) in receiver.results] == [(1, [16])]
+    finally:
+        thread.quit()
+        thread.wait()
+
+
+class FailingController(FakeController):
+    def build_line(self, virtual_address: int) -> LineModel:
+        if virtual_address == 32:
+            raise ValueError('The relations changed')
+        return super().build_line(virtual_address)
+
+
+def test_failed_lines_are_reported(app):
+    thread = QThread()
+    builder = LineModelBuilder()
+    builder.moveToThread(thread)
+    receiver = Receiver()
+    builder.signal_lines_built.connect(receiver.slot_lines_built)
+    builder.signal_lines_failed.connect(receiver.slot_lines_failed)
+    thread.start()
+    try:
+        builder.request(FailingController(), 0, [0, 16, 32, 48])
+        wait_until(lambda: len(receiver.failed) > 0)
+        assert [list(lines) for (_, _, lines) in receiver.results] == [[0, 16]]
+        # The line that failed and the ones after it can be requested again
+        assert receiver.failed == [(0, [32, 48])]
+    finally:
+        thread.quit()
+        thread.wait()
@@ -0,0 +1,48 @@
+import ast
+import os
+import sys
+import pytest
+from tlh import settings
+from tlh.plugin import manifest
+
+
+def get_plugin_class_attributes(pkg_name: str):
+    with open(os.path.join(manifest.plugin_folder, pkg_name, manifest.main_module + '.py')) as file:
+        tree = ast.parse(file.read())
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name.endswith('Plugin'):
+            attributes = {'class': node.name}
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Name) and statement.targets[0].id in ['name', 'description', 'hidden']:
+                    attributes[statement.targets[0].id] = ast.literal_eval(statement.value)
+            return attributes
+
+
+def get_plugin_folders():
+    return [pkg_name for pkg_name in sorted(os.listdir(manifest.plugin_folder))
+            if os.path.isfile(os.path.join(manifest.plugin_folder, pkg_name, manifest.main_module + '.py'))]
+
+
+def test_manifests_match_plugin_classes():
+    for pkg_name in get_plugin_folders():
+        plugin_manifest = manifest.read_manifest(pkg_name)
+        assert plugin_manifest is not None, pkg_name
+        attributes = get_plugin_class_attributes(pkg_name)
+        assert plugin_manifest['class'] == attributes['class']
+        assert plugin_manifest['name'] == attributes['name']
+        assert plugin_manifest['description'] == attributes['description']
+        assert plugin_manifest.get('hidden', False) == attributes.get('hidden', False)
+
+
+def test_disabled_plugins_are_not_imported(monkeypatch):
+    # Imports the hex viewer, which needs the compiled ui files
+    pytest.importorskip('tlh.ui.ui_edit_pointer_dialog')
+    from tlh.plugin import loader
+    monkeypatch.setattr(settings, 'is_plugin_enabled', lambda name: False)
+    loader.load_plugins(None)
+
+    visible = [pkg_name for pkg_name in get_plugin_folders() if not manifest.read_manifest(pkg_name).get('hidden', False)]
+    assert [plugin.pkg_name for plugin in loader.get_plugins()] == visible
+    for plugin in loader.get_plugins():
+        assert plugin.mod is None
+        assert 'plugins.' + plugin.pkg_name + '.' + loader.main_module not in sys.modules
@@ -0,0 +1,62 @@
+import os
+import pytest
+from sortedcontainers import SortedKeyList
+from plugins.pointer_extractor.extractor import ExtractionError, Incbin, Insertion, MissingLabel, apply_insertions, assign_pointers_to_incbins, get_insertions, incbin_line, insert_into_incbins, resolve_targets
+from tlh.const import RomVariant
+from tlh.data.pointer import Pointer
+from tlh.data.symbols import Symbol, SymbolList
+
+
+def test_assign_pointers_to_incbins() -> None:
+    incbins = [Incbin(0x100, 0x10, 'a.s'), Incbin(0x200, 0x100, 'b.s'), Incbin(0x280, 0x10, 'c.s'), Incbin(0x400, 0x10, 'a.s')]
+    pointers = [Pointer(RomVariant.USA, address, 0x08000000) for address in [0x50, 0x104, 0x200, 0x284, 0x2f0, 0x404, 0x500]]
+    to_extract = assign_pointers_to_incbins(pointers, incbins)
+    assert {file: [pointer.address for pointer in pointers] for (file, pointers) in to_extract.items()} == {'a.s': [0x104, 0x404], 'b.s': [0x200, 0x2f0]}
+
+
+def test_resolve_targets() -> None:
+    symbols = SymbolList(SortedKeyList([Symbol(0x10, 'a'), Symbol(0x20, 'b')], key=lambda symbol: symbol.address))
+    targets = resolve_targets([0x25, 0x5, 0x10, 0x21], symbols)
+    assert {address: (symbol.name, offset) for (address, (symbol, offset)) in targets.items()} == {0x10: ('a', 0), 0x21: ('b', 1), 0x25: ('b', 5)}
+
+
+def test_insert_into_incbins() -> None:
+    lines = ['label::\n', incbin_line(0x100, 0x20), '\t.4byte 0\n', incbin_line(0x200, 0x10)]
+    insertions = [Insertion(0x50, 0, 'skipped\n'), Insertion(0x100, 4, 'first\n'), Insertion(0x110, 0, 'label\n'), Insertion(0x110, 4, 'second\n'), Insertion(0x20c, 4, 'last\n'), Insertion(0x300, 4, 'after\n')]
+    (output_lines, skipped) = insert_into_incbins(lines, insertions)
+    assert output_lines == ['label::\n', 'first\n', incbin_line(0x104, 0xc), 'label\n', 'second\n', incbin_line(0x114, 0xc), '\t.4byte 0\n', incbin_line(0x200, 0xc), 'last\n']
+    assert [insertion.line for insertion in skipped] == ['skipped\n', 'after\n']
+
+    with pytest.raises(ExtractionError):
+        insert_into_incbins(lines, [Insertion(0x11e, 4, 'crossing\n')])
+
+
+def test_insert_overlapping_into_incbins() -> None:
+    lines = [incbin_line(0x100, 0x20)]
+    insertions = [Insertion(0x104, 4, 'first\n'), Insertion(0x106, 0, 'label\n'), Insertion(0x106, 4, 'overlapping\n'), Insertion(0x108, 4, 'second\n')]
+    (output_lines, skipped) = insert_into_incbins(lines, insertions)
+    assert output_lines == [incbin_line(0x100, 0x4), 'first\n', 'second\n', incbin_line(0x10c, 0x14)]
+    assert [insertion.line for insertion in skipped] == ['label\n', 'overlapping\n']
+
+
+def test_apply_insertions(tmp_path) -> None:
+    path = os.path.join(str(tmp_path), 'data.s')
+    with open(path, 'w') as file:
+        file.writelines(['data::\n', incbin_line(0x100, 0x20)])
+    symbols = SymbolList(SortedKeyList([Symbol(0x100, 'data', 'data.o')], key=lambda symbol: symbol.address))
+    pointers = [Pointer(RomVariant.USA, 0x108, 0x08000100), Pointer(RomVariant.USA, 0x110, 0x08000118)]
+    targets = resolve_targets([0x100, 0x118], symbols)
+    insertions = get_insertions({path: [MissingLabel(0x118, 'data', 0x18, 'data.o')]}, {path: pointers}, targets)
+
+    (diff, skipped) = apply_insertions(insertions, dry_run=True)
+    assert '+\t.4byte data\n' in diff
+    assert '+gUnk_08000118:: @ 08000118\n' in diff
+    assert skipped == []
+    with open(path, 'r') as file:
+        assert file.readlines() == ['data::\n', incbin_line(0x100, 0x20)]
+
+    apply_insertions(insertions)
+    with open(path, 'r') as file:
+        # The pointer to the missing label is extracted once the label is known
+        assert file.readlines() == ['data::\n', incbin_line(0x100, 0x8), '\t.4byte data\n', incbin_line(0x10c, 0xc), 'gUnk_08000118:: @ 08000118\n', incbin_line(0x118, 0x8)]
+    assert os.listdir(str(tmp_path)) == ['data.s']
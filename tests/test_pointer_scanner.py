@@ -0,0 +1,57 @@
+import numpy as np
+from plugins.pointer_scanner.scanner import MAX_CONFIDENCE, AddressMapper, cross_check, find_candidates, get_new_pointers
+from tlh.const import RomVariant
+from tlh.data.constraints import Constraint, ConstraintManager
+
+
+def write_word(data: bytearray, address: int, value: int) -> None:
+    data[address:address + 4] = value.to_bytes(4, 'little')
+
+
+def test_address_mapper() -> None:
+    manager = ConstraintManager({RomVariant.USA, RomVariant.EU})
+    manager.add_constraint(Constraint(RomVariant.USA, 0x100, RomVariant.EU, 0x120))
+    manager.add_constraint(Constraint(RomVariant.USA, 0x300, RomVariant.EU, 0x310))
+    manager.rebuild_relations()
+    mapper = AddressMapper(manager, [RomVariant.USA, RomVariant.EU])
+    addresses = np.arange(0, 0x400, 4)
+    for variant in [RomVariant.USA, RomVariant.EU]:
+        assert list(mapper.to_virtual(variant, addresses)) == [manager.to_virtual(variant, int(address)) for address in addresses]
+
+
+def test_find_candidates() -> None:
+    data = bytearray(0x100)
+    write_word(data, 0x10, 0x08000020)
+    write_word(data, 0x14, 0x08000041)
+    write_word(data, 0x40, 0x08000022)
+    # Outside of the rom
+    write_word(data, 0x50, 0x08000100)
+    write_word(data, 0x60, 0x02000000)
+    result = find_candidates(bytes(data))
+    assert list(result.addresses) == [0x10, 0x14, 0x40]
+    assert list(result.confidences) == [3, 3, 1]
+
+
+def test_cross_check() -> None:
+    # The EU rom has 0x10 more bytes at 0x30
+    usa = bytearray(0x100)
+    eu = bytearray(0x110)
+    for (address, target) in [(0x10, 0x20), (0x14, 0x80), (0x18, 0x90)]:
+        write_word(usa, address, 0x08000000 + target)
+        write_word(eu, address, 0x08000000 + (target + 0x10 if target >= 0x30 else target))
+    # Points to a different place in EU
+    write_word(eu, 0x18, 0x08000040)
+    # Only in one rom
+    write_word(usa, 0x50, 0x08000060)
+
+    manager = ConstraintManager({RomVariant.USA, RomVariant.EU})
+    manager.add_constraint(Constraint(RomVariant.USA, 0x30, RomVariant.EU, 0x40))
+    manager.rebuild_relations()
+    results = {RomVariant.USA: find_candidates(bytes(usa)), RomVariant.EU: find_candidates(bytes(eu))}
+    cross_check(results, AddressMapper(manager, [RomVariant.USA, RomVariant.EU]))
+
+    usa_result = results[RomVariant.USA]
+    assert dict(zip(usa_result.addresses, usa_result.confidences)) == {0x10: MAX_CONFIDENCE, 0x14: MAX_CONFIDENCE, 0x18: MAX_CONFIDENCE - 1, 0x50: 2}
+
+    pointers = get_new_pointers(results, {RomVariant.USA: [0x10]}, MAX_CONFIDENCE, 'author')
+    assert [(pointer.rom_variant, pointer.address, pointer.points_to) for pointer in pointers] == [(RomVariant.EU, 0x10, 0x08000020), (RomVariant.EU, 0x14, 0x08000090), (RomVariant.USA, 0x14, 0x08000080)]
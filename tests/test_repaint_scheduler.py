@@ -0,0 +1,39 @@
+from PySide6.QtCore import QEventLoop, QTimer
+from tlh.hexviewer.repaint_scheduler import RepaintScheduler
+
+
+class FakeController:
+    def __init__(self) -> None:
+        self.rebuilds = 0
+
+    def update_hex_area(self) -> None:
+        self.rebuilds += 1
+
+
+def wait(app, milliseconds: int) -> None:
+    loop = QEventLoop()
+    QTimer.singleShot(milliseconds, loop.quit)
+    loop.exec()
+
+
+def test_coalesce(app):
+    scheduler = RepaintScheduler()
+    controllers = [FakeController() for _ in range(4)]
+    # Several wheel events within one frame
+    for _ in range(5):
+        for controller in controllers:
+            scheduler.schedule(controller)
+    assert [controller.rebuilds for controller in controllers] == [0, 0, 0, 0]
+
+    wait(app, 4 * RepaintScheduler.FRAME_INTERVAL)
+    assert [controller.rebuilds for controller in controllers] == [1, 1, 1, 1]
+    assert scheduler.schedule_count == 20
+    assert scheduler.rebuild_count == 4
+    assert scheduler.get_rebuilds_per_second() == 4
+
+    scheduler.schedule(controllers[0])
+    scheduler.schedule(controllers[1])
+    scheduler.cancel(controllers[1])
+    scheduler.flush()
+    assert [controller.rebuilds for controller in controllers] == [2, 1, 1, 1]
+    assert scheduler.rebuild_count == 5
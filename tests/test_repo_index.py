@@ -0,0 +1,114 @@
+import os
+from tlh.data.repo_index import RepoIndex
+
+
+def write_file(path, text) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+def touch(path, mtime_ns) -> None:
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def create_repo(repo) -> None:
+    write_file(os.path.join(repo, 'src', 'enemy', 'octorok.c'),
+        '#include "global.h"\n\n'
+        'NONMATCH("asm/non_matching/octorok/Octorok_Init.inc", void Octorok_Init(Entity* this)) {\n}\nEND_NONMATCH\n\n'
+        'ASM_FUNC("asm/non_matching/octorok/Octorok_Action.inc", static void Octorok_Action(Entity* this))\n')
+    write_file(os.path.join(repo, 'src', 'player.c'), 'void Player(void) {\n}\n')
+    write_file(os.path.join(repo, 'asm', 'non_matching', 'octorok', 'Octorok_Init.inc'), '\tpush {lr}\n')
+    write_file(os.path.join(repo, 'asm', 'non_matching', 'octorok', 'Octorok_Action.inc'), '\tpush {lr}\n')
+    write_file(os.path.join(repo, 'data', 'data_080B0000.s'),
+        '\t.section .rodata\n'
+        '\t.incbin "baserom.gba", 0x0B0000, 0x00010\n'
+        '\t.incbin "baserom.gba", 0x0B0020, 0x00008\n')
+    write_file(os.path.join(repo, 'tmc.map'),
+        ' .text          0x08000000      0x100 build/USA/src/enemy/octorok.o\n'
+        '                0x08000000                Octorok_Init\n'
+        '                0x08000040                Octorok_Action\n'
+        ' .text          0x08000100       0x20 build/USA/src/player.o\n'
+        '                0x08000100                Player\n')
+
+
+def test_queries(tmp_path) -> None:
+    repo = str(tmp_path)
+    create_repo(repo)
+    index = RepoIndex(repo)
+
+    assert index.get_nonmatching_funcs() == [(os.path.join('enemy', 'octorok.c'), 'Octorok_Init')]
+    assert index.get_asm_funcs() == [(os.path.join('enemy', 'octorok.c'), 'Octorok_Action')]
+    assert sorted(index.get_included_asm_files()) == [
+        os.path.join(repo, 'asm/non_matching/octorok/Octorok_Action.inc'),
+        os.path.join(repo, 'asm/non_matching/octorok/Octorok_Init.inc'),
+    ]
+    assert index.get_finished_files() == ['player.c']
+    assert index.find_inc_file('Octorok_Init') == os.path.join(repo, 'asm', 'non_matching', 'octorok', 'Octorok_Init.inc')
+    assert index.find_inc_file('Player') is None
+    assert index.find_source_file('Octorok_Action') == 'build/USA/src/enemy/octorok.c'
+    assert index.find_source_file('Player') == 'build/USA/src/player.c'
+    assert index.find_source_file('Unknown') is None
+
+    incbins = index.get_incbins()
+    assert len(incbins) == 2
+    (interval,) = incbins.at(0x0B0005)
+    assert interval.data == os.path.join(repo, 'data', 'data_080B0000.s')
+    assert len(incbins.at(0x0B0010)) == 0
+
+    assert sorted(index.list_files('data', ['.s'])) == [os.path.join(repo, 'data', 'data_080B0000.s')]
+    assert len(index.list_files('asm')) == 2
+
+
+def test_incremental_update(tmp_path) -> None:
+    repo = str(tmp_path)
+    create_repo(repo)
+    index = RepoIndex(repo)
+    assert index.update() == 6
+    assert index.update() == 0
+
+    # Matching a function removes the ASM_FUNC and its .inc file
+    c_file = os.path.join(repo, 'src', 'enemy', 'octorok.c')
+    with open(c_file, 'r') as file:
+        data = file.read()
+    write_file(c_file, data.replace('ASM_FUNC("asm/non_matching/octorok/Octorok_Action.inc", static void Octorok_Action(Entity* this))', 'static void Octorok_Action(Entity* this) {\n}'))
+    touch(c_file, os.stat(c_file).st_mtime_ns + 1000000000)
+    os.remove(os.path.join(repo, 'asm', 'non_matching', 'octorok', 'Octorok_Action.inc'))
+
+    assert index.update() == 2
+    assert index.get_asm_funcs() == []
+    assert sorted(index.get_finished_files()) == [os.path.join('enemy', 'octorok.c'), 'player.c']
+    assert index.find_inc_file('Octorok_Action') is None
+
+    # Only the modified file is parsed again
+    s_file = os.path.join(repo, 'data', 'data_080B0000.s')
+    write_file(s_file, '\t.incbin "baserom.gba", 0x0B0000, 0x00030\n')
+    touch(s_file, os.stat(s_file).st_mtime_ns + 1000000000)
+    assert index.update() == 1
+    assert len(index.get_incbins()) == 1
+    assert len(index.get_incbins().at(0x0B0020)) == 1
+
+
+def test_invalidate(tmp_path) -> None:
+    repo = str(tmp_path)
+    create_repo(repo)
+    write_file(os.path.join(repo, 'build', 'USA', 'src', 'player.c'), 'NONMATCH("asm/non_matching/Player.inc", void Player(void)) {\n}\n')
+    index = RepoIndex(repo)
+    assert index.get_nonmatching_funcs() == [(os.path.join('enemy', 'octorok.c'), 'Octorok_Init')]
+    # The build folder is not indexed
+    assert not any(path.startswith(os.path.join(repo, 'build')) for path in index.mtimes)
+
+    # Changes are only read after the file was invalidated
+    c_file = os.path.join(repo, 'src', 'player.c')
+    write_file(c_file, 'NONMATCH("asm/non_matching/Player.inc", void Player(void)) {\n}\n')
+    touch(c_file, os.stat(c_file).st_mtime_ns + 1000000000)
+    assert len(index.get_nonmatching_funcs()) == 1
+    generation = index.generation
+    index.invalidate(c_file)
+    assert sorted(index.get_nonmatching_funcs()) == [(os.path.join('enemy', 'octorok.c'), 'Octorok_Init'), ('player.c', 'Player')]
+    assert index.generation == generation + 1
+
+    os.remove(os.path.join(repo, 'data', 'data_080B0000.s'))
+    index.invalidate(os.path.join(repo, 'data', 'data_080B0000.s'))
+    assert len(index.get_incbins()) == 0
+    assert index.list_files('data') == []
@@ -0,0 +1,63 @@
+import re
+import numpy as np
+import pytest
+from tlh.data import rom_index
+from tlh.data.rom_index import RomIndex, SearchError, build_positions, load_or_build_index, parse_hex_pattern, parse_string_pattern, parse_value_pattern
+
+
+def create_data() -> bytes:
+    rng = np.random.default_rng(0)
+    # Few different bytes, so that short patterns occur often
+    data = rng.integers(0, 4, 1 << 16, dtype=np.uint8)
+    data[100:2000] = 0xff
+    return data.tobytes() + b'Link\x00Zelda\x00' + (0x08123456).to_bytes(4, 'little')
+
+
+def find_naive(data: bytes, pattern) -> list:
+    regex = b''.join(re.escape(bytes([byte])) if fixed else b'.' for (byte, fixed) in zip(pattern.data, pattern.mask))
+    return [match.start() for match in re.finditer(b'(?=' + regex + b')', data, re.S)]
+
+
+def test_parse_patterns() -> None:
+    pattern = parse_hex_pattern('12 34 ?? 5a')
+    assert (pattern.data, pattern.mask) == (b'\x12\x34\x00\x5a', [True, True, False, True])
+    assert parse_hex_pattern('1234??5a') == pattern
+    assert parse_value_pattern('0x08123456').data == b'\x56\x34\x12\x08'
+    assert parse_string_pattern('Link').data == b'Link'
+    for text in ['123', '?? ??', 'xy']:
+        with pytest.raises(SearchError):
+            parse_hex_pattern(text)
+    with pytest.raises(SearchError):
+        parse_value_pattern('0x100000000')
+
+
+@pytest.mark.parametrize('text', ['00 01 02 03', '03 ?? ?? 00 01', '02 ?? 01', 'ff ff', 'ff', '01 02 03 00 01 02 03 00', 'ff 00 ?? ?? ?? ?? 02'])
+def test_search_matches_naive_search(text, monkeypatch) -> None:
+    data = create_data()
+    index = RomIndex(data, build_positions(data))
+    pattern = parse_hex_pattern(text)
+    assert index.search(pattern, 100) == find_naive(data, pattern)[:100]
+    # Scanning the rom gives the same results
+    monkeypatch.setattr(rom_index, 'SORT_LIMIT', 0)
+    assert index.search(pattern, 100) == find_naive(data, pattern)[:100]
+
+
+def test_search_strings_and_values() -> None:
+    data = create_data()
+    index = RomIndex(data, build_positions(data))
+    assert index.search(parse_string_pattern('Zelda')) == [len(data) - 10]
+    assert index.search(parse_value_pattern('0x08123456')) == [len(data) - 4]
+    # Does not match beyond the end of the data
+    assert index.search(parse_hex_pattern('56 34 12 08 00')) == []
+
+
+def test_index_is_stored(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(rom_index, 'INDEX_FOLDER', str(tmp_path))
+    data = create_data()
+    built = load_or_build_index(data)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    monkeypatch.setattr(rom_index, 'build_positions', lambda data: pytest.fail('The index should be loaded'))
+    loaded = load_or_build_index(data)
+    assert isinstance(loaded.positions, np.memmap)
+    assert np.array_equal(loaded.positions, built.positions)
@@ -0,0 +1,67 @@
+import zlib
+import numpy as np
+from plugins.entity_explorer_bridge.save_state_stream import SaveStateStream, apply_delta, get_save_state_format
+
+
+def create_state(seed: int, size: int = 0x10000) -> bytes:
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def modify(state: bytes, offset: int, value: bytes) -> bytes:
+    return state[:offset] + value + state[offset + len(value):]
+
+
+def test_get_save_state_format() -> None:
+    assert get_save_state_format('/saves/tmc.ss1') == 'mgba'
+    assert get_save_state_format('/saves/tmc.State') == 'bizhawk'
+
+
+def test_deltas() -> None:
+    stream = SaveStateStream()
+    first = create_state(0)
+    (event, payload) = stream.encode('mgba', first)
+    assert event == 'save_state_full'
+    assert payload['sequence'] == 1
+    assert zlib.decompress(payload['data']) == first
+
+    second = modify(first, 0x100, b'\x01\x02\x03\x04')
+    (event, payload) = stream.encode('mgba', second)
+    assert event == 'save_state_delta'
+    assert payload['sequence'] == 2
+    assert payload['base'] == 1
+    assert len(payload['data']) < len(first) // 100
+    assert apply_delta(first, payload) == second
+
+    # Unchanged states are not sent again
+    assert stream.encode('mgba', second) is None
+
+
+def test_full_states() -> None:
+    stream = SaveStateStream()
+    first = create_state(0)
+    stream.encode('mgba', first)
+
+    # Different size or format
+    assert stream.encode('mgba', first + b'\x00')[0] == 'save_state_full'
+    assert stream.encode('bizhawk', first + b'\x00')[0] == 'save_state_full'
+    # Completely different state where a delta would not be smaller
+    assert stream.encode('bizhawk', create_state(1, len(first) + 1))[0] == 'save_state_full'
+
+    stream.resync()
+    (event, payload) = stream.encode('bizhawk', first)
+    assert event == 'save_state_full'
+    assert payload['sequence'] == 5
+
+
+def test_encode_last_state() -> None:
+    stream = SaveStateStream()
+    assert stream.encode_last_state() is None
+    state = create_state(0)
+    stream.encode('mgba', state)
+    (event, payload) = stream.encode_last_state()
+    assert event == 'save_state_full'
+    assert zlib.decompress(payload['data']) == state
+    # Deltas continue from the resent state
+    (event, payload) = stream.encode('mgba', modify(state, 0, b'\xff'))
+    assert event == 'save_state_delta'
+    assert payload['base'] == 2
@@ -0,0 +1,45 @@
+import os
+import pytest
+from PySide6.QtCore import QSettings
+from tlh import settings
+
+
+@pytest.fixture
+def temporary_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'settings', QSettings(os.path.join(tmp_path, 'settings.ini'), QSettings.IniFormat))
+    settings.invalidate_cache()
+    yield settings.settings
+    settings.invalidate_cache()
+
+
+def test_cached_values(temporary_settings):
+    assert settings.is_auto_save() == True
+    assert settings.get_bytes_per_line() == 16
+
+    # The QSettings are only read once
+    temporary_settings.setValue('auto_save', False)
+    temporary_settings.setValue('bytes_per_line', '32')
+    assert settings.is_auto_save() == True
+    settings.invalidate_cache()
+    assert settings.is_auto_save() == False
+    assert settings.get_bytes_per_line() == 32
+
+
+def test_change_notifications(temporary_settings):
+    changed = []
+    slot = changed.append
+    settings.notifier.signal_changed.connect(slot)
+    try:
+        settings.is_highlight_8_bytes()
+        settings.set_highlight_8_bytes(False)
+        settings.set_highlight_8_bytes(True)
+        settings.set_plugin_enabled('test:TestPlugin', True)
+        assert changed == ['highlight_8_bytes', 'plugins/test:TestPlugin']
+        assert settings.is_highlight_8_bytes() == True
+        assert settings.is_plugin_enabled('test:TestPlugin') == True
+
+        settings.invalidate_cache()
+        assert temporary_settings.value('plugins/test:TestPlugin') in [True, 'true']
+        assert settings.is_plugin_enabled('test:TestPlugin') == True
+    finally:
+        settings.notifier.signal_changed.disconnect(slot)
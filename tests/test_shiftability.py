@@ -0,0 +1,71 @@
+import numpy as np
+from sortedcontainers import SortedKeyList
+from plugins.shiftability_tester.shiftability import Shift, find_mismatches, group_by_symbol, parse_shifts, shift_addresses
+from tlh.data.symbols import Symbol, SymbolList
+
+
+def pointer(address: int) -> bytes:
+    return (0x08000000 + address).to_bytes(4, 'little')
+
+
+def build_rom(shifts, pointer_targets, size=0x100) -> bytes:
+    '''
+    Builds a rom with random data and pointers at 0x10, 0x20, ... that point to the targets in the original rom.
+    '''
+    rng = np.random.default_rng(0)
+    data = bytearray(rng.integers(0, 256, size, dtype=np.uint8).tobytes())
+    for (i, target) in enumerate(pointer_targets):
+        address = 0x10 * (i + 1)
+        target = int(shift_addresses(np.array([target]), shifts)[0])
+        data[address:address + 4] = pointer(target)
+    # Insert the space from the back, so that the locations stay valid
+    for shift in reversed(shifts):
+        data[shift.location:shift.location] = b'\x00' * shift.length
+    return bytes(data)
+
+
+def test_parse_shifts() -> None:
+    assert parse_shifts('0x2000:16, 0x108:0x10000') == [Shift(0x108, 0x10000), Shift(0x2000, 16)]
+    assert parse_shifts('') == []
+
+
+def test_shift_addresses() -> None:
+    shifts = [Shift(0x10, 4), Shift(0x20, 8)]
+    assert list(shift_addresses(np.array([0, 0xf, 0x10, 0x1f, 0x20, 0x30]), shifts)) == [0, 0xf, 0x14, 0x23, 0x2c, 0x3c]
+
+
+def test_find_mismatches() -> None:
+    shifts = [Shift(0x18, 4), Shift(0x44, 0x10)]
+    targets = [0x00, 0x30, 0x80]
+    original = build_rom([], targets)
+    shifted = build_rom(shifts, targets)
+    pointers = [0x10, 0x20, 0x30]
+    assert find_mismatches(original, shifted, shifts, pointers, 0x100) == []
+
+    broken = bytearray(shifted)
+    # A byte outside of a pointer
+    broken[0x50 + 0x14] ^= 0xff
+    # A pointer that was not shifted
+    broken[0x20 + 4:0x20 + 8] = pointer(0x30)
+    mismatches = find_mismatches(original, bytes(broken), shifts, pointers, 0x100)
+    assert [(mismatch.address, mismatch.kind) for mismatch in mismatches] == [(0x20, 'missing_shift'), (0x50, 'byte')]
+    assert mismatches[0].expected == 0x08000034
+
+    # The space needs to be inserted at the correct location
+    mismatches = find_mismatches(original, shifted, [Shift(0x14, 4), Shift(0x44, 0x10)], pointers, 0x100)
+    assert len(mismatches) > 0
+
+
+def test_group_by_symbol() -> None:
+    shifts = [Shift(0x18, 4)]
+    original = build_rom([], [0x30])
+    shifted = bytearray(build_rom(shifts, [0x30]))
+    shifted[0x04] ^= 0xff
+    shifted[0x40 + 4] ^= 0xff
+    shifted[0x48 + 4] ^= 0xff
+    mismatches = find_mismatches(original, bytes(shifted), shifts, [0x10], 0x100)
+
+    symbols = SymbolList(SortedKeyList([Symbol(0x08, 'a', 'a.c', 0x38), Symbol(0x40, 'b', 'b.c', 0x10)], key=lambda symbol: symbol.address))
+    groups = group_by_symbol(mismatches, symbols)
+    assert {name: [mismatch.address for mismatch in group] for (name, group) in groups.items()} == {'unknown': [0x04], 'b': [0x40, 0x48]}
+    assert list(group_by_symbol(mismatches, None)) == ['unknown']
@@ -0,0 +1,72 @@
+from plugins.data_extractor.structs import get_dependencies, merge_results, parse_all_segments, parse_segments, split_segments
+
+
+PREPROCESSED = '''# 1 "tmp/test.c"
+# 1 "<built-in>"
+# 1 "tmp/test.c"
+# 1 "include/global.h" 1
+typedef unsigned char u8;
+typedef unsigned short u16;
+
+# 2 "tmp/test.c" 2
+# 1 "include/entity.h" 1
+# 1 "include/global.h" 1
+# 2 "include/entity.h" 2
+typedef struct {
+    u8 x;
+    u16 y;
+} Position;
+
+struct Entity {
+    Position pos;
+    u8 flags;
+};
+# 3 "tmp/test.c" 2
+# 1 "include/room.h" 1
+typedef struct {
+    u8 width __attribute__((packed));
+    struct Entity* entities;
+} Room;
+# 4 "tmp/test.c" 2
+'''
+
+
+def to_json(results):
+    return {name: struct.to_json_data() for (name, struct) in merge_results(results).items() if not name.startswith('anon_')}
+
+
+def test_split_segments():
+    segments = split_segments(PREPROCESSED)
+    assert [segment.file for segment in segments] == ['include/global.h', 'include/entity.h', 'include/room.h']
+    assert (segments[1].start_line, segments[1].end_line) == (2, 10)
+    assert get_dependencies(PREPROCESSED) == {'tmp/test.c', 'include/global.h', 'include/entity.h', 'include/room.h'}
+
+
+def test_incremental_parse_matches_full_parse():
+    segments = split_segments(PREPROCESSED)
+    full = parse_all_segments(segments)
+    assert set(full[1].structs) == {'anon_struct_include/entity.h:2:16', 'Entity'}
+
+    incremental = parse_segments(segments, {})
+    assert to_json([incremental[segment.hash] for segment in segments]) == to_json(full)
+    assert to_json(full)['Room']['members']['entities'] == 'Entity*'
+
+
+def test_only_changed_segments_are_parsed():
+    segments = split_segments(PREPROCESSED)
+    cached = parse_segments(segments, {})
+
+    changed = split_segments(PREPROCESSED.replace('u8 width', 'u16 width'))
+    results = parse_segments(changed, cached)
+    assert results[changed[0].hash] is cached[segments[0].hash]
+    assert results[changed[1].hash] is cached[segments[1].hash]
+    assert changed[2].hash not in cached
+    assert to_json([results[segment.hash] for segment in changed])['Room']['members']['width'] == 'u16'
+
+
+def test_merge_does_not_modify_results():
+    segments = split_segments(PREPROCESSED)
+    results = parse_all_segments(segments)
+    to_json(results)
+    assert 'Room' not in results[2].structs
+    assert all(struct.name.startswith('anon_') or struct.name == 'Entity' for result in results for struct in result.structs.values())
@@ -0,0 +1,26 @@
+from plugins.tilemap_viewer.cache import LRUCache
+
+
+def test_lru_cache():
+    cache: LRUCache[int] = LRUCache(2)
+    created = []
+
+    def create(value: int):
+        def inner():
+            created.append(value)
+            return value
+        return inner
+
+    assert cache.get('a', create(1)) == 1
+    assert cache.get('b', create(2)) == 2
+    assert cache.get('a', create(3)) == 1
+    assert created == [1, 2]
+
+    # b is the least recently used entry now
+    assert cache.get('c', create(4)) == 4
+    assert 'b' not in cache
+    assert 'a' in cache
+    assert len(cache) == 2
+
+    assert cache.get('b', create(5)) == 5
+    assert created == [1, 2, 4, 5]
@@ -0,0 +1,109 @@
+import json
+import os
+import numpy as np
+import PIL.Image
+from plugins.tilemap_viewer import prerender
+from plugins.tilemap_viewer.map_loader import MapLoader, get_area_path, get_room_path
+from plugins.tilemap_viewer.prerender import RenderCache, init_worker, list_maps, prerender_maps
+
+
+def write_json(path, data) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+
+def create_repo(repo) -> None:
+    assets = os.path.join(repo, 'build', 'USA', 'assets')
+    os.makedirs(os.path.join(repo, 'data', 'gfx'))
+    with open(os.path.join(repo, 'data', 'gfx', 'palette_groups.s'), 'w') as file:
+        file.write('gPaletteGroups::\n')
+        for i in range(12):
+            file.write(f'\t.4byte gPaletteGroup_{i}\n')
+        for i in range(12):
+            file.write(f'gPaletteGroup_{i}::\n\tpalette_set palette=pal_{i}, offset={i}, count=1\n')
+    os.makedirs(os.path.join(assets, 'palettes'))
+    for i in range(12):
+        with open(os.path.join(assets, 'palettes', f'gPalette_{i}.pal'), 'w') as file:
+            file.write('JASC-PAL\n0100\n16\n' + ''.join(f'{i} {j} 0\n' for j in range(16)))
+
+    area_path = os.path.join(assets, get_area_path(0))
+    write_json(os.path.join(area_path, 'config.json'), {'tilesets': [0], 'metatileset': 0})
+    tileset_path = os.path.join(area_path, 'tilesets', '0')
+    write_json(os.path.join(tileset_path, 'config.json'), {'palette_set': 1, 'tiles': [{'src': 'tiles', 'dest': '0x6000000'}]})
+    PIL.Image.fromarray(np.repeat(np.arange(16, dtype=np.uint8) * 16, 8 * 8).reshape(16 * 8, 8), 'L').save(os.path.join(tileset_path, 'tiles.png'))
+    metatileset_path = os.path.join(area_path, 'metatileset')
+    write_json(os.path.join(metatileset_path, 'config.json'), {'tiles_bottom': {'src': 'bottom'}})
+    np.array([0x1000, 0x1001, 0x1002, 0x1003, 0x1004, 0x1005, 0x1006, 0x1007], dtype='<u2').tofile(os.path.join(metatileset_path, 'bottom.bin'))
+
+    room_path = os.path.join(assets, get_room_path(0, 0))
+    write_json(os.path.join(room_path, 'config.json'), {'tileset': 0, 'width': 48, 'maps': [{'type': 'map_bottom', 'src': 'map'}]})
+    np.array([0, 1, 1, 0, 0, 1], dtype='<u2').tofile(os.path.join(room_path, 'map.bin'))
+
+
+def test_load_map(tmp_path):
+    repo = str(tmp_path / 'repo')
+    create_repo(repo)
+    loader = MapLoader(repo)
+    assert loader.get_map_types(0, 0) == ['map_bottom']
+    room_map = loader.load_map(0, 0, 'map_bottom')
+    assert room_map.errors == []
+    assert room_map.width == 3
+    image = room_map.render()
+    assert image.shape == (32, 48, 4)
+    # Tile 0 is stored as gray level 0, which is color 15 of palette 1
+    assert tuple(image[0, 0]) == (1, 15, 0, 255)
+    assert tuple(image[0, 16]) == (1, 11, 0, 255)
+    assert len(room_map.sources) == 10
+
+    # Loading the map again uses the cached metatileset
+    assert loader.load_map(0, 0, 'map_bottom').metatileset is room_map.metatileset
+
+
+def test_load_map_after_reextract(tmp_path):
+    repo = str(tmp_path / 'repo')
+    create_repo(repo)
+    loader = MapLoader(repo)
+    room_map = loader.load_map(0, 0, 'map_bottom')
+
+    # Re-extracting the assets changes the modification times, so they are read again
+    palette_path = os.path.join(repo, 'build', 'USA', 'assets', 'palettes', 'gPalette_1.pal')
+    with open(palette_path, 'w') as file:
+        file.write('JASC-PAL\n0100\n16\n' + ''.join(f'2 {j} 0\n' for j in range(16)))
+    stat = os.stat(palette_path)
+    os.utime(palette_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    new_room_map = loader.load_map(0, 0, 'map_bottom')
+    assert new_room_map.metatileset is not room_map.metatileset
+    assert new_room_map.metatileset_key != room_map.metatileset_key
+    assert tuple(new_room_map.render()[0, 0]) == (2, 15, 0, 255)
+
+
+def test_prerender(tmp_path):
+    repo = str(tmp_path / 'repo')
+    create_repo(repo)
+    folder = str(tmp_path / 'cache')
+    os.makedirs(folder)
+
+    init_worker(repo)
+    maps = list_maps(prerender.worker_loader)
+    assert maps == [(0, 0, 'map_bottom')]
+    results = prerender_maps(folder, maps)
+    assert len(results) == 1
+    (key, entry, error) = results[0]
+    assert error is None
+
+    cache = RenderCache(folder)
+    cache.index[key] = entry
+    cache.save()
+
+    cache = RenderCache(folder)
+    entry = cache.get_entry(0, 0, 'map_bottom')
+    assert entry is not None
+    with PIL.Image.open(cache.get_render_path(entry)) as image:
+        assert image.size == (48, 32)
+    assert os.path.isfile(cache.get_thumbnail_path(entry))
+
+    # Modifying a source file invalidates the entry
+    map_path = os.path.join(repo, 'build', 'USA', 'assets', get_room_path(0, 0), 'map.bin')
+    os.utime(map_path, ns=(0, 0))
+    assert cache.get_entry(0, 0, 'map_bottom') is None
@@ -0,0 +1,89 @@
+import numpy as np
+from plugins.tilemap_viewer.renderer import MISSING_COLOR, TRANSPARENT_COLOR, arrange_chunks, arrange_grid, assemble_metatiles, build_palette_table, render_metatile_map, render_metatile_map_region, render_tiles
+
+
+def create_palette_table() -> np.ndarray:
+    palettes = [None] * 32
+    for i in range(16):
+        palettes[i] = sum([[i, j, 0] for j in range(16)], [])
+    return build_palette_table(palettes)
+
+
+def test_palette_table():
+    table = create_palette_table()
+    assert table.shape == (32, 16, 4)
+    assert tuple(table[3, 5]) == (3, 5, 0, 255)
+    assert tuple(table[20, 0]) == MISSING_COLOR
+
+
+def test_render_tiles():
+    pixels = np.zeros((4, 8, 8), dtype=np.uint8)
+    # Inverted gray levels: 0xf0 is color 0, 0x00 is color 15
+    pixels[1, :, :] = 0xf0
+    pixels[1, 0, 0] = 0x00
+    defined = np.array([True, True, False, True])
+    table = create_palette_table()
+
+    # palette 2, tile 1 | palette 3, hflip, tile 1 | palette 0, vflip, tile 1 | tile 2 (not loaded) | tile 5 (out of vram)
+    tile_attrs = np.array([0x2001, 0x3401, 0x0801, 0x0002, 0x0005], dtype=np.uint16)
+    tiles = render_tiles(pixels, defined, tile_attrs, 0, table)
+    assert tiles.shape == (5, 8, 8, 4)
+    assert tuple(tiles[0, 0, 0]) == (2, 15, 0, 255)
+    assert tuple(tiles[0, 0, 1]) == (2, 0, 0, 255)
+    assert tuple(tiles[1, 0, 7]) == (3, 15, 0, 255)
+    assert tuple(tiles[2, 7, 0]) == (0, 15, 0, 255)
+    assert (tiles[3] == MISSING_COLOR).all()
+    assert (tiles[4] == MISSING_COLOR).all()
+
+    # The tile number offset is applied before looking up the tiles
+    tiles = render_tiles(pixels, defined, np.array([0x2000], dtype=np.uint16), 1, table)
+    assert tuple(tiles[0, 0, 0]) == (2, 15, 0, 255)
+
+
+def test_assemble_metatiles():
+    tiles = np.zeros((6, 8, 8, 4), dtype=np.uint8)
+    for i in range(6):
+        tiles[i, :, :, 0] = i + 1
+    metatiles = assemble_metatiles(tiles)
+    assert metatiles.shape == (2, 16, 16, 4)
+    assert metatiles[0, 0, 0, 0] == 1
+    assert metatiles[0, 0, 8, 0] == 2
+    assert metatiles[0, 8, 0, 0] == 3
+    assert metatiles[0, 15, 15, 0] == 4
+    # Incomplete metatile
+    assert (metatiles[1] == TRANSPARENT_COLOR).all()
+
+
+def test_render_metatile_map():
+    metatile_images = np.zeros((2, 16, 16, 4), dtype=np.uint8)
+    metatile_images[1] = (1, 2, 3, 255)
+    image = render_metatile_map(np.array([1, 0, 7, 1, 1], dtype=np.uint16), metatile_images, 2)
+    assert image.shape == (48, 32, 4)
+    assert tuple(image[0, 0]) == (1, 2, 3, 255)
+    assert tuple(image[0, 16]) == (0, 0, 0, 0)
+    assert tuple(image[16, 0]) == TRANSPARENT_COLOR
+    assert tuple(image[32, 0]) == (1, 2, 3, 255)
+    assert tuple(image[32, 16]) == (0, 0, 0, 0)
+
+
+def test_arrange_chunks():
+    tiles = np.zeros((32 * 32 + 1, 8, 8, 4), dtype=np.uint8)
+    tiles[32, :, :, 0] = 1
+    tiles[32 * 32, :, :, 0] = 2
+    image = arrange_chunks(tiles, 64)
+    assert image.shape == (256, 512, 4)
+    assert image[8, 0, 0] == 1
+    assert image[0, 256, 0] == 2
+    assert image.shape == arrange_grid(np.zeros((2, 256, 256, 4), dtype=np.uint8), 2).shape
+
+
+def test_render_metatile_map_region():
+    metatile_images = np.zeros((5, 16, 16, 4), dtype=np.uint8)
+    for i in range(5):
+        metatile_images[i, :, :, 0] = i + 1
+    metatiles = np.array([0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 0], dtype=np.uint16)
+    full = render_metatile_map(metatiles, metatile_images, 3)
+    for (x, y, w, h) in [(0, 0, 2, 2), (1, 2, 2, 2), (2, 3, 2, 2), (0, 0, 3, 4)]:
+        region = render_metatile_map_region(metatiles, metatile_images, 3, x, y, w, h)
+        assert (region == full[y*16:(y+h)*16, x*16:(x+w)*16]).all()
+    assert render_metatile_map_region(metatiles, metatile_images, 3, 3, 4, 2, 2).shape == (0, 0, 4)
@@ -0,0 +1,25 @@
+import numpy as np
+from plugins.tilemap_viewer.tiled_scene import ChunkSource, get_chunks_in_rect, get_chunks_to_evict
+
+
+def create_source(width: int, height: int) -> ChunkSource:
+    return ChunkSource(width, height, 256, lambda x, y: np.zeros((256, 256, 4), dtype=np.uint8))
+
+
+def test_chunks_in_rect():
+    source = create_source(1000, 600)
+    assert source.chunk_columns == 4
+    assert source.chunk_rows == 3
+    assert get_chunks_in_rect(source, 0, 0, 100, 100) == [(0, 0)]
+    assert get_chunks_in_rect(source, 200, 250, 100, 10) == [(0, 0), (1, 0), (0, 1), (1, 1)]
+    # Clipped to the map
+    assert get_chunks_in_rect(source, 900, 500, 500, 500) == [(3, 1), (3, 2)]
+    assert get_chunks_in_rect(source, -100, -100, 50, 50) == []
+    assert get_chunks_in_rect(source, -100, -100, 150, 150) == [(0, 0)]
+
+
+def test_chunks_to_evict():
+    chunks = [(0, 0), (1, 0), (5, 5), (2, 2)]
+    assert get_chunks_to_evict(chunks, 256, 0, 0, 4) == []
+    assert get_chunks_to_evict(chunks, 256, 0, 0, 2) == [(5, 5), (2, 2)]
+    assert get_chunks_to_evict(chunks, 256, 6 * 256, 6 * 256, 3) == [(0, 0)]
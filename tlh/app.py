@@ -1,5 +1,6 @@
 import signal
 import sys
+from typing import List
 from tlh.data.rom import get_rom, invalidate_rom
 from tlh.common.ui.layout import Layout
 from tlh.dock_manager import DockManager
@@ -10,9 +11,12 @@ from PySide6.QtWidgets import (QApplication, QInputDialog,
                                QMainWindow, QMenu, QMessageBox, QSplashScreen)
 
 from tlh import settings
+from tlh.common import startup_profiler
 from tlh.common.ui.dark_theme import apply_dark_theme
-from tlh.const import RomVariant
+from tlh.builder.pipeline import BuildOutputChanges
+from tlh.const import CUSTOM_MAP_FILES, CUSTOM_ROM_VARIANTS, RomVariant
 from tlh.data.database import get_symbol_database, initialize_databases, save_all_databases
+from tlh.data.repo_index import initialize_repo_index
 from tlh.plugin.loader import load_plugins, reload_plugins
 from tlh.settings.ui import SettingsDialog
 from tlh.ui.ui_mainwindow import Ui_MainWindow
@@ -59,9 +63,11 @@ class MainWindow(QMainWindow):
             lambda: self.dock_manager.add_hex_editor(RomVariant.CUSTOM_DEMO_JP)
         )
         self.ui.actionReloadCUSTOM.triggered.connect(self.slot_reload_custom_rom)
+        self.ui.widgetBuilder.signal_outputs_changed.connect(self.slot_build_outputs_changed)
         self.ui.actionLoadSymbols.triggered.connect(self.slot_load_symbols)
 
         self.build_layouts_toolbar()
+        settings.notifier.signal_changed.connect(self.slot_settings_changed)
 
         # self.setCentralWidget(widget)
         # self.ui.centralwidget.hide()
@@ -70,16 +76,20 @@ class MainWindow(QMainWindow):
         self.ui.dockBuilder.hide()
         self.ui.menuTools.insertAction(self.ui.menuPlugins.menuAction(), self.ui.dockBuilder.toggleViewAction())
 
-        initialize_databases(self)
+        with startup_profiler.measure('databases'):
+            initialize_databases(self)
+        initialize_repo_index(self)
 
         self.dock_manager = DockManager(self)
 
         # Load plugins
-        load_plugins(self)
+        with startup_profiler.measure('plugins'):
+            load_plugins(self)
         self.ui.actionReloadPlugins.triggered.connect(reload_plugins)
 
         # Restore layout
-        self.load_layout(settings.get_session_layout())
+        with startup_profiler.measure('layout'):
+            self.load_layout(settings.get_session_layout())
 
 
         if settings.is_always_load_symbols():
@@ -113,8 +123,6 @@ class MainWindow(QMainWindow):
                 layouts.append(layout)
                 settings.set_layouts(layouts)
 
-            self.build_layouts_toolbar()
-
     def load_layout(self, layout: settings.Layout):
         print(f'Loading layout {layout.name}')
         self.dock_manager.restore_state(layout.dock_state)
@@ -164,12 +172,12 @@ class MainWindow(QMainWindow):
     def slot_show_settings_dialog(self):
         dialog = SettingsDialog(self)
         dialog.show()
-        dialog.finished.connect(self.settings_dialog_closed)
 
-    def settings_dialog_closed(self, result: int):
-        # TODO would be nicer with a signal in the settings, but that would require the settings to be a QObject
-        self.build_layouts_toolbar()
-        self.update_hex_viewer_actions()
+    def slot_settings_changed(self, key: str) -> None:
+        if key == 'layouts':
+            self.build_layouts_toolbar()
+        elif key.startswith('rom_') or key == 'repo_location':
+            self.update_hex_viewer_actions()
 
     def slot_show_about_dialog(self):
         QMessageBox.about(self, 'The Little Hat',
@@ -196,15 +204,7 @@ class MainWindow(QMainWindow):
 
     def load_symbols(self, rom_variant: RomVariant, silent: bool) -> None:
 
-        maps = {
-            RomVariant.CUSTOM: 'build/USA/tmc.map',
-            RomVariant.CUSTOM_EU: 'build/EU/tmc_eu.map',
-            RomVariant.CUSTOM_JP: 'build/JP/tmc_jp.map',
-            RomVariant.CUSTOM_DEMO_USA: 'build/DEMO_USA/tmc_demo_usa.map',
-            RomVariant.CUSTOM_DEMO_JP: 'build/DEMO_JP/tmc_demo_jp.map',
-        }
-
-        map_file = path.join(settings.get_repo_location(), maps[rom_variant])
+        map_file = path.join(settings.get_repo_location(), CUSTOM_MAP_FILES[rom_variant])
         if not path.isfile(map_file):
             if silent:
                 print(f'Could not find tmc.map file at {map_file}.')
@@ -235,36 +235,27 @@ class MainWindow(QMainWindow):
         timer.start(500)
 
     def slot_reload_custom_rom(self) -> None:
-        invalidate_rom(RomVariant.CUSTOM)
-        invalidate_rom(RomVariant.CUSTOM_EU)
-        invalidate_rom(RomVariant.CUSTOM_JP)
-        invalidate_rom(RomVariant.CUSTOM_DEMO_USA)
-        invalidate_rom(RomVariant.CUSTOM_DEMO_JP)
-
-        if settings.is_always_load_symbols():
-            self.load_symbols(RomVariant.CUSTOM, True)
-            self.load_symbols(RomVariant.CUSTOM_EU, True)
-            self.load_symbols(RomVariant.CUSTOM_JP, True)
-            self.load_symbols(RomVariant.CUSTOM_DEMO_USA, True)
-            self.load_symbols(RomVariant.CUSTOM_DEMO_USA, True)
-
-        # Reload all hex viewers for the CUSTOM variant
-
-        controllers = self.dock_manager.hex_viewer_manager.get_controllers_for_variant(RomVariant.CUSTOM)
-        for controller in controllers:
-            controller.invalidate()
-        controllers = self.dock_manager.hex_viewer_manager.get_controllers_for_variant(RomVariant.CUSTOM_EU)
-        for controller in controllers:
-            controller.invalidate()
-        controllers = self.dock_manager.hex_viewer_manager.get_controllers_for_variant(RomVariant.CUSTOM_JP)
-        for controller in controllers:
-            controller.invalidate()
-        controllers = self.dock_manager.hex_viewer_manager.get_controllers_for_variant(RomVariant.CUSTOM_DEMO_USA)
-        for controller in controllers:
-            controller.invalidate()
-        controllers = self.dock_manager.hex_viewer_manager.get_controllers_for_variant(RomVariant.CUSTOM_DEMO_JP)
-        for controller in controllers:
-            controller.invalidate()
+        self.reload_custom_variants(CUSTOM_ROM_VARIANTS, CUSTOM_ROM_VARIANTS)
+
+    def slot_build_outputs_changed(self, changes: BuildOutputChanges) -> None:
+        self.reload_custom_variants(changes.roms, changes.maps)
+
+    def reload_custom_variants(self, roms: List[RomVariant], maps: List[RomVariant]) -> None:
+        '''
+        Reloads the roms and the symbols of the .map files of the custom variants and refreshes their hex viewers.
+        '''
+        for variant in roms:
+            invalidate_rom(variant)
+
+        for variant in maps:
+            # Symbols that were loaded manually would be outdated now
+            if settings.is_always_load_symbols() or get_symbol_database().are_symbols_loaded(variant):
+                self.load_symbols(variant, True)
+
+        # Reload all hex viewers for these variants
+        for variant in roms + [variant for variant in maps if variant not in roms]:
+            for controller in self.dock_manager.hex_viewer_manager.get_controllers_for_variant(variant):
+                controller.invalidate()
         # TODO also reload all linked viewers?
 
         self.update_hex_viewer_actions()
@@ -288,8 +279,12 @@ def run():
     splash.show()
     app.processEvents()
 
-    window = MainWindow(app)
+    startup_profiler.add_milestone('application')
+    with startup_profiler.measure('main window'):
+        window = MainWindow(app)
 
+    first_paint_filter = startup_profiler.FirstPaintFilter(window)
+    window.installEventFilter(first_paint_filter)
     window.show()
     splash.finish(window)
     return app.exec_()
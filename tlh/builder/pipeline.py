@@ -0,0 +1,127 @@
+import codecs
+from dataclasses import dataclass, field
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+from tlh import settings
+from tlh.const import CUSTOM_MAP_FILES, CUSTOM_ROM_VARIANTS, RomVariant
+
+# Helpers to stream the output of the build and to find out which custom roms need to be reloaded afterwards.
+
+
+class OutputBuffer:
+    '''
+    Splits the output of a process into lines.
+    Reads can end in the middle of a line or even in the middle of a multi-byte character.
+    '''
+
+    def __init__(self) -> None:
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial = ''
+
+    def feed(self, data: bytes) -> List[str]:
+        '''
+        Returns all lines that are complete now.
+        '''
+        lines = (self.partial + self.decoder.decode(data)).split('\n')
+        self.partial = lines.pop()
+        return [line.rstrip('\r') for line in lines]
+
+    def finish(self) -> List[str]:
+        '''
+        Returns the rest of the output after the process finished.
+        '''
+        text = self.partial + self.decoder.decode(b'', final=True)
+        self.decoder.reset()
+        self.partial = ''
+        return [text.rstrip('\r')] if text != '' else []
+
+
+@dataclass
+class FileSignature:
+    mtime: int
+    size: int
+    # Only calculated for files that were written by a build
+    hash: Optional[str] = None
+
+
+def hash_file(path: str) -> Optional[str]:
+    sha1 = hashlib.sha1()
+    try:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                sha1.update(chunk)
+    except OSError:
+        return None
+    return sha1.hexdigest()
+
+
+class OutputTracker:
+    '''
+    Detects which files were changed by a build.
+    Files whose modification time changed are hashed, so that a file that was written with the same content does not count as changed.
+    '''
+
+    def __init__(self) -> None:
+        self.signatures: Dict[str, Optional[FileSignature]] = {}
+
+    def get_signature(self, path: str, previous: Optional[FileSignature]) -> Optional[FileSignature]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if previous is not None and previous.mtime == stat.st_mtime_ns and previous.size == stat.st_size:
+            return previous
+        return FileSignature(stat.st_mtime_ns, stat.st_size)
+
+    def snapshot(self, paths: List[str]) -> None:
+        '''
+        Remembers the state of the files before a build.
+        '''
+        self.signatures = {path: self.get_signature(path, self.signatures.get(path)) for path in paths}
+
+    def get_changed(self, paths: List[str]) -> List[str]:
+        '''
+        Returns the files that changed since the last snapshot.
+        '''
+        changed = []
+        for path in paths:
+            previous = self.signatures.get(path)
+            current = self.get_signature(path, previous)
+            if current is previous:
+                continue
+            self.signatures[path] = current
+            if current is not None:
+                current.hash = hash_file(path)
+                if previous is not None and previous.hash is not None and previous.hash == current.hash:
+                    continue
+            changed.append(path)
+        return changed
+
+
+@dataclass
+class BuildOutputChanges:
+    roms: List[RomVariant] = field(default_factory=list)
+    maps: List[RomVariant] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return len(self.roms) == 0 and len(self.maps) == 0
+
+    def get_variants(self) -> List[RomVariant]:
+        return self.roms + [variant for variant in self.maps if variant not in self.roms]
+
+
+def get_build_outputs() -> Dict[RomVariant, Tuple[str, str]]:
+    '''
+    Returns the paths of the rom and the .map file for each custom variant.
+    '''
+    repo_location = settings.get_repo_location()
+    return {variant: (settings.get_rom(variant), os.path.join(repo_location, CUSTOM_MAP_FILES[variant])) for variant in CUSTOM_ROM_VARIANTS}
+
+
+def get_changed_outputs(tracker: OutputTracker, outputs: Dict[RomVariant, Tuple[str, str]]) -> BuildOutputChanges:
+    changed = set(tracker.get_changed([path for paths in outputs.values() for path in paths]))
+    return BuildOutputChanges(
+        [variant for (variant, (rom, _)) in outputs.items() if rom in changed],
+        [variant for (variant, (_, map)) in outputs.items() if map in changed],
+    )
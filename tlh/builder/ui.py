@@ -1,11 +1,20 @@
+import html
 import typing
+from typing import List
 import PySide6
 from tlh import settings
-from PySide6.QtCore import QProcess, QSize, Qt
+from tlh.builder.pipeline import OutputBuffer, OutputTracker, get_build_outputs, get_changed_outputs
+from PySide6.QtCore import QProcess, QSize, Qt, QTimer, Signal
 from PySide6.QtWidgets import QLabel, QPushButton, QSplitter, QTextEdit, QVBoxLayout, QWidget
 
 
 class BuilderWidget (QWidget):
+    # Emitted after a successful build with the BuildOutputChanges of the custom variants
+    signal_outputs_changed = Signal(object)
+
+    # Interval in ms in which the received output is added to the text fields
+    FLUSH_INTERVAL = 50
+
     def __init__(self, parent=None) -> None:
         super().__init__(parent)
 
@@ -70,13 +79,30 @@ class BuilderWidget (QWidget):
         self.compileButton.clicked.connect(self.doCompile)
         self.tidyButton.clicked.connect(self.doTidy)
 
+        # The output is split into lines as it arrives and added to the text fields in batches,
+        # so that a build with lots of output does not block the UI
+        self.stdoutBuffer = OutputBuffer()
+        self.stderrBuffer = OutputBuffer()
+        self.pendingStdout: List[str] = []
+        self.pendingStderr: List[str] = []
+        self.flushTimer = QTimer(self)
+        self.flushTimer.setSingleShot(True)
+        self.flushTimer.setInterval(self.FLUSH_INTERVAL)
+        self.flushTimer.timeout.connect(self.flushOutput)
+
+        self.outputTracker = OutputTracker()
+        self.isBuild = False
+
     def doCompile(self):
         self.cleanupUI()
+        self.isBuild = True
+        self.outputTracker.snapshot([path for paths in get_build_outputs().values() for path in paths])
         self.process.setWorkingDirectory(settings.get_repo_location())
         self.process.startCommand(settings.get_build_command())
 
     def doTidy(self):
         self.cleanupUI()
+        self.isBuild = False
         self.process.setWorkingDirectory(settings.get_repo_location())
         self.process.startCommand(settings.get_tidy_command())
 
@@ -85,35 +111,74 @@ class BuilderWidget (QWidget):
         self.stderrText.setEnabled(True)
         self.stdoutText.setPlainText('')
         self.stderrText.setPlainText('')
+        self.pendingStdout = []
+        self.pendingStderr = []
+        self.stdoutBuffer = OutputBuffer()
+        self.stderrBuffer = OutputBuffer()
 
     def readStdout(self):
-        lines = self.process.readAllStandardOutput().data().decode()[
-            :-1].split('\n')
+        self.addStdoutLines(self.stdoutBuffer.feed(self.process.readAllStandardOutput().data()))
+
+    def readStderr(self):
+        self.addStderrLines(self.stderrBuffer.feed(self.process.readAllStandardError().data()))
+
+    def addStdoutLines(self, lines: List[str]) -> None:
         for line in lines:
             if line == 'tmc.gba: FAILED':
                 line = 'tmc.gba: <b style="color:red">FAILED</b>'
             elif line == 'tmc.gba: OK':
                 line = 'tmc.gba: <b style="color:lime">OK</b>'
-            self.stdoutText.append(line)
+            else:
+                line = html.escape(line)
+            self.pendingStdout.append(line)
+        self.scheduleFlush()
 
-    def readStderr(self):
-        lines = self.process.readAllStandardError().data().decode()[
-            :-1].split('\n')
+    def addStderrLines(self, lines: List[str]) -> None:
         for line in lines:
+            escaped = html.escape(line)
             if 'error' in line.lower():
-                line = f'<span style="color:red">{line}</span>'
+                escaped = f'<span style="color:red">{escaped}</span>'
             elif 'warning' in line.lower():
-                line = f'<span style="color:orange">{line}</span>'
-
-            self.stderrText.append(line)
+                escaped = f'<span style="color:orange">{escaped}</span>'
+            self.pendingStderr.append(escaped)
+        self.scheduleFlush()
+
+    def scheduleFlush(self) -> None:
+        if not self.flushTimer.isActive():
+            self.flushTimer.start()
+
+    def flushOutput(self) -> None:
+        self.flushTimer.stop()
+        if self.pendingStdout:
+            self.appendLines(self.stdoutText, self.pendingStdout)
+            self.pendingStdout = []
+        if self.pendingStderr:
+            self.appendLines(self.stderrText, self.pendingStderr)
+            self.pendingStderr = []
+
+    def appendLines(self, textEdit: QTextEdit, lines: List[str]) -> None:
+        # Keep the indentation of the compiler messages
+        textEdit.append(f'<span style="white-space:pre">{"<br>".join(lines)}</span>')
 
     def processStarted(self):
         self.compileButton.setEnabled(False)
         self.tidyButton.setEnabled(False)
 
-    def processFinished(self):
+    def processFinished(self, exitCode: int = 0, exitStatus: QProcess.ExitStatus = QProcess.NormalExit):
+        self.addStdoutLines(self.stdoutBuffer.finish())
+        self.addStderrLines(self.stderrBuffer.finish())
+        self.flushOutput()
         self.compileButton.setEnabled(True)
         self.tidyButton.setEnabled(True)
 
+        if self.isBuild and exitCode == 0 and exitStatus == QProcess.NormalExit:
+            changes = get_changed_outputs(self.outputTracker, get_build_outputs())
+            if changes.is_empty():
+                self.stdoutText.append('No roms changed.')
+            else:
+                self.stdoutText.append(f'Reloading {", ".join(variant.value for variant in changes.get_variants())}.')
+                self.signal_outputs_changed.emit(changes)
+        self.isBuild = False
+
     def errorOccurred(self):
         self.stderrText.insertPlainText(self.process.errorString())
@@ -0,0 +1,208 @@
+import asyncio
+from concurrent.futures import Future
+from contextlib import suppress
+import threading
+import traceback
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Set, Tuple
+from aiohttp import web
+from PySide6.QtCore import QObject, Signal
+import socketio
+
+# The bridges to CExplore, mGBA and Entity Explorer run their servers in one asyncio event loop in a background thread.
+# Received events are collected in batches and delivered to the Qt thread one batch at a time.
+
+# How long to wait for more events before a batch is delivered (in seconds)
+BATCH_INTERVAL = 0.005
+# When this many events are waiting to be delivered, clients need to wait until the Qt thread caught up
+MAX_PENDING_EVENTS = 1024
+# How long to wait for open connections when stopping a server (in seconds)
+SHUTDOWN_TIMEOUT = 1.0
+
+
+class EventLoopThread:
+    '''
+    Runs an asyncio event loop in a daemon thread.
+    '''
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, name='BridgeServer', daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+event_loop_thread: Optional[EventLoopThread] = None
+
+
+def get_event_loop_thread() -> EventLoopThread:
+    global event_loop_thread
+    if event_loop_thread is None:
+        event_loop_thread = EventLoopThread()
+    return event_loop_thread
+
+
+def coalesce_events(events: List[Tuple[str, Any]], coalesced: Set[str]) -> List[Tuple[str, Any]]:
+    '''
+    Only keeps the last event for each of the coalesced event names.
+    '''
+    last = {name: i for (i, (name, _)) in enumerate(events) if name in coalesced}
+    return [event for (i, event) in enumerate(events) if event[0] not in coalesced or last[event[0]] == i]
+
+
+class BridgeServer(QObject):
+    '''
+    Http and socket.io server on a localhost port.
+    The handlers registered with on() are called in the Qt thread.
+    '''
+    signal_started = Signal()
+    signal_stopped = Signal()
+    signal_error = Signal(str)
+    signal_events = Signal(list)
+
+    def __init__(self, port: int, cors_allowed_origins: List[str] = [], static_folder: Optional[str] = None, coalesced_events: Iterable[str] = []) -> None:
+        super().__init__()
+        self.port = port
+        self.cors_allowed_origins = cors_allowed_origins
+        self.static_folder = static_folder
+        self.coalesced_events = set(coalesced_events)
+        self.handlers: Dict[str, Callable[[Any], None]] = {}
+        self.routes: Dict[str, str] = {}
+        self.running = False
+
+        # Only used in the event loop thread
+        self.sio: Optional[socketio.AsyncServer] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.delivered: Optional[asyncio.Event] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+
+        self.signal_events.connect(self.slot_events)
+
+    def on(self, event: str, handler: Callable[[Any], None]) -> None:
+        '''
+        Registers the handler for a socket.io event or an event of a route.
+        connect and disconnect are called when socket.io clients connect or disconnect.
+        '''
+        self.handlers[event] = handler
+
+    def add_route(self, path: str, event: str) -> None:
+        '''
+        GET requests to the path are delivered as the event with the query arguments as data.
+        '''
+        self.routes[path] = event
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        get_event_loop_thread().submit(self.serve())
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        get_event_loop_thread().submit(self.shutdown())
+
+    def send(self, event: str, data: Any = None) -> None:
+        '''
+        Sends the event to all connected socket.io clients.
+        '''
+        get_event_loop_thread().submit(self.send_async(event, data))
+
+    async def send_async(self, event: str, data: Any) -> None:
+        if self.sio is not None:
+            await self.sio.emit(event, data)
+
+    async def serve(self) -> None:
+        try:
+            self.queue = asyncio.Queue(MAX_PENDING_EVENTS)
+            self.delivered = asyncio.Event()
+            self.delivered.set()
+
+            app = web.Application()
+            # Handle the events one after another, so that waiting for the queue also stops reading from the socket
+            self.sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins=self.cors_allowed_origins, async_handlers=False)
+            self.sio.attach(app)
+            for event in self.handlers:
+                self.sio.on(event, self.create_socket_handler(event))
+            for (path, event) in self.routes.items():
+                app.router.add_get(path, self.create_route_handler(event))
+            if self.static_folder is not None:
+                app.router.add_static('/static', self.static_folder)
+
+            self.runner = web.AppRunner(app, shutdown_timeout=SHUTDOWN_TIMEOUT)
+            await self.runner.setup()
+            await web.TCPSite(self.runner, 'localhost', self.port).start()
+            self.dispatcher = asyncio.create_task(self.dispatch())
+            self.signal_started.emit()
+        except Exception as e:
+            await self.cleanup()
+            self.running = False
+            self.signal_error.emit(str(e))
+
+    async def shutdown(self) -> None:
+        await self.cleanup()
+        self.running = False
+        self.signal_stopped.emit()
+
+    async def cleanup(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.dispatcher
+            self.dispatcher = None
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        self.sio = None
+
+    def create_socket_handler(self, event: str) -> Callable:
+        if event == 'connect':
+            async def connect(sid, environ, auth=None):
+                await self.queue.put((event, None))
+            return connect
+        if event == 'disconnect':
+            async def disconnect(sid):
+                await self.queue.put((event, None))
+            return disconnect
+        async def handler(sid, data=None):
+            await self.queue.put((event, data))
+        return handler
+
+    def create_route_handler(self, event: str) -> Callable:
+        async def handler(request: web.Request) -> web.Response:
+            await self.queue.put((event, dict(request.query)))
+            return web.Response(text='ok')
+        return handler
+
+    async def dispatch(self) -> None:
+        '''
+        Delivers the received events in batches, but only when the Qt thread handled the previous batch.
+        '''
+        while True:
+            await self.delivered.wait()
+            events = [await self.queue.get()]
+            await asyncio.sleep(BATCH_INTERVAL)
+            while not self.queue.empty():
+                events.append(self.queue.get_nowait())
+            self.delivered.clear()
+            self.signal_events.emit(coalesce_events(events, self.coalesced_events))
+
+    def slot_events(self, events: List[Tuple[str, Any]]) -> None:
+        try:
+            for (event, data) in events:
+                if event in self.handlers:
+                    try:
+                        self.handlers[event](data)
+                    except Exception:
+                        traceback.print_exc()
+        finally:
+            # Allow the next batch to be delivered
+            delivered = self.delivered
+            if delivered is not None:
+                get_event_loop_thread().loop.call_soon_threadsafe(delivered.set)
@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+import json
+import os
+import time
+from typing import List, Tuple
+from PySide6.QtCore import QEvent, QObject
+
+# Collects how long the steps of the startup take, so that regressions of the cold start can be tracked.
+# The report is printed and written to REPORT_PATH once the main window was painted for the first time.
+
+REPORT_PATH = os.path.join('tmp', 'startup_report.json')
+
+start_time = time.perf_counter()
+# (name, seconds) for each measured step
+durations: List[Tuple[str, float]] = []
+# (name, seconds since the start) for each milestone
+milestones: List[Tuple[str, float]] = []
+finished = False
+
+
+@contextmanager
+def measure(name: str):
+    '''
+    Measures the duration of the enclosed block during the startup.
+    '''
+    if finished:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        durations.append((name, time.perf_counter() - start))
+
+
+def add_milestone(name: str) -> None:
+    if not finished:
+        milestones.append((name, time.perf_counter() - start_time))
+
+
+def finish() -> None:
+    '''
+    Stops measuring and prints and writes the report.
+    '''
+    global finished
+    if finished:
+        return
+    add_milestone('first paint')
+    finished = True
+    print(format_report())
+    try:
+        os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+        with open(REPORT_PATH, 'w') as file:
+            json.dump({
+                'durations': [{'name': name, 'seconds': seconds} for (name, seconds) in durations],
+                'milestones': [{'name': name, 'seconds': seconds} for (name, seconds) in milestones],
+            }, file, indent=2)
+    except OSError as e:
+        print(f'Could not write the startup report: {e}')
+
+
+def format_report() -> str:
+    lines = ['Startup times:']
+    for (name, seconds) in sorted(durations, key=lambda item: -item[1]):
+        lines.append(f'{seconds * 1000:9.1f} ms  {name}')
+    for (name, seconds) in milestones:
+        lines.append(f'{seconds * 1000:9.1f} ms  until {name}')
+    return '\n'.join(lines)
+
+
+class FirstPaintFilter(QObject):
+    '''
+    Finishes the startup report when the watched widget is painted for the first time.
+    '''
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            finish()
+        return False
@@ -26,4 +26,12 @@ class RomVariant(str, Enum):
         return self.name
 
 ALL_ROM_VARIANTS = [RomVariant.USA, RomVariant.DEMO, RomVariant.EU, RomVariant.JP, RomVariant.DEMO_JP, RomVariant.CUSTOM, RomVariant.CUSTOM_EU, RomVariant.CUSTOM_JP, RomVariant.CUSTOM_DEMO_USA, RomVariant.CUSTOM_DEMO_JP]
-CUSTOM_ROM_VARIANTS= [RomVariant.CUSTOM, RomVariant.CUSTOM_EU, RomVariant.CUSTOM_JP, RomVariant.CUSTOM_DEMO_USA, RomVariant.CUSTOM_DEMO_JP]
\ No newline at end of file
+CUSTOM_ROM_VARIANTS= [RomVariant.CUSTOM, RomVariant.CUSTOM_EU, RomVariant.CUSTOM_JP, RomVariant.CUSTOM_DEMO_USA, RomVariant.CUSTOM_DEMO_JP]
+# .map files of the custom variants relative to the repo
+CUSTOM_MAP_FILES = {
+    RomVariant.CUSTOM: 'build/USA/tmc.map',
+    RomVariant.CUSTOM_EU: 'build/EU/tmc_eu.map',
+    RomVariant.CUSTOM_JP: 'build/JP/tmc_jp.map',
+    RomVariant.CUSTOM_DEMO_USA: 'build/DEMO_USA/tmc_demo_usa.map',
+    RomVariant.CUSTOM_DEMO_JP: 'build/DEMO_JP/tmc_demo_jp.map',
+}
@@ -1,4 +1,4 @@
-from typing import Dict, List, Set, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from tlh.const import RomVariant
 from dataclasses import dataclass
 from sortedcontainers import SortedKeyList
@@ -107,6 +107,12 @@ class NoConstraintManager:
     def set_variants(self, variants: Set[RomVariant]) -> None:
         pass
 
+    def add_missing_variants(self, variants: Set[RomVariant]) -> None:
+        pass
+
+    def replace_relations(self, other) -> None:
+        pass
+
     def reset(self):
         pass
 
@@ -146,6 +152,20 @@ class ConstraintManager:
         for variant in variants:
             self.rom_relations[variant] = RomRelations(variant)
 
+    def add_missing_variants(self, variants: Set[RomVariant]) -> None:
+        """
+        Adds the variants without relations, but keeps the relations of the variants that were already added
+        until the relations are rebuilt
+        """
+        rom_relations = {variant: self.rom_relations.get(variant, RomRelations(variant)) for variant in variants}
+        (self.variants, self.rom_relations) = (set(variants), rom_relations)
+
+    def replace_relations(self, other: 'ConstraintManager') -> None:
+        """
+        Takes over the variants, constraints and relations that were solved by another constraint manager
+        """
+        (self.variants, self.constraints, self.rom_relations) = (other.variants, other.constraints, other.rom_relations)
+
     def reset(self):
         self.constraints = []
         for variant in self.variants:
@@ -157,22 +177,24 @@ class ConstraintManager:
             self.constraints.append(constraint)
         # TODO add #self.rebuild_relations()
 
-    def add_all_constraints(self, constraints: List[Constraint]) -> None:
+    def add_all_constraints(self, constraints: List[Constraint], progress: Optional[Callable[[int], None]] = None, is_cancelled: Optional[Callable[[], bool]] = None) -> None:
         for constraint in constraints:
 
             if constraint.romA in self.variants and constraint.romB in self.variants:
                 self.add_constraint(constraint)
             # TODO handle transitive constraints here?
         print(f'Added {len(self.constraints)} of {len(constraints)}')
-        self.rebuild_relations()
+        self.rebuild_relations(progress, is_cancelled)
 
         # print('Num of relations')
         # for variant in self.variants:
         #     print(variant, len(self.rom_relations[variant].relations))
 
-    def rebuild_relations(self) -> None:
+    def rebuild_relations(self, progress: Optional[Callable[[int], None]] = None, is_cancelled: Optional[Callable[[], bool]] = None) -> None:
         """
         Builds relations between local addresses for each variation and the virtual address based on the constraints
+        progress is called with the percentage of resolved constraints.
+        Raises SolveCancelledError as soon as is_cancelled returns true.
         """
 
         local_addresses: Dict[str, int] = {}
@@ -184,6 +206,7 @@ class ConstraintManager:
             local_blockers[variant] = []
 
         constraints = self.constraints.copy()
+        last_progress = 0
 
         virtual_address = -1
         # TODO at that point all roms should have been resolved
@@ -195,6 +218,14 @@ class ConstraintManager:
             if not constraints and local_blockers_count == 0:
                 break
 
+            if is_cancelled is not None and is_cancelled():
+                raise SolveCancelledError()
+            if progress is not None and self.constraints:
+                new_progress = (len(self.constraints) - len(constraints)) * 100 // len(self.constraints)
+                if new_progress != last_progress:
+                    last_progress = new_progress
+                    progress(new_progress)
+
             # Optimization? Jump to the next interesting virtual address
             # - next blocker with blocker.rom_variant:blocker.rom_address
             # - next constraint with romA:addressA or romB:addressB
@@ -519,6 +550,10 @@ class InvalidConstraintError(Exception):
     pass
 
 
+class SolveCancelledError(Exception):
+    pass
+
+
 """
 New idea:
 
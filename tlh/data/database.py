@@ -73,8 +73,8 @@ class ConstraintDatabase(QObject):
                 break
 
     def remove_constraints(self, constraints: List[Constraint]) -> None:
-        for constraint in constraints:
-            self.constraints.remove(constraint)
+        removed = set(map(id, constraints))
+        self.constraints[:] = [constraint for constraint in self.constraints if id(constraint) not in removed]
         if settings.is_auto_save():
             self._write_constraints()
         else:
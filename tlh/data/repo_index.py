@@ -0,0 +1,423 @@
+from dataclasses import dataclass, field
+import os
+import re
+from threading import Lock, RLock
+from typing import Dict, List, Optional, Set, Tuple
+
+from intervaltree import Interval, IntervalTree
+from PySide6.QtCore import QCoreApplication, QObject, QThread, Signal
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from tlh import settings
+
+# Index of the source files of the decomp repo that is shared by all plugins.
+# The indexed folders are scanned once in the background. Afterwards only the files reported by the watchdog are read again.
+
+NONMATCH_REGEX = re.compile(r'NONMATCH\(".*",(?: static)?\W*\w*\W*(\w*).*\)')
+ASM_FUNC_REGEX = re.compile(r'ASM_FUNC\(".*",(?: static)?\W*\w*\W*(\w*).*\)')
+INCLUDED_ASM_REGEX = re.compile(r'(?:NONMATCH|ASM_FUNC)\("(.*)"')
+
+ASSEMBLY_EXTENSIONS = ['.inc', '.s']
+# Only these folders of the repo are indexed, so that build and the assets are not walked
+INDEXED_FOLDERS = ['asm', 'data', 'src']
+MAP_FILE = 'tmc.map'
+
+
+@dataclass
+class SourceFile:
+    '''
+    Everything the index extracted from a single file.
+    '''
+    mtime: int
+    nonmatch_funcs: List[str] = field(default_factory=list)
+    asm_funcs: List[str] = field(default_factory=list)
+    included_asm: List[str] = field(default_factory=list) # paths of the asm files used in NONMATCH and ASM_FUNC macros
+    incbins: List[Tuple[int, int]] = field(default_factory=list) # (address, length)
+
+
+def parse_c_file(path: str, mtime: int) -> SourceFile:
+    with open(path, 'r') as f:
+        data = f.read()
+    return SourceFile(
+        mtime,
+        nonmatch_funcs=NONMATCH_REGEX.findall(data),
+        asm_funcs=ASM_FUNC_REGEX.findall(data),
+        included_asm=INCLUDED_ASM_REGEX.findall(data)
+    )
+
+
+def parse_asm_file(path: str, mtime: int) -> SourceFile:
+    incbins = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith('.incbin "baserom.gba"'):
+                arr = line.split(',')
+                if len(arr) == 3:
+                    incbins.append((int(arr[1], 16), int(arr[2], 16)))
+                else:
+                    print(f'Invalid incbin: {line}')
+    return SourceFile(mtime, incbins=incbins)
+
+
+def parse_map_file(path: str) -> Dict[str, str]:
+    '''
+    Returns the .c file for each symbol in the .text sections of the map file.
+    '''
+    source_files = {}
+    with open(path, 'r') as f:
+        current_file = None
+        for line in f:
+            if line.startswith(' .text'):
+                parts = line.split()
+                current_file = parts[3] if len(parts) > 3 else None
+            elif current_file is not None:
+                parts = line.split()
+                if len(parts) > 0:
+                    source_files.setdefault(parts[-1], current_file[0:-2] + '.c')
+    return source_files
+
+
+class RepoIndex:
+    '''
+    Tables of the NONMATCH and ASM_FUNC functions, .inc files, .incbins and source files of symbols in the repo.
+    The first query scans the repo. Later queries only read the files again that were invalidated since then.
+    '''
+
+    def __init__(self, repo_location: str) -> None:
+        self.repo_location = repo_location
+        self.lock = RLock()
+        # All files in the repo and their modification times.
+        self.mtimes: Dict[str, int] = {}
+        # Parsed .c, .inc and .s files.
+        self.files: Dict[str, SourceFile] = {}
+        self.map_mtime: Optional[int] = None
+        self.source_files: Dict[str, str] = {}
+        self.incbin_tree: Optional[IntervalTree] = None
+        # Increased whenever files changed, so that users of the index can detect changes
+        self.generation = 0
+        # Changes that still need to be applied. A full scan is needed when the files are not known.
+        self.invalid_lock = Lock()
+        self.needs_scan = True
+        self.invalid_paths: Set[str] = set()
+        self.observer = None
+
+    def update(self) -> int:
+        '''
+        Parses all files that were added or modified since the last update and drops removed ones.
+        Returns the number of files that changed.
+        '''
+        with self.lock:
+            with self.invalid_lock:
+                self.needs_scan = False
+                self.invalid_paths = set()
+            mtimes = self.scan_mtimes()
+            changed = 0
+            for path in self.mtimes.keys() - mtimes.keys():
+                self.files.pop(path, None)
+                changed += 1
+            for (path, mtime) in mtimes.items():
+                if self.mtimes.get(path) == mtime:
+                    continue
+                changed += 1
+                if self.should_parse(path):
+                    try:
+                        self.files[path] = self.parse_file(path, mtime)
+                    except (OSError, UnicodeDecodeError) as e:
+                        print(f'Could not index {path}: {e}')
+                        self.files.pop(path, None)
+            self.mtimes = mtimes
+            if changed > 0:
+                self.incbin_tree = None
+                self.generation += 1
+            self.update_map_file()
+            return changed
+
+    def update_paths(self, paths: Set[str]) -> int:
+        '''
+        Reads only the files at these paths again.
+        Returns the number of files that changed.
+        '''
+        with self.lock:
+            changed = 0
+            for path in paths:
+                try:
+                    mtime = os.stat(path).st_mtime_ns if os.path.isfile(path) else None
+                except OSError:
+                    mtime = None
+                if self.mtimes.get(path) == mtime:
+                    continue
+                changed += 1
+                if mtime is None:
+                    self.mtimes.pop(path, None)
+                    self.files.pop(path, None)
+                    continue
+                self.mtimes[path] = mtime
+                if self.should_parse(path):
+                    try:
+                        self.files[path] = self.parse_file(path, mtime)
+                    except (OSError, UnicodeDecodeError) as e:
+                        print(f'Could not index {path}: {e}')
+                        self.files.pop(path, None)
+            if changed > 0:
+                self.incbin_tree = None
+                self.generation += 1
+            self.update_map_file()
+            return changed
+
+    def refresh(self) -> None:
+        '''
+        Applies the changes since the last query. Waits for a running scan.
+        '''
+        with self.lock:
+            with self.invalid_lock:
+                needs_scan = self.needs_scan
+                paths = self.invalid_paths
+                self.invalid_paths = set()
+            if needs_scan:
+                self.update()
+            elif len(paths) > 0:
+                self.update_paths(paths)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        '''
+        Reads the file at the path again on the next query or scans all folders again if no path is given.
+        '''
+        with self.invalid_lock:
+            if path is None:
+                self.needs_scan = True
+            elif self.is_indexed(path):
+                self.invalid_paths.add(path)
+
+    def is_indexed(self, path: str) -> bool:
+        return path == os.path.join(self.repo_location, MAP_FILE) or any(self.is_in_folder(path, folder) for folder in INDEXED_FOLDERS)
+
+    def scan_mtimes(self) -> Dict[str, int]:
+        mtimes = {}
+        for folder in INDEXED_FOLDERS:
+            for root, dirs, files in os.walk(os.path.join(self.repo_location, folder)):
+                for file in files:
+                    path = os.path.join(root, file)
+                    try:
+                        mtimes[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        pass
+        path = os.path.join(self.repo_location, MAP_FILE)
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+        return mtimes
+
+    def start_watchdog(self) -> None:
+        '''
+        Invalidates the files of the indexed folders and the map file when they are changed.
+        '''
+        if self.observer is not None or not os.path.isdir(self.repo_location):
+            return
+        event_handler = RepoEventHandler(self)
+        self.observer = Observer()
+        self.observer.schedule(event_handler, self.repo_location, recursive=False)
+        for folder in INDEXED_FOLDERS:
+            path = os.path.join(self.repo_location, folder)
+            if os.path.isdir(path):
+                self.observer.schedule(event_handler, path, recursive=True)
+        self.observer.start()
+
+    def stop_watchdog(self) -> None:
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def should_parse(self, path: str) -> bool:
+        if path.endswith('.c'):
+            return self.is_in_folder(path, 'src')
+        return os.path.splitext(path)[1] in ASSEMBLY_EXTENSIONS
+
+    def parse_file(self, path: str, mtime: int) -> SourceFile:
+        if path.endswith('.c'):
+            return parse_c_file(path, mtime)
+        return parse_asm_file(path, mtime)
+
+    def update_map_file(self) -> None:
+        path = os.path.join(self.repo_location, MAP_FILE)
+        mtime = self.mtimes.get(path)
+        if mtime == self.map_mtime:
+            return
+        self.map_mtime = mtime
+        self.source_files = parse_map_file(path) if mtime is not None else {}
+
+    def get_folder(self, folder: str) -> str:
+        return os.path.join(self.repo_location, folder) + os.sep
+
+    def is_in_folder(self, path: str, folder: str) -> bool:
+        return path.startswith(self.get_folder(folder))
+
+    def get_c_files(self) -> List[Tuple[str, SourceFile]]:
+        return [(path, file) for (path, file) in self.files.items() if path.endswith('.c')]
+
+    # Queries
+
+    def get_nonmatching_funcs(self) -> List[Tuple[str, str]]:
+        '''
+        Returns (file relative to src, function) for all NONMATCH functions.
+        '''
+        self.refresh()
+        src_folder = os.path.join(self.repo_location, 'src')
+        return [(os.path.relpath(path, src_folder), func) for (path, file) in self.get_c_files() for func in file.nonmatch_funcs]
+
+    def get_asm_funcs(self) -> List[Tuple[str, str]]:
+        '''
+        Returns (file relative to src, function) for all ASM_FUNC functions.
+        '''
+        self.refresh()
+        src_folder = os.path.join(self.repo_location, 'src')
+        return [(os.path.relpath(path, src_folder), func) for (path, file) in self.get_c_files() for func in file.asm_funcs]
+
+    def get_included_asm_files(self) -> List[str]:
+        '''
+        Returns the paths of all asm files that are included by NONMATCH or ASM_FUNC macros.
+        '''
+        self.refresh()
+        return [os.path.join(self.repo_location, asm) for (_, file) in self.get_c_files() for asm in file.included_asm]
+
+    def get_finished_files(self) -> List[str]:
+        '''
+        Returns all .c files relative to src that do not contain ASM_FUNC functions.
+        '''
+        self.refresh()
+        src_folder = os.path.join(self.repo_location, 'src')
+        return [os.path.relpath(path, src_folder) for (path, file) in self.get_c_files() if len(file.asm_funcs) == 0]
+
+    def find_inc_file(self, name: str) -> Optional[str]:
+        '''
+        Returns the path of the .inc file for this function in the asm/non_matching folder.
+        '''
+        self.refresh()
+        filename = os.sep + name + '.inc'
+        for path in self.files:
+            if path.endswith(filename) and self.is_in_folder(path, os.path.join('asm', 'non_matching')):
+                return path
+        return None
+
+    def find_source_file(self, name: str) -> Optional[str]:
+        '''
+        Returns the .c file relative to the repo that contains the symbol according to tmc.map.
+        '''
+        self.refresh()
+        return self.source_files.get(name)
+
+    def get_incbins(self) -> IntervalTree:
+        '''
+        Returns an interval tree of all .incbins of the baserom with the path of the assembly file as data.
+        '''
+        self.refresh()
+        with self.lock:
+            if self.incbin_tree is None:
+                self.incbin_tree = IntervalTree(
+                    Interval(addr, addr + length, path)
+                    for (path, file) in self.files.items()
+                    for (addr, length) in file.incbins
+                    if length > 0
+                )
+            return self.incbin_tree
+
+    def get_mtime(self, path: str) -> Optional[int]:
+        '''
+        Returns the modification time of the file at the last refresh.
+        '''
+        return self.mtimes.get(path)
+
+    def list_files(self, folder: str, extensions: Optional[List[str]] = None) -> List[str]:
+        '''
+        Returns all files in the folder of the repo with one of the extensions.
+        '''
+        self.refresh()
+        return [path for path in self.mtimes
+                if self.is_in_folder(path, folder) and (extensions is None or os.path.splitext(path)[1] in extensions)]
+
+
+class RepoEventHandler(FileSystemEventHandler):
+    def __init__(self, index: RepoIndex) -> None:
+        super().__init__()
+        self.index = index
+
+    def on_any_event(self, event) -> None:
+        if event.event_type in ('opened', 'closed'):
+            return
+        if event.is_directory:
+            # Moving or deleting a folder does not report the files in it
+            if event.event_type != 'modified':
+                self.index.invalidate()
+            return
+        self.index.invalidate(event.src_path)
+        if hasattr(event, 'dest_path'):
+            self.index.invalidate(event.dest_path)
+
+
+class RepoIndexWorker(QObject):
+    signal_done = Signal(int)
+    signal_fail = Signal(str)
+
+    def __init__(self, index: RepoIndex) -> None:
+        super().__init__()
+        self.index = index
+
+    def process(self) -> None:
+        try:
+            self.signal_done.emit(self.index.update())
+        except Exception as e:
+            self.signal_fail.emit(str(e))
+
+
+repo_index_instance: Optional[RepoIndex] = None
+repo_index_thread: Optional[QThread] = None
+repo_index_worker: Optional[RepoIndexWorker] = None
+# Whether the repo is watched for changes, also for a new repo location
+watches_repo = False
+
+
+def get_repo_index() -> RepoIndex:
+    '''
+    Returns the index for the current repo location.
+    Queries block until a running background scan is finished.
+    '''
+    global repo_index_instance
+    repo_location = settings.get_repo_location()
+    if repo_index_instance is None or repo_index_instance.repo_location != repo_location:
+        if repo_index_instance is not None:
+            repo_index_instance.stop_watchdog()
+        repo_index_instance = RepoIndex(repo_location)
+        if watches_repo:
+            repo_index_instance.start_watchdog()
+    return repo_index_instance
+
+
+def stop_repo_watchdog() -> None:
+    if repo_index_instance is not None:
+        repo_index_instance.stop_watchdog()
+
+
+def initialize_repo_index(parent) -> None:
+    '''
+    Start the initial scan of the repo in the background and watch it for changes afterwards.
+    '''
+    global repo_index_thread, repo_index_worker, watches_repo
+    if not watches_repo:
+        watches_repo = True
+        QCoreApplication.instance().aboutToQuit.connect(stop_repo_watchdog)
+    # Started before the scan, so that no changes are missed
+    get_repo_index().start_watchdog()
+    if repo_index_thread is not None or not os.path.isdir(settings.get_repo_location()):
+        return
+    repo_index_thread = QThread(parent)
+    repo_index_worker = RepoIndexWorker(get_repo_index())
+    repo_index_worker.moveToThread(repo_index_thread)
+    repo_index_thread.started.connect(repo_index_worker.process)
+    repo_index_worker.signal_done.connect(lambda changed: print(f'Indexed {changed} files of the repo.'))
+    repo_index_worker.signal_fail.connect(lambda error: print(f'Could not index the repo: {error}'))
+    repo_index_worker.signal_done.connect(repo_index_thread.quit)
+    repo_index_worker.signal_fail.connect(repo_index_thread.quit)
+    repo_index_thread.start()
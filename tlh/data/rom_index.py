@@ -0,0 +1,325 @@
+from dataclasses import dataclass
+import hashlib
+import os
+import re
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from PySide6.QtCore import QCoreApplication, QObject, QThread, Signal
+from tlh.const import RomVariant
+from tlh.data.rom import get_rom
+
+# Search for byte patterns in the roms.
+# The index is a suffix array that is only sorted by the first GRAM_SIZE bytes of each suffix.
+# All occurrences of an n-gram are next to each other in it and can be found with a binary search.
+# The index is built once per rom and stored in INDEX_FOLDER by the hash of the rom.
+
+INDEX_FOLDER = os.path.join('tmp', 'rom_index')
+GRAM_SIZE = 4
+# Stop looking for a better n-gram of the pattern to start the search with, once one occurs this rarely
+RARE_COUNT = 16
+# If a pattern only contains shorter grams that occur more often, the rom is scanned in chunks instead
+SORT_LIMIT = 1 << 16
+SCAN_CHUNK_SIZE = 1 << 20
+
+
+class SearchError(Exception):
+    pass
+
+
+@dataclass
+class SearchPattern:
+    data: bytes
+    # False for the wildcard bytes
+    mask: List[bool]
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+def parse_hex_pattern(text: str) -> SearchPattern:
+    '''
+    Parses bytes like 12 34 ?? 56 or 1234??56 where ?? matches any byte.
+    '''
+    digits = re.sub(r'\s', '', text)
+    if len(digits) == 0 or len(digits) % 2 != 0:
+        raise SearchError(f'{text} is not a sequence of bytes.')
+    data = bytearray()
+    mask = []
+    for i in range(0, len(digits), 2):
+        byte = digits[i:i+2]
+        if byte == '??':
+            data.append(0)
+            mask.append(False)
+            continue
+        try:
+            data.append(int(byte, 16))
+        except ValueError:
+            raise SearchError(f'{byte} is not a byte.')
+        mask.append(True)
+    if not any(mask):
+        raise SearchError('The pattern needs to contain at least one byte that is not a wildcard.')
+    return SearchPattern(bytes(data), mask)
+
+
+def parse_string_pattern(text: str) -> SearchPattern:
+    if text == '':
+        raise SearchError('The string is empty.')
+    try:
+        data = text.encode('latin-1')
+    except UnicodeEncodeError:
+        raise SearchError(f'{text} contains characters that are not in latin-1.')
+    return SearchPattern(data, [True] * len(data))
+
+
+def parse_value_pattern(text: str) -> SearchPattern:
+    '''
+    Parses a 32 bit value as hex with 0x or as decimal.
+    '''
+    try:
+        value = int(text.strip(), 0)
+    except ValueError:
+        raise SearchError(f'{text} is not a number.')
+    if value < 0 or value >= 1 << 32:
+        raise SearchError(f'{text} does not fit into 32 bits.')
+    return SearchPattern(value.to_bytes(4, 'little'), [True] * 4)
+
+
+def get_fingerprint(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def build_positions(data: bytes) -> np.ndarray:
+    '''
+    Returns all positions in the data sorted by the n-grams starting there.
+    '''
+    padded = np.zeros(len(data) + GRAM_SIZE - 1, dtype=np.uint8)
+    padded[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    keys = np.zeros(len(data), dtype=np.uint32)
+    for i in range(GRAM_SIZE):
+        keys |= padded[i:i + len(data)].astype(np.uint32) << (8 * (GRAM_SIZE - 1 - i))
+    # Stable, so that the positions of each n-gram are in ascending order
+    return np.argsort(keys, kind='stable').astype(np.uint32)
+
+
+class RomIndex:
+    def __init__(self, data: bytes, positions: np.ndarray) -> None:
+        self.data = data
+        # Padded in the same way as for sorting the positions
+        self.padded = data + bytes(GRAM_SIZE - 1)
+        self.array = np.frombuffer(data, dtype=np.uint8)
+        self.positions = positions
+
+    def find_range(self, gram: bytes) -> Tuple[int, int]:
+        '''
+        Returns the range of the positions whose suffixes start with the gram of at most GRAM_SIZE bytes.
+        '''
+        length = len(gram)
+        positions = self.positions
+        padded = self.padded
+
+        (low, high) = (0, len(positions))
+        while low < high:
+            mid = (low + high) // 2
+            position = int(positions[mid])
+            if padded[position:position + length] < gram:
+                low = mid + 1
+            else:
+                high = mid
+        start = low
+
+        high = len(positions)
+        while low < high:
+            mid = (low + high) // 2
+            position = int(positions[mid])
+            if padded[position:position + length] <= gram:
+                low = mid + 1
+            else:
+                high = mid
+        return (start, low)
+
+    def choose_gram(self, pattern: SearchPattern) -> Tuple[int, int, int, int]:
+        '''
+        Returns (offset in the pattern, length, start, end) of the rarest gram without wildcards in the pattern.
+        '''
+        runs = []
+        offset = 0
+        while offset < len(pattern):
+            if not pattern.mask[offset]:
+                offset += 1
+                continue
+            end = offset
+            while end < len(pattern) and pattern.mask[end]:
+                end += 1
+            runs.append((offset, end))
+            offset = end
+        length = min(GRAM_SIZE, max(end - start for (start, end) in runs))
+
+        best = None
+        for (run_start, run_end) in runs:
+            for offset in range(run_start, run_end - length + 1):
+                (start, end) = self.find_range(pattern.data[offset:offset + length])
+                if best is None or end - start < best[3] - best[2]:
+                    best = (offset, length, start, end)
+                if end - start <= RARE_COUNT:
+                    return best
+        return best
+
+    def search(self, pattern: SearchPattern, max_results: int = 1000) -> List[int]:
+        '''
+        Returns the addresses of the first matches of the pattern in ascending order.
+        '''
+        (offset, length, start, end) = self.choose_gram(pattern)
+        if length < GRAM_SIZE and end - start > SORT_LIMIT:
+            return self.scan(pattern, max_results)
+        others = [(i, pattern.data[i]) for i in range(len(pattern)) if pattern.mask[i] and not offset <= i < offset + length]
+        if length == GRAM_SIZE:
+            # The positions of a single gram are already sorted
+            candidates = self.positions[start:end]
+        else:
+            candidates = np.sort(self.positions[start:end])
+
+        results: List[int] = []
+        chunk_size = max(max_results, 1024)
+        for chunk_start in range(0, len(candidates), chunk_size):
+            chunk = candidates[chunk_start:chunk_start + chunk_size].astype(np.int64) - offset
+            results.extend(self.verify(pattern, chunk, others, max_results - len(results)))
+            if len(results) >= max_results:
+                break
+        return results
+
+    def scan(self, pattern: SearchPattern, max_results: int) -> List[int]:
+        '''
+        Searches the rom from the start for patterns that match too often to sort all candidates.
+        '''
+        fixed = [(i, pattern.data[i]) for i in range(len(pattern)) if pattern.mask[i]]
+        (first_offset, first_byte) = fixed[0]
+        results: List[int] = []
+        for chunk_start in range(0, len(self.data), SCAN_CHUNK_SIZE):
+            window = self.array[chunk_start:chunk_start + SCAN_CHUNK_SIZE]
+            chunk = np.flatnonzero(window == first_byte) + (chunk_start - first_offset)
+            results.extend(self.verify(pattern, chunk, fixed[1:], max_results - len(results)))
+            if len(results) >= max_results:
+                break
+        return results
+
+    def verify(self, pattern: SearchPattern, candidates: np.ndarray, others: List[Tuple[int, int]], max_results: int) -> List[int]:
+        '''
+        Returns the candidates where the pattern fits into the rom and the other bytes match.
+        '''
+        candidates = candidates[(candidates >= 0) & (candidates + len(pattern) <= len(self.data))]
+        for (i, byte) in others:
+            candidates = candidates[self.array[candidates + i] == byte]
+        return [int(address) for address in candidates[:max_results]]
+
+
+def get_index_path(fingerprint: str) -> str:
+    return os.path.join(INDEX_FOLDER, f'{fingerprint}.npy')
+
+
+def load_or_build_index(data: bytes) -> RomIndex:
+    '''
+    Loads the index for this data from disk or builds and stores it.
+    '''
+    path = get_index_path(get_fingerprint(data))
+    try:
+        positions = np.load(path, mmap_mode='r')
+        if positions.shape == (len(data),) and positions.dtype == np.uint32:
+            return RomIndex(data, positions)
+    except (OSError, ValueError):
+        pass
+
+    positions = build_positions(data)
+    try:
+        os.makedirs(INDEX_FOLDER, exist_ok=True)
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, positions)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f'Could not store the rom index: {e}')
+    return RomIndex(data, positions)
+
+
+# The index and the rom object it was built for for each variant
+indices: Dict[RomVariant, Tuple[object, RomIndex]] = {}
+indices_lock = Lock()
+
+
+def get_cached_rom_index(variant: RomVariant) -> Optional[RomIndex]:
+    '''
+    Returns the index if it is already loaded for the current rom of the variant.
+    '''
+    rom = get_rom(variant)
+    entry = indices.get(variant)
+    if rom is None or entry is None or entry[0] is not rom:
+        return None
+    return entry[1]
+
+
+def get_rom_index(variant: RomVariant) -> Optional[RomIndex]:
+    '''
+    Returns the index for the rom of the variant. Loading or building it can take a while.
+    '''
+    with indices_lock:
+        index = get_cached_rom_index(variant)
+        if index is not None:
+            return index
+        rom = get_rom(variant)
+        if rom is None:
+            return None
+        index = load_or_build_index(bytes(rom.bytes))
+        indices[variant] = (rom, index)
+        return index
+
+
+class RomIndexWorker(QObject):
+    signal_done = Signal(object)
+    signal_fail = Signal(str)
+
+    def __init__(self, variant: RomVariant) -> None:
+        super().__init__()
+        self.variant = variant
+
+    def process(self) -> None:
+        try:
+            index = get_rom_index(self.variant)
+        except Exception as e:
+            self.signal_fail.emit(str(e))
+            return
+        if index is None:
+            self.signal_fail.emit(f'The rom for {self.variant} is not loaded.')
+            return
+        self.signal_done.emit(index)
+
+
+# Threads that load or build indices, kept until they are finished
+index_threads: List[Tuple[QThread, RomIndexWorker]] = []
+waits_on_quit = False
+
+
+def load_rom_index_in_background(variant: RomVariant, slot_done: Callable[[RomIndex], None], slot_fail: Callable[[str], None]) -> None:
+    '''
+    Loads the index of the variant in a background thread and passes it to slot_done.
+    Requests for a variant that is already being loaded wait for it and then get the same index.
+    '''
+    global index_threads, waits_on_quit
+    if not waits_on_quit:
+        QCoreApplication.instance().aboutToQuit.connect(wait_for_index_threads)
+        waits_on_quit = True
+    index_threads = [(thread, worker) for (thread, worker) in index_threads if thread.isRunning()]
+
+    thread = QThread()
+    worker = RomIndexWorker(variant)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.process)
+    worker.signal_done.connect(slot_done)
+    worker.signal_fail.connect(slot_fail)
+    worker.signal_done.connect(thread.quit)
+    worker.signal_fail.connect(thread.quit)
+    index_threads.append((thread, worker))
+    thread.start()
+
+
+def wait_for_index_threads() -> None:
+    for (thread, _) in index_threads:
+        thread.wait()
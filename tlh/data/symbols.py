@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
 from tlh.const import ROM_OFFSET, RomVariant
 from tlh import settings
 from sortedcontainers import SortedKeyList
@@ -30,6 +30,20 @@ class SymbolList:
         index = self.symbols.bisect_key_right(local_address)
         return self.symbols[index-1]
 
+    def get_symbols_at(self, local_addresses: Iterable[int]) -> Dict[int, Symbol]:
+        '''
+        Returns the symbol containing each of the addresses in one pass over the symbols.
+        Addresses before the first symbol are left out.
+        '''
+        result = {}
+        index = 0
+        for local_address in sorted(set(local_addresses)):
+            while index + 1 < len(self.symbols) and self.symbols[index + 1].address <= local_address:
+                index += 1
+            if len(self.symbols) > 0 and self.symbols[index].address <= local_address:
+                result[local_address] = self.symbols[index]
+        return result
+
     def get_symbol_after(self, local_address: int) -> Optional[Symbol]:
         if len(self.symbols) == 0:
             return None
@@ -1,7 +1,9 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, replace
+from itertools import zip_longest
+from typing import Dict, List, Set
 from tlh.data.symbols import Symbol, SymbolList
 from tlh.hexviewer.display_byte import DisplayByte
+from tlh.hexviewer.model_builder import LineModel, LineModelBuilder
 from tlh.hexviewer.ui.hex_area import KeyType
 from tlh.data.rom import Rom, get_rom
 from tlh.data.database import get_annotation_database, get_pointer_database, get_constraint_database, get_symbol_database
@@ -14,11 +16,12 @@ from PySide6.QtGui import QColor, QKeySequence, QShortcut, Qt
 from PySide6.QtWidgets import QInputDialog, QMessageBox, QToolTip, QMenu, QApplication
 from tlh.hexviewer.ui.dock import HexViewerDock
 from tlh.const import ROM_OFFSET, ROM_SIZE, RomVariant
-from tlh.hexviewer.address_resolver import AbstractAddressResolver, TrivialAddressResolver
+from tlh.hexviewer.address_resolver import AbstractAddressResolver, LinkedAddressResolver, TrivialAddressResolver
 from tlh import settings
 from tlh.hexviewer.edit_annotation_dialog import EditAnnotationDialog
 from tlh.hexviewer.edit_constraint_dialog import EditConstraintDialog
 from tlh.hexviewer.edit_pointer_dialog import EditPointerDialog
+from tlh.hexviewer.search_dialog import SearchDialog
 
 class HexViewerController(QObject):
     '''
@@ -53,6 +56,16 @@ class HexViewerController(QObject):
         self.selected_bytes = 1
 
         self.display_byte_cache = {}  # TODO invalidate this cache if a constraint is added
+        self.repaint_scheduler = None
+
+        # Line models by their virtual address, built in the background by the model builder
+        self.model_builder: LineModelBuilder = None
+        self.line_models: Dict[int, LineModel] = {}
+        # Line models of previous generations, shown until the model builder replaced them
+        self.stale_line_models: Dict[int, LineModel] = {}
+        # Increased whenever the line models become invalid, so that results of the model builder for the old state are discarded
+        self.generation = 0
+        self.pending_lines: Set[int] = set()
 
         # Settings # TODO move elsewhere
         self.diff_color = QColor(158, 80, 88)  # QColor(244, 108, 117)
@@ -60,8 +73,10 @@ class HexViewerController(QObject):
         self.default_annotation_color = QColor(50, 180, 50)
         self.default_selection_size = settings.get_default_selection_size()
         self.highlight_8_bytes = settings.is_highlight_8_bytes()
+        settings.notifier.signal_changed.connect(self.slot_settings_changed)
 
         self.contextmenu_handlers = []
+        self.search_dialog: SearchDialog = None
 
         self.setup_scroll_bar()
         self.scroll_bar.valueChanged.connect(self.slot_scroll_bar_changed)
@@ -101,6 +116,8 @@ class HexViewerController(QObject):
                   context=Qt.WidgetWithChildrenShortcut)
         QShortcut(QKeySequence(Qt.Key_F3), self.dock, self.slot_jump_to_next_diff,
                   context=Qt.WidgetWithChildrenShortcut)
+        QShortcut(QKeySequence(Qt.CTRL | Qt.Key_F), self.dock, self.slot_show_search_dialog,
+                  context=Qt.WidgetWithChildrenShortcut)
         QShortcut(QKeySequence(Qt.Key_Delete), self.dock, self.slot_delete_current_pointer,
                   context=Qt.WidgetWithChildrenShortcut)
 
@@ -173,6 +190,13 @@ class HexViewerController(QObject):
         self.request_repaint()
 
 
+    def slot_settings_changed(self, key: str) -> None:
+        if key == 'default_selection_size':
+            self.default_selection_size = settings.get_default_selection_size()
+        elif key == 'highlight_8_bytes':
+            self.highlight_8_bytes = settings.is_highlight_8_bytes()
+            self.request_repaint()
+
     def set_linked(self, linked: bool) -> None:
         self.is_linked = linked
         self.dock.ui.pushButtonLink.setChecked(linked)
@@ -180,6 +204,7 @@ class HexViewerController(QObject):
     def set_address_resolver_and_diff_calculator(self, address_resolver: AbstractAddressResolver, diff_calculator: AbstractDiffCalculator) -> None:
         self.address_resolver = address_resolver
         self.diff_calculator = diff_calculator
+        self.invalidate_line_models()
 
     def slot_toggle_linked(self, linked: bool) -> None:
         # Don't emit if the button checked state was just set via set_linked
@@ -200,30 +225,123 @@ class HexViewerController(QObject):
         Invalidates the display byte cache and repaints
         '''
         self.display_byte_cache = {}
-        self.update_hex_area()
+        self.invalidate_line_models()
+        self.schedule_update()
+
+    def invalidate_line_models(self) -> None:
+        self.generation += 1
+        self.stale_line_models.update(self.line_models)
+        self.line_models = {}
+        self.pending_lines = set()
+
+    def set_repaint_scheduler(self, repaint_scheduler) -> None:
+        self.repaint_scheduler = repaint_scheduler
+
+    def set_model_builder(self, model_builder: LineModelBuilder) -> None:
+        self.model_builder = model_builder
+
+    def schedule_update(self) -> None:
+        '''
+        Rebuilds the display model on the next frame, or right away if there is no repaint scheduler
+        '''
+        if self.repaint_scheduler is None:
+            self.update_hex_area()
+        else:
+            self.repaint_scheduler.schedule(self)
 
     def update_hex_area(self) -> None:
         '''
         Builds the display model for the hex area to paint
         '''
-        #print(f'updating hex area {self.dock.windowTitle()}') # TODO reduce the amount of repaint at the start
+        bytes_per_line = self.area.bytes_per_line
+        lines_on_screen = self.area.number_of_lines_on_screen()
+        line_addresses = [self.start_offset + l * bytes_per_line for l in range(lines_on_screen)]
+
+        if self.model_builder is None:
+            for address in line_addresses:
+                if address not in self.line_models:
+                    self.line_models[address] = self.build_line(address)
+        else:
+            self.request_line_models(line_addresses)
 
-        data = self.get_bytes(
-            self.start_offset,
-            self.start_offset + self.area.number_of_lines_on_screen() * self.area.bytes_per_line
-        )
+        data = []
+        labels = []
+        for address in line_addresses:
+            line = self.line_models.get(address)
+            if line is None:
+                # Shown as before or empty until the model builder is done with it
+                line = self.stale_line_models.get(address)
+                if line is None or len(line.bytes) != bytes_per_line:
+                    line = LineModel('', [DisplayByte('  ', None, False, [], [], [])] * bytes_per_line)
+            labels.append(line.label)
+            for (i, display_byte) in enumerate(line.bytes):
+                if self.is_selected(address + i):
+                    display_byte = replace(display_byte, is_selected=True)
+                data.append(display_byte)
 
         self.area.display_data = data
+        self.area.display_labels = labels
 
-        # Build labels
-        labels = []
-        for l in range(self.area.number_of_lines_on_screen()):
-            labels.append(self.get_local_label(
-                self.start_offset + l * self.area.bytes_per_line))
+        self.area.update()
 
-        self.area.display_labels = labels
+    def request_line_models(self, line_addresses: List[int]) -> None:
+        '''
+        Requests the missing visible lines and prefetches a screen of lines above and below them
+        '''
+        bytes_per_line = self.area.bytes_per_line
+        screen = len(line_addresses) * bytes_per_line
+        prefetch_start = max(self.start_offset - screen, 0)
+        prefetch_end = self.start_offset + 2 * screen
+
+        # Drop the lines that are far away from the screen
+        keep_start = self.start_offset - 3 * screen
+        keep_end = self.start_offset + 4 * screen
+        if len(self.line_models) > 8 * len(line_addresses):
+            self.line_models = {address: line for (address, line) in self.line_models.items() if keep_start <= address < keep_end}
+        if len(self.stale_line_models) > 8 * len(line_addresses):
+            self.stale_line_models = {address: line for (address, line) in self.stale_line_models.items() if keep_start <= address < keep_end}
+
+        missing = [address for address in line_addresses if address not in self.line_models]
+        # Prefetch the lines closest to the screen first, no matter in which direction the user scrolls
+        below = range(self.start_offset + screen, prefetch_end, bytes_per_line)
+        above = range(self.start_offset - bytes_per_line, prefetch_start - 1, -bytes_per_line)
+        for pair in zip_longest(below, above):
+            missing += [address for address in pair if address is not None and address not in self.line_models]
+
+        # A new request stops the previous one, so only send it if it contains new lines
+        if not self.pending_lines.issuperset(missing):
+            self.pending_lines = set(missing)
+            self.model_builder.request(self, self.generation, missing)
+
+    def slot_line_models_built(self, generation: int, lines: Dict[int, LineModel]) -> None:
+        if generation != self.generation:
+            # Built for relations or databases that changed in the meantime
+            return
+        self.line_models.update(lines)
+        self.pending_lines.difference_update(lines)
+        if len(self.pending_lines) == 0:
+            self.stale_line_models = {}
+        else:
+            for address in lines:
+                self.stale_line_models.pop(address, None)
+        screen = self.area.number_of_lines_on_screen() * self.area.bytes_per_line
+        if any(self.start_offset <= address < self.start_offset + screen for address in lines):
+            self.schedule_update()
+
+    def slot_line_models_failed(self, generation: int, addresses: List[int]) -> None:
+        if generation != self.generation:
+            return
+        # Not pending anymore, so the next update requests them again
+        self.pending_lines.difference_update(addresses)
 
-        self.area.repaint()
+    def build_line(self, virtual_address: int) -> LineModel:
+        '''
+        Builds the line model at the virtual address. Is called by the model builder in its thread.
+        '''
+        return LineModel(
+            self.get_local_label(virtual_address),
+            [self.get_display_byte_for_virtual_address(address, False) for address in range(virtual_address, virtual_address + self.area.bytes_per_line)]
+        )
 
     def get_local_label(self, virtual_address: int) -> str:
         local_address = self.address_resolver.to_local(virtual_address)
@@ -237,7 +355,7 @@ class HexViewerController(QObject):
             range(from_index, to_index)
         ))
 
-    def get_display_byte_for_virtual_address(self, virtual_address: int) -> DisplayByte:
+    def get_display_byte_for_virtual_address(self, virtual_address: int, with_selection: bool = True) -> DisplayByte:
         # TODO test if the cache actually improves performance or is just a memory waste
         # if virtual_address in self.display_byte_cache:
         #     return self.display_byte_cache[virtual_address]
@@ -271,7 +389,7 @@ class HexViewerController(QObject):
         display_byte = DisplayByte(
             '%02X' % byte_value,
             background,
-            self.is_selected(virtual_address),
+            with_selection and self.is_selected(virtual_address),
             self.annotations.get_annotations_at(local_address),
             self.constraints.get_constraints_at(local_address) if self.constraints is not None else [],
             pointers
@@ -321,6 +439,36 @@ class HexViewerController(QObject):
             # TODO error for everything that is not in [0x00000000, 0x00FFFFFF] or [0x08000000, 0x08FFFFFF]
             self.update_cursor(self.address_resolver.to_virtual(local_address))
 
+    def get_search_variants(self) -> List[RomVariant]:
+        '''
+        Returns this variant and, if linked, the other linked variants whose results can be shown here.
+        '''
+        variants = [self.rom_variant]
+        if self.is_linked and isinstance(self.address_resolver, LinkedAddressResolver):
+            variants += sorted(variant for variant in self.address_resolver.constraint_manager.variants if variant != self.rom_variant)
+        return variants
+
+    def slot_show_search_dialog(self) -> None:
+        if self.search_dialog is None:
+            self.search_dialog = SearchDialog(self.dock, self.get_search_variants())
+            self.search_dialog.signal_result_activated.connect(self.slot_go_to_search_result)
+        else:
+            self.search_dialog.set_variants(self.get_search_variants())
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.activateWindow()
+
+    def slot_go_to_search_result(self, variant: RomVariant, local_address: int, length: int) -> None:
+        if variant == self.rom_variant:
+            virtual_address = self.address_resolver.to_virtual(local_address)
+        elif isinstance(self.address_resolver, LinkedAddressResolver):
+            # Results of the other linked variants are at the same virtual address
+            virtual_address = self.address_resolver.constraint_manager.to_virtual(variant, local_address)
+        else:
+            return
+        self.update_cursor(virtual_address)
+        self.update_selected_bytes(length)
+
     def update_start_offset(self, virtual_address: int) -> None:
         if self.is_linked:
             if self.start_offset != virtual_address:
@@ -331,7 +479,7 @@ class HexViewerController(QObject):
     def set_start_offset(self, virtual_address: int) -> None:
         self.start_offset = virtual_address
         self.scroll_bar.setValue(virtual_address//self.area.bytes_per_line)
-        self.update_hex_area()
+        self.schedule_update()
 
     def update_cursor(self, virtual_address: int) -> None:
         if self.is_linked:
@@ -344,7 +492,7 @@ class HexViewerController(QObject):
     def set_cursor(self, virtual_address: int) -> None:
         self.cursor = virtual_address
         self.update_status_bar()
-        self.update_hex_area()
+        self.schedule_update()
         if self.selected_bytes != self.default_selection_size:
             self.update_selected_bytes(self.default_selection_size)
 
@@ -360,7 +508,7 @@ class HexViewerController(QObject):
     def set_selected_bytes(self, selected_bytes: int) -> None:
         self.selected_bytes = selected_bytes
         self.update_status_bar()
-        self.update_hex_area()
+        self.schedule_update()
 
     def slot_update_selection_from_offset(self, offset: int) -> None:
         cursor = offset + self.start_offset
@@ -514,6 +662,7 @@ class HexViewerController(QObject):
                            self.mark_only_in_current)
 
         menu.addAction('Goto', self.slot_show_goto_dialog)
+        menu.addAction('Search', self.slot_show_search_dialog)
 
         # Allow plugins to add context menu entries by registering a context menu handler
         for handler in self.contextmenu_handlers:
@@ -680,7 +829,7 @@ class HexViewerController(QObject):
 
     def slot_on_resize(self) -> None:
         self.setup_scroll_bar()
-        self.update_hex_area()
+        self.schedule_update()
 
 
     def is_diffing_and_not_pointer(self, virtual_address: int) -> None:
@@ -1,10 +1,11 @@
 from dataclasses import dataclass
-from typing import List, Optional
-from PySide6.QtCore import QObject
+from typing import List, Optional, Tuple
+from PySide6.QtCore import QCoreApplication, QObject, QThread, QTimer, Signal
 from PySide6.QtWidgets import QMessageBox
 from tlh import settings
 from tlh.const import ROM_OFFSET, ROM_SIZE, RomVariant
-from tlh.data.constraints import Constraint, ConstraintManager, InvalidConstraintError, NoConstraintManager
+from tlh.common.ui.progress_dialog import ProgressDialog
+from tlh.data.constraints import Constraint, ConstraintManager, InvalidConstraintError, NoConstraintManager, SolveCancelledError
 from tlh.data.database import get_constraint_database, get_pointer_database
 from tlh.data.pointer import Pointer
 from tlh.data.rom import get_rom
@@ -13,6 +14,8 @@ from tlh.hexviewer.address_resolver import (LinkedAddressResolver,
 from tlh.hexviewer.controller import HexViewerController
 from tlh.hexviewer.diff_calculator import (LinkedDiffCalculator,
                                            NoDiffCalculator)
+from tlh.hexviewer.model_builder import LineModelBuilder
+from tlh.hexviewer.repaint_scheduler import RepaintScheduler
 
 @dataclass
 class LocalAddress:
@@ -32,6 +35,16 @@ class HexViewerManager(QObject):
         self.linked_variants: List[RomVariant] = []
 
         self.contextmenu_handlers = []
+        self.repaint_scheduler = RepaintScheduler(self)
+
+        # Builds the display models of all hex viewers in the background
+        self.model_builder_thread = QThread(self)
+        self.model_builder = LineModelBuilder()
+        self.model_builder.moveToThread(self.model_builder_thread)
+        self.model_builder.signal_lines_built.connect(self.slot_line_models_built)
+        self.model_builder.signal_lines_failed.connect(self.slot_line_models_failed)
+        self.model_builder_thread.start()
+        QCoreApplication.instance().aboutToQuit.connect(self.slot_about_to_quit)
 
         if settings.is_using_constraints():
             self.constraint_manager = ConstraintManager({})
@@ -42,8 +55,16 @@ class HexViewerManager(QObject):
         self.linked_diff_calculator = LinkedDiffCalculator(
             self.constraint_manager, self.linked_variants)
 
+        # The constraints are solved in the background, a new change cancels the running solve
+        self.solve_id = 0
+        self.solve_worker: Optional[SolveConstraintsWorker] = None
+        self.solve_threads: List[Tuple[QThread, SolveConstraintsWorker]] = []
+        self.solve_progress_dialog: Optional[ProgressDialog] = None
+
     def register_controller(self, controller: HexViewerController) -> None:
         self.controllers.append(controller)
+        controller.set_repaint_scheduler(self.repaint_scheduler)
+        controller.set_model_builder(self.model_builder)
         # Link all signals connected to linked viewers
         controller.signal_toggle_linked.connect(
             lambda linked: self.slot_toggle_linked(controller, linked))
@@ -64,6 +85,8 @@ class HexViewerManager(QObject):
         if controller in self.linked_controllers:
             self.unlink(controller)
         self.controllers.remove(controller)
+        self.repaint_scheduler.cancel(controller)
+        self.model_builder.cancel(controller)
 
     def get_controllers_for_variant(self, rom_variant: RomVariant) -> List[HexViewerController]:
         result = []
@@ -72,6 +95,24 @@ class HexViewerManager(QObject):
                 result.append(controller)
         return result
 
+    def slot_about_to_quit(self) -> None:
+        self.stop_solve_threads()
+        self.stop_model_builder()
+
+    def stop_model_builder(self) -> None:
+        for controller in self.controllers:
+            self.model_builder.cancel(controller)
+        self.model_builder_thread.quit()
+        self.model_builder_thread.wait()
+
+    def slot_line_models_built(self, controller: HexViewerController, generation: int, lines) -> None:
+        if controller in self.controllers:
+            controller.slot_line_models_built(generation, lines)
+
+    def slot_line_models_failed(self, controller: HexViewerController, generation: int, addresses) -> None:
+        if controller in self.controllers:
+            controller.slot_line_models_failed(generation, addresses)
+
     def unlink_all(self) -> None:
         '''
         Unlinks all currently linked controllers
@@ -163,27 +204,94 @@ class HexViewerManager(QObject):
 
     def update_constraint_manager(self):
         self.linked_diff_calculator.set_variants(self.linked_variants)
-        self.constraint_manager.set_variants(self.linked_variants)
+        # Keep showing the previous relations until the new ones are solved
+        self.constraint_manager.add_missing_variants(self.linked_variants)
         # TODO this is a workaround for the missing calculation of transitive constraints (i.e. always use the virtual offsets given all variants were linked)
         #self.constraint_manager.set_variants({RomVariant.USA, RomVariant.DEMO, RomVariant.JP, RomVariant.EU})
         self.update_constraints()
 
     def update_constraints(self):
-        if settings.is_using_constraints():
-            print('update constraints')
-            print(self.linked_variants)
-            self.constraint_manager.reset()
-            if len(self.linked_variants) > 1:
-                print('Add constraints')
-                try:
-                    self.constraint_manager.add_all_constraints(
-                        get_constraint_database().get_constraints())
-                except InvalidConstraintError as e:
-                    print(e)
-                    QMessageBox.critical(self.parent(), 'Constraint Error', 'The current constraints are not valid.')
-            for controller in self.linked_controllers:
-                controller.request_repaint()
-                controller.setup_scroll_bar()
+        '''
+        Solves the constraints for the linked variants in the background
+        '''
+        if not settings.is_using_constraints():
+            return
+        self.cancel_solve()
+        self.solve_id += 1
+        solve_id = self.solve_id
+
+        constraints = get_constraint_database().get_constraints() if len(self.linked_variants) > 1 else []
+        # Threads of cancelled solves are kept until they notice it
+        self.solve_threads = [(thread, worker) for (thread, worker) in self.solve_threads if not thread.isFinished()]
+        thread = QThread()
+        worker = SolveConstraintsWorker(solve_id, list(self.linked_variants), list(constraints))
+        worker.moveToThread(thread)
+        self.solve_worker = worker
+        self.solve_threads.append((thread, worker))
+
+        worker.signal_progress.connect(self.slot_solve_progress)
+        worker.signal_done.connect(self.slot_constraints_solved)
+        worker.signal_fail.connect(self.slot_solve_failed)
+        worker.signal_done.connect(thread.quit)
+        worker.signal_fail.connect(thread.quit)
+        worker.signal_cancelled.connect(thread.quit)
+        thread.started.connect(worker.process)
+        thread.start()
+
+        # Only show the progress for solves that take a noticeable time
+        QTimer.singleShot(500, lambda: self.show_solve_progress(solve_id))
+
+    def cancel_solve(self) -> None:
+        if self.solve_worker is not None:
+            self.solve_worker.cancelled = True
+            self.solve_worker = None
+            # A worker that is already done before it notices the cancellation still emits its result
+            self.solve_id += 1
+        self.close_solve_progress()
+
+    def show_solve_progress(self, solve_id: int) -> None:
+        if solve_id != self.solve_id or self.solve_worker is None:
+            return
+        self.solve_progress_dialog = ProgressDialog(self.parent(), 'Constraints', 'Solving constraints...', True)
+        self.solve_progress_dialog.get_abort_signal().connect(self.cancel_solve)
+        self.solve_progress_dialog.show()
+
+    def close_solve_progress(self) -> None:
+        if self.solve_progress_dialog is not None:
+            self.solve_progress_dialog.close()
+            self.solve_progress_dialog = None
+
+    def slot_solve_progress(self, solve_id: int, progress: int) -> None:
+        if solve_id == self.solve_id and self.solve_progress_dialog is not None:
+            self.solve_progress_dialog.set_progress(progress)
+
+    def slot_constraints_solved(self, solve_id: int, manager: ConstraintManager) -> None:
+        if solve_id != self.solve_id:
+            # Another change arrived after this solve was done
+            return
+        self.solve_worker = None
+        self.close_solve_progress()
+
+        local_address = self.collect_local_address()
+        self.constraint_manager.replace_relations(manager)
+        for controller in self.linked_controllers:
+            controller.request_repaint()
+            controller.setup_scroll_bar()
+        if local_address is not None:
+            # Keep the cursor at the same local address with the new relations
+            self.apply_local_address(local_address)
+
+    def slot_solve_failed(self, solve_id: int, message: str) -> None:
+        if solve_id != self.solve_id:
+            return
+        self.solve_worker = None
+        self.close_solve_progress()
+        QMessageBox.critical(self.parent(), 'Constraint Error', message)
+
+    def stop_solve_threads(self) -> None:
+        self.cancel_solve()
+        for (thread, _) in self.solve_threads:
+            thread.wait()
 
     def slot_move_linked_start_offset(self, virtual_address: int) -> None:
         for controller in self.linked_controllers:
@@ -402,4 +510,33 @@ class HexViewerManager(QObject):
     def remove_contextmenu_handler(self, handler) -> None:
         self.contextmenu_handlers.remove(handler)
         for controller in self.controllers:
-            controller.set_contextmenu_handlers(self.contextmenu_handlers)
\ No newline at end of file
+            controller.set_contextmenu_handlers(self.contextmenu_handlers)
+
+
+class SolveConstraintsWorker(QObject):
+    signal_progress = Signal(int, int)
+    signal_done = Signal(int, object)
+    signal_fail = Signal(int, str)
+    signal_cancelled = Signal()
+
+    def __init__(self, solve_id: int, variants: List[RomVariant], constraints: List[Constraint]) -> None:
+        super().__init__()
+        self.solve_id = solve_id
+        self.variants = variants
+        self.constraints = constraints
+        # Set from the UI thread when another change arrives
+        self.cancelled = False
+
+    def process(self) -> None:
+        try:
+            manager = ConstraintManager(set(self.variants))
+            manager.add_all_constraints(self.constraints, lambda progress: self.signal_progress.emit(self.solve_id, progress), lambda: self.cancelled)
+            self.signal_done.emit(self.solve_id, manager)
+        except SolveCancelledError:
+            self.signal_cancelled.emit()
+        except InvalidConstraintError as e:
+            print(e)
+            self.signal_fail.emit(self.solve_id, 'The current constraints are not valid.')
+        except Exception as e:
+            print(e)
+            self.signal_fail.emit(self.solve_id, 'Caught exception')
@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from typing import Dict, List
+from PySide6.QtCore import QObject, Signal
+from tlh.hexviewer.display_byte import DisplayByte
+
+
+@dataclass
+class LineModel:
+    '''
+    Label and bytes of one line of a hex viewer. The selection is not part of it, as it changes too often.
+    '''
+    label: str
+    bytes: List[DisplayByte]
+
+
+class LineModelBuilder(QObject):
+    '''
+    Builds the line models of the hex viewers in a background thread.
+    A controller needs a generation that it increases whenever its line models become invalid
+    and a build_line(virtual_address) method that only reads its state.
+    '''
+    signal_build_requested = Signal(object, int, int, object)
+    # controller, generation, {virtual_address: LineModel}
+    signal_lines_built = Signal(object, int, object)
+    # controller, generation, [virtual_address] of the lines that were not built
+    signal_lines_failed = Signal(object, int, object)
+
+    # Number of lines that are sent to the controller at once
+    CHUNK_SIZE = 16
+
+    def __init__(self) -> None:
+        super().__init__()
+        # The newest request for each controller, requests that are superseded are stopped
+        self.latest_requests: Dict[object, int] = {}
+        self.request_count = 0
+        self.signal_build_requested.connect(self.build)
+
+    def request(self, controller, generation: int, addresses: List[int]) -> None:
+        '''
+        Requests the lines at the addresses. Called from the UI thread.
+        '''
+        self.request_count += 1
+        self.latest_requests[controller] = self.request_count
+        self.signal_build_requested.emit(controller, generation, self.request_count, addresses)
+
+    def cancel(self, controller) -> None:
+        self.latest_requests.pop(controller, None)
+
+    def is_current(self, controller, generation: int, request_id: int) -> bool:
+        return self.latest_requests.get(controller) == request_id and controller.generation == generation
+
+    def build(self, controller, generation: int, request_id: int, addresses: List[int]) -> None:
+        lines = {}
+        for (i, address) in enumerate(addresses):
+            if not self.is_current(controller, generation, request_id):
+                return
+            try:
+                lines[address] = controller.build_line(address)
+            except Exception as e:
+                # The relations or databases changed while building, the controller can request the remaining lines again
+                print(f'Could not build line at {hex(address)}: {e}')
+                if lines:
+                    self.signal_lines_built.emit(controller, generation, lines)
+                self.signal_lines_failed.emit(controller, generation, addresses[i:])
+                return
+            if len(lines) >= self.CHUNK_SIZE:
+                self.signal_lines_built.emit(controller, generation, lines)
+                lines = {}
+        if lines:
+            self.signal_lines_built.emit(controller, generation, lines)
+
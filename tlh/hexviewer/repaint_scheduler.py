@@ -0,0 +1,66 @@
+from collections import deque
+import time
+from typing import Deque, Dict
+from PySide6.QtCore import QObject, Qt, QTimer
+
+
+class RepaintScheduler(QObject):
+    '''
+    Coalesces the updates of the hex viewers, so that each one rebuilds its display model at most once per frame.
+    Scrolling a linked viewer moves all linked viewers and wheel events can arrive several times per frame.
+    '''
+
+    # One frame at 60 Hz
+    FRAME_INTERVAL = 16
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent=parent)
+        # Used as an ordered set, so that the viewers are rebuilt in the order they were scheduled
+        self.dirty: Dict[object, None] = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setInterval(self.FRAME_INTERVAL)
+        self.timer.timeout.connect(self.flush)
+
+        # Instrumentation
+        self.rebuild_count = 0
+        self.schedule_count = 0
+        self.rebuild_times: Deque[float] = deque()
+
+    def schedule(self, controller) -> None:
+        '''
+        Marks the controller as dirty. Its display model is rebuilt on the next tick.
+        '''
+        self.schedule_count += 1
+        self.dirty[controller] = None
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def cancel(self, controller) -> None:
+        self.dirty.pop(controller, None)
+
+    def flush(self) -> None:
+        '''
+        Rebuilds the display models of all dirty controllers now.
+        '''
+        self.timer.stop()
+        # Rebuilding can schedule other controllers again, those are rebuilt on the next tick
+        (dirty, self.dirty) = (self.dirty, {})
+        now = time.perf_counter()
+        for controller in dirty:
+            controller.update_hex_area()
+            self.rebuild_count += 1
+            self.rebuild_times.append(now)
+        self.drop_old_rebuild_times(now)
+
+    def drop_old_rebuild_times(self, now: float) -> None:
+        while self.rebuild_times and self.rebuild_times[0] < now - 1:
+            self.rebuild_times.popleft()
+
+    def get_rebuilds_per_second(self) -> int:
+        '''
+        Returns the number of display models that were rebuilt during the last second.
+        '''
+        self.drop_old_rebuild_times(time.perf_counter())
+        return len(self.rebuild_times)
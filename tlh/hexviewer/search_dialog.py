@@ -0,0 +1,112 @@
+import time
+from typing import List, Optional, Tuple
+from PySide6.QtCore import Signal
+from PySide6.QtWidgets import QDialog, QListWidgetItem
+from tlh.const import ROM_OFFSET, RomVariant
+from tlh.data.database import get_symbol_database
+from tlh.data.rom_index import RomIndex, SearchError, SearchPattern, get_cached_rom_index, load_rom_index_in_background, parse_hex_pattern, parse_string_pattern, parse_value_pattern
+from tlh.ui.ui_search_dialog import Ui_SearchDialog
+
+PATTERN_TYPES = {
+    'Bytes': parse_hex_pattern,
+    'String': parse_string_pattern,
+    '32 bit value': parse_value_pattern,
+}
+
+
+class SearchDialog(QDialog):
+    '''
+    Searches the roms of the variants for bytes with ?? as wildcards, strings and 32 bit values.
+    '''
+
+    # variant, local address, length
+    signal_result_activated = Signal(object, int, int)
+
+    MAX_RESULTS = 1000
+
+    def __init__(self, parent, variants: List[RomVariant]) -> None:
+        super().__init__(parent=parent)
+        self.ui = Ui_SearchDialog()
+        self.ui.setupUi(self)
+        self.ui.comboBoxType.addItems(list(PATTERN_TYPES))
+
+        self.variants: List[RomVariant] = []
+        # (variant, local address, length) for each row of the results
+        self.results: List[Tuple[RomVariant, int, int]] = []
+        self.set_variants(variants)
+        self.ui.pushButtonSearch.clicked.connect(self.slot_search)
+        self.ui.lineEditPattern.returnPressed.connect(self.slot_search)
+        self.ui.listWidgetResults.itemActivated.connect(self.slot_result_activated)
+
+        # Search that waits for the index of its variant
+        self.pending: Optional[tuple] = None
+
+    def set_variants(self, variants: List[RomVariant]) -> None:
+        current = self.get_variant()
+        self.variants = variants
+        self.ui.comboBoxVariant.clear()
+        self.ui.comboBoxVariant.addItems([variant.value for variant in variants])
+        if current in variants:
+            self.ui.comboBoxVariant.setCurrentIndex(variants.index(current))
+
+    def get_variant(self) -> Optional[RomVariant]:
+        index = self.ui.comboBoxVariant.currentIndex()
+        return self.variants[index] if 0 <= index < len(self.variants) else None
+
+    def get_pattern(self) -> SearchPattern:
+        return PATTERN_TYPES[self.ui.comboBoxType.currentText()](self.ui.lineEditPattern.text())
+
+    def slot_search(self) -> None:
+        variant = self.get_variant()
+        if variant is None:
+            return
+        try:
+            pattern = self.get_pattern()
+        except SearchError as e:
+            self.ui.labelStatus.setText(str(e))
+            return
+
+        index = get_cached_rom_index(variant)
+        if index is not None:
+            self.search(variant, index, pattern)
+            return
+        self.pending = (variant, pattern)
+        self.ui.labelStatus.setText(f'Indexing the {variant.value} rom...')
+        self.ui.pushButtonSearch.setEnabled(False)
+        load_rom_index_in_background(variant, self.slot_index_loaded, self.slot_index_failed)
+
+    def slot_index_loaded(self, index: RomIndex) -> None:
+        self.ui.pushButtonSearch.setEnabled(True)
+        if self.pending is None:
+            return
+        (variant, pattern) = self.pending
+        self.pending = None
+        self.search(variant, index, pattern)
+
+    def slot_index_failed(self, error: str) -> None:
+        self.ui.pushButtonSearch.setEnabled(True)
+        self.pending = None
+        self.ui.labelStatus.setText(f'Could not index the rom: {error}')
+
+    def search(self, variant: RomVariant, index: RomIndex, pattern: SearchPattern) -> None:
+        start = time.perf_counter()
+        results = index.search(pattern, self.MAX_RESULTS)
+        duration = time.perf_counter() - start
+
+        symbols = get_symbol_database().get_symbols(variant) if get_symbol_database().are_symbols_loaded(variant) else None
+        found_symbols = symbols.get_symbols_at(results) if symbols is not None else {}
+
+        self.ui.listWidgetResults.clear()
+        self.results = [(variant, address, len(pattern)) for address in results]
+        for address in results:
+            text = hex(address + ROM_OFFSET)
+            symbol = found_symbols.get(address)
+            if symbol is not None:
+                text += f'  {symbol.name} + {hex(address - symbol.address)}'
+            self.ui.listWidgetResults.addItem(text)
+        more = '+' if len(results) >= self.MAX_RESULTS else ''
+        self.ui.labelStatus.setText(f'{len(results)}{more} results in {variant.value} ({duration * 1000:.2f} ms)')
+
+    def slot_result_activated(self, item: QListWidgetItem) -> None:
+        (variant, address, length) = self.results[self.ui.listWidgetResults.row(item)]
+        self.signal_result_activated.emit(variant, address, length)
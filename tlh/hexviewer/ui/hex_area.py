@@ -1,4 +1,5 @@
 
+from collections import OrderedDict
 from enum import Enum
 from tlh.hexviewer.display_byte import DisplayByte
 from tlh.data.constraints import Constraint
@@ -6,14 +7,14 @@ from tlh.data.annotations import Annotation
 from tlh.data.database import get_annotation_database, get_constraint_database, get_pointer_database
 from tlh.data.pointer import Pointer
 from tlh.const import ROM_OFFSET
-from PySide6.QtCore import QEvent, QPoint, Qt, Signal
-from PySide6.QtGui import QColor, QContextMenuEvent, QFont, QKeyEvent, QKeySequence, QMouseEvent, QPainter, QPen, QResizeEvent, QShortcut
+from PySide6.QtCore import QEvent, QLine, QPoint, QRect, Qt, Signal
+from PySide6.QtGui import QColor, QContextMenuEvent, QFont, QFontMetrics, QKeyEvent, QKeySequence, QMouseEvent, QPainter, QPen, QPixmap, QResizeEvent, QShortcut, QStaticText
 from PySide6.QtWidgets import QApplication, QInputDialog, QMenu, QToolTip, QWidget
 from tlh.hexviewer.edit_annotation_dialog import EditAnnotationDialog
 from tlh.hexviewer.edit_constraint_dialog import EditConstraintDialog
 from tlh.hexviewer.edit_pointer_dialog import EditPointerDialog
 from tlh import settings
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 
 class KeyType(Enum):
@@ -27,6 +28,69 @@ class KeyType(Enum):
     END = 8
 
 
+class GlyphAtlas:
+    '''
+    Caches the laid out text of the byte values and labels as well as the rendered text of whole lines of bytes.
+    Scrolling moves most lines without changing their text, so they can be drawn from the cache.
+    '''
+
+    # Labels change while scrolling, so the caches are cleared once they get this large
+    MAX_GLYPHS = 4096
+    MAX_ROWS = 1024
+
+    def __init__(self, font: QFont, color: QColor) -> None:
+        self.font = font
+        self.color = color
+        metrics = QFontMetrics(font)
+        self.ascent = metrics.ascent()
+        self.height = metrics.height()
+        self.glyphs: Dict[str, QStaticText] = {}
+        self.widths: Dict[str, int] = {}
+        self.rows: OrderedDict[Tuple, QPixmap] = OrderedDict()
+        for value in range(256):
+            self.get('%02X' % value)
+
+    def get(self, text: str) -> QStaticText:
+        glyph = self.glyphs.get(text)
+        if glyph is None:
+            if len(self.glyphs) >= self.MAX_GLYPHS:
+                self.glyphs.clear()
+            glyph = QStaticText(text)
+            glyph.setTextFormat(Qt.PlainText)
+            glyph.prepare(font=self.font)
+            self.glyphs[text] = glyph
+        return glyph
+
+    def get_width(self, text: str) -> int:
+        width = self.widths.get(text)
+        if width is None:
+            width = QFontMetrics(self.font).horizontalAdvance(text)
+            self.widths[text] = width
+        return width
+
+    def get_row(self, texts: Tuple[str, ...], byte_width: int, device_pixel_ratio: float) -> QPixmap:
+        key = (texts, byte_width, device_pixel_ratio)
+        row = self.rows.get(key)
+        if row is not None:
+            self.rows.move_to_end(key)
+            return row
+
+        row = QPixmap(int(len(texts) * byte_width * device_pixel_ratio), int(self.height * device_pixel_ratio))
+        row.setDevicePixelRatio(device_pixel_ratio)
+        row.fill(Qt.transparent)
+        p = QPainter(row)
+        p.setFont(self.font)
+        p.setPen(self.color)
+        for (i, text) in enumerate(texts):
+            p.drawStaticText(i * byte_width, 0, self.get(text))
+        p.end()
+
+        self.rows[key] = row
+        if len(self.rows) > self.MAX_ROWS:
+            self.rows.popitem(last=False)
+        return row
+
+
 class HexAreaWidget (QWidget):
     '''
     Responsible for painting the area that actually containts the hex display
@@ -61,6 +125,7 @@ class HexAreaWidget (QWidget):
         self.font = QFont('DejaVu Sans Mono, Courier, Monospace', 12)
         self.label_color = QColor(128, 128, 128)
         self.byte_color = QColor(210, 210, 210)
+        self.glyphs = GlyphAtlas(self.font, self.byte_color)
         self.selection_color = QPen(QColor(97, 175, 239))
         self.selection_color.setWidth(2)
         self.annotation_pen = QPen(QColor(0,0,0), 2)
@@ -92,65 +157,77 @@ class HexAreaWidget (QWidget):
         if length % self.bytes_per_line > 0:
             num_rows += 1
 
-        for l in range(num_rows):
-            p.setPen(self.label_color)
-            # Draw address label
-            # self.instance.get_local_label(self.start_offset + l * self.bytes_per_line)
-            position_string = self.display_labels[l]
-            p.drawText(QPoint(self.label_offset_x, (l + 1)
-                       * self.line_height), position_string)
+        # Collect everything by style first, so that the painter state only changes once per style
+        backgrounds: Dict[int, List[QRect]] = {}
+        selection_rects: List[QRect] = []
+        annotation_lines: Dict[int, List[QLine]] = {}
+        enabled_constraint_lines: List[QLine] = []
+        disabled_constraint_lines: List[QLine] = []
+        rows: List[Tuple[int, Tuple[str, ...]]] = []
 
-            for i in range(0, min(self.bytes_per_line, length - self.bytes_per_line * l)):
-
-                #virtual_address = self.start_offset + l*self.bytes_per_line + i
+        for l in range(num_rows):
+            line_top = l * self.line_height
+            text_top = (l + 1) * self.line_height - self.glyphs.ascent
+            row_bytes = self.display_data[l * self.bytes_per_line:(l + 1) * self.bytes_per_line]
+            rows.append((text_top, tuple(current_byte.text for current_byte in row_bytes)))
 
-                p.setPen(self.byte_color)
+            for (i, current_byte) in enumerate(row_bytes):
+                x = self.label_length + i * self.byte_width
 
-                current_byte = self.display_data[i + l*self.bytes_per_line]
                 if current_byte.background is not None:
-                    p.setBackground(current_byte.background)
-                    p.setBackgroundMode(Qt.OpaqueMode)
-
-                p.drawText(QPoint(self.label_length + i * self.byte_width, (l+1)
-                           * self.line_height), current_byte.text)
-                p.setBackgroundMode(Qt.TransparentMode)
+                    backgrounds.setdefault(current_byte.background.rgba(), []).append(
+                        QRect(x, text_top, self.glyphs.get_width(current_byte.text), self.glyphs.height))
 
                 # Draw selection rects
                 if current_byte.is_selected:
-                    p.setPen(self.selection_color)
-                    p.drawRect(
-                        # TODO make these offsets configurable/dependent on font?
-                        self.label_length + i * self.byte_width - 3,
-                        (l) * self.line_height + 3,
-                        self.byte_width,
-                        self.line_height
-                    )
-                
+                    # TODO make these offsets configurable/dependent on font?
+                    selection_rects.append(QRect(x - 3, line_top + 3, self.byte_width, self.line_height))
+
                 # Draw annotation underlines
-                if len(current_byte.annotations) > 0:
-                    y_offset = 0
+                if current_byte.annotations:
+                    y = (l+1) * self.line_height + 2
                     for annotation in current_byte.annotations:
-                        self.annotation_pen.setColor(annotation.color)
-                        p.setPen(self.annotation_pen)
-                        x = self.label_length + i * self.byte_width
-                        y = (l+1) * self.line_height + y_offset + 2
-                        p.drawLine(x, y, x+self.byte_width, y)
-                        y_offset += 2
+                        annotation_lines.setdefault(annotation.color.rgba(), []).append(QLine(x, y, x+self.byte_width, y))
+                        y += 2
 
                 # Draw constraint pipes
-                if len(current_byte.constraints) > 0:
-                    enabled = False
-                    for constraint in current_byte.constraints:
-                        if constraint.enabled:
-                            enabled = True
-                            break
-                    if enabled:
-                        p.setPen(self.enabled_constraint_pen)
+                if current_byte.constraints:
+                    pipe = QLine(x - 2, line_top + 3, x - 2, line_top + 3 + self.line_height)
+                    if any(constraint.enabled for constraint in current_byte.constraints):
+                        enabled_constraint_lines.append(pipe)
                     else:
-                        p.setPen(self.disabled_constraint_pen)
-                    x = self.label_length + i * self.byte_width - 2
-                    y = (l) * self.line_height + 3
-                    p.drawLine(x, y, x, y+self.line_height)
+                        disabled_constraint_lines.append(pipe)
+
+        p.setPen(Qt.NoPen)
+        for (color, rects) in backgrounds.items():
+            p.setBrush(QColor.fromRgba(color))
+            p.drawRects(rects)
+        p.setBrush(Qt.NoBrush)
+
+        # Draw address labels
+        p.setPen(self.label_color)
+        for l in range(num_rows):
+            p.drawStaticText(self.label_offset_x, (l + 1) * self.line_height - self.glyphs.ascent, self.glyphs.get(self.display_labels[l]))
+
+        device_pixel_ratio = self.devicePixelRatioF()
+        for (text_top, texts) in rows:
+            p.drawPixmap(self.label_length, text_top, self.glyphs.get_row(texts, self.byte_width, device_pixel_ratio))
+
+        if selection_rects:
+            p.setPen(self.selection_color)
+            p.drawRects(selection_rects)
+
+        for (color, lines) in annotation_lines.items():
+            self.annotation_pen.setColor(QColor.fromRgba(color))
+            p.setPen(self.annotation_pen)
+            p.drawLines(lines)
+
+        if enabled_constraint_lines:
+            p.setPen(self.enabled_constraint_pen)
+            p.drawLines(enabled_constraint_lines)
+        if disabled_constraint_lines:
+            p.setPen(self.disabled_constraint_pen)
+            p.drawLines(disabled_constraint_lines)
 
     def number_of_lines_on_screen(self):
         # +1 to draw cutof lines as well
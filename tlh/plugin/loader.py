@@ -3,15 +3,13 @@ import os
 from importlib import import_module, reload
 from typing import List, Optional
 from tlh import settings
+from tlh.common.startup_profiler import measure
 from tlh.plugin.api import PluginApi
+from tlh.plugin.manifest import main_module, manifest_file, plugin_folder, read_manifest
 import inspect
 import traceback
 import sys
 
-plugin_folder = './plugins'
-main_module = '__plugin__'
-
-
 @dataclass
 class Plugin:
     name: str
@@ -47,17 +45,45 @@ def load_plugins(main_window):
         if not os.path.isdir(location) or not main_module + '.py' in os.listdir(location):
             print(f'{main_module}.py not found in plugin {i}')
             continue
-        try:
-            mod = import_module('plugins.' + i + '.' + main_module)
-        except Exception as e:
-            print(f'Exception occurred during loading plugin {i}:')
-            traceback.print_exc()
+        with measure(f'plugin {i}'):
+            manifest = read_manifest(i)
+            if manifest is not None:
+                initialize_plugin_from_manifest(i, manifest, plugins)
+                continue
+            try:
+                mod = import_module('plugins.' + i + '.' + main_module)
+            except Exception as e:
+                print(f'Exception occurred during loading plugin {i}:')
+                traceback.print_exc()
+                continue
 
-        initialize_plugin(i, mod, plugins)
+            initialize_plugin(i, mod, plugins)
 
     # return plugins
 
 
+def initialize_plugin_from_manifest(i: str, manifest: dict, plugins: List[Plugin]) -> None:
+    if manifest.get('hidden', False):
+        # Hidden plugins cannot be loaded and are not displayed
+        return
+
+    plugin = Plugin(manifest['name'], manifest['description'],
+                    manifest['class'], i, False, None, None, None)
+    plugins.append(plugin)
+
+    if settings.is_plugin_enabled(plugin.get_settings_name()):
+        enable_plugin(plugin)
+
+
+def import_plugin(plugin: Plugin) -> None:
+    '''
+    Imports the main module of a plugin that was only initialized from its manifest.
+    '''
+    with measure(f'import {plugin.pkg_name}'):
+        plugin.mod = import_module('plugins.' + plugin.pkg_name + '.' + main_module)
+    plugin.cls = getattr(plugin.mod, plugin.class_name)
+
+
 def initialize_plugin(i: str, mod: any, plugins: List[Plugin]) -> None:
     clsmembers = inspect.getmembers(mod, inspect.isclass)
 
@@ -92,9 +118,12 @@ def initialize_plugin(i: str, mod: any, plugins: List[Plugin]) -> None:
 
 def enable_plugin(plugin: Plugin) -> bool:
     try:
-        plugin.instance = plugin.cls(api)
-        if (hasattr(plugin.instance, 'load')):
-            plugin.instance.load()
+        if plugin.cls is None:
+            import_plugin(plugin)
+        with measure(f'load {plugin.pkg_name}'):
+            plugin.instance = plugin.cls(api)
+            if (hasattr(plugin.instance, 'load')):
+                plugin.instance.load()
         plugin.enabled = True
         return True
     except Exception as e:
@@ -145,6 +174,12 @@ def reload_plugins() -> None:
 
     # Reload all modules
     for (pkg_name, mod) in old_modules:
+        manifest = read_manifest(pkg_name)
+        if mod is None:
+            # Never imported, so there is nothing to reload
+            if manifest is not None:
+                initialize_plugin_from_manifest(pkg_name, manifest, plugins)
+            continue
         # Reload any children of this module first
         children = []
 
@@ -159,7 +194,10 @@ def reload_plugins() -> None:
                 reload(sys.modules[child])
             print(f'Reloading {mod.__name__}')
             mod = reload(mod)
-            initialize_plugin(pkg_name, mod, plugins)
+            if manifest is not None:
+                initialize_plugin_from_manifest(pkg_name, manifest, plugins)
+            else:
+                initialize_plugin(pkg_name, mod, plugins)
         except Exception as e:
             print(f'Exception occurred during reloading plugins:')
             traceback.print_exc()
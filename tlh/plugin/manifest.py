@@ -0,0 +1,30 @@
+import json
+import os
+from typing import Optional
+
+# Reading the manifests does not need Qt, so that the plugins can be listed without importing the hex viewer
+
+plugin_folder = './plugins'
+main_module = '__plugin__'
+# Metadata of the plugin, so that the main module only needs to be imported once the plugin is enabled
+manifest_file = 'plugin.json'
+
+
+def read_manifest(pkg_name: str) -> Optional[dict]:
+    '''
+    Returns the manifest of the plugin or None if it does not have one.
+    '''
+    path = os.path.join(plugin_folder, pkg_name, manifest_file)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f'Invalid {manifest_file} in plugin {pkg_name}: {e}')
+        return None
+    for key in ['class', 'name', 'description']:
+        if key not in manifest:
+            print(f'{manifest_file} of plugin {pkg_name} is missing key "{key}"')
+            return None
+    return manifest
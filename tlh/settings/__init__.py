@@ -1,34 +1,71 @@
 from tlh.common.ui.layout import Layout
 from tlh.const import RomVariant
-from PySide6.QtCore import QSettings, Signal
+from PySide6.QtCore import QObject, QSettings, Signal
 from getpass import getuser
 import multiprocessing
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 import os
 
 settings = QSettings('octorock', 'the-little-hat')
 
-# TODO introduce caching of settings values
+
+class SettingsNotifier(QObject):
+    '''
+    Emits signal_changed with the key of each setting whose value changed
+    '''
+    signal_changed = Signal(str)
+
+
+notifier = SettingsNotifier()
+
+# Typed values by their key, so that settings read on hot paths do not hit QSettings every time
+cache: Dict[str, Any] = {}
+
+
+def to_bool(value) -> bool:
+    return str(value).lower() == 'true'
+
+
+def get_cached(key: str, default: Any, convert: Callable[[Any], Any] = lambda value: value) -> Any:
+    if key not in cache:
+        cache[key] = convert(settings.value(key, default))
+    return cache[key]
+
+
+def set_cached(key: str, value: Any, convert: Callable[[Any], Any] = lambda value: value) -> None:
+    old_value = cache.get(key)
+    settings.setValue(key, value)
+    cache[key] = convert(value)
+    if old_value != cache[key]:
+        notifier.signal_changed.emit(key)
+
+
+def invalidate_cache() -> None:
+    '''
+    Reads all settings from QSettings again, e.g. after they were changed by another instance
+    '''
+    cache.clear()
+
 
 # General
 def get_username() -> str:
-    return settings.value('username', getuser())
+    return get_cached('username', getuser())
 
 
 def set_username(username: str) -> None:
-    settings.setValue('username', username)
+    set_cached('username', username)
 
 
 def get_repo_location() -> str:
-    return settings.value('repo_location', '../tmc')
+    return get_cached('repo_location', '../tmc')
 
 
 def set_repo_location(repo: str) -> None:
-    settings.setValue('repo_location', repo)
+    set_cached('repo_location', repo)
 
 
 def get_build_command():
-    command = settings.value('build_command', '__default__')
+    command = get_cached('build_command', '__default__')
     if command == '__default__':
         # Build command using cpu count
         command = 'make -j' + str(multiprocessing.cpu_count())
@@ -36,51 +73,51 @@ def get_build_command():
 
 
 def set_build_command(command):
-    settings.setValue('build_command', command)
+    set_cached('build_command', command)
 
 
 def get_tidy_command():
-    return settings.value('tidy_command', 'make tidy')
+    return get_cached('tidy_command', 'make tidy')
 
 
 def set_tidy_command(command):
-    settings.setValue('tidy_command', command)
+    set_cached('tidy_command', command)
 
 def get_default_selection_size() -> int:
-    return int(settings.value('default_selection_size', 1))
+    return get_cached('default_selection_size', 1, int)
 
 def set_default_selection_size(size: int) -> None:
-    settings.setValue('default_selection_size', size)
+    set_cached('default_selection_size', size, int)
 
 def is_always_load_symbols() -> bool:
-    return str(settings.value('always_load_symbols', False)).lower() == 'true'
+    return get_cached('always_load_symbols', False, to_bool)
 
 def set_always_load_symbols(load_symbols: bool) -> None:
-    settings.setValue('always_load_symbols', load_symbols)
+    set_cached('always_load_symbols', load_symbols, to_bool)
 
 def is_highlight_8_bytes() -> bool:
-    return str(settings.value('highlight_8_bytes', False)).lower() == 'true'
+    return get_cached('highlight_8_bytes', False, to_bool)
 
 def set_highlight_8_bytes(highlight: bool) -> None:
-    settings.setValue('highlight_8_bytes', highlight)
+    set_cached('highlight_8_bytes', highlight, to_bool)
 
 def get_bytes_per_line() -> int:
-    return int(settings.value('bytes_per_line', 16))
+    return get_cached('bytes_per_line', 16, int)
 
 def set_bytes_per_line(bytes_per_line: int) -> None:
-    settings.setValue('bytes_per_line', bytes_per_line)
+    set_cached('bytes_per_line', bytes_per_line, int)
 
 def is_auto_save() -> bool:
-    return str(settings.value('auto_save', True)).lower() == 'true'
+    return get_cached('auto_save', True, to_bool)
 
 def set_auto_save(auto_save: bool) -> None:
-    settings.setValue('auto_save', auto_save)
+    set_cached('auto_save', auto_save, to_bool)
 
 def is_using_constraints() -> bool:
-    return str(settings.value('use_constraints', False)).lower() == 'true'
+    return get_cached('use_constraints', False, to_bool)
 
 def set_is_using_constrings(use_constraints: bool) -> None:
-    settings.setValue('use_constraints', use_constraints)
+    set_cached('use_constraints', use_constraints, to_bool)
 
 # ROMs
 
@@ -110,42 +147,42 @@ def get_rom(variant: RomVariant) -> Optional[str]:
 
 
 def get_rom_usa():
-    return settings.value('rom_usa')
+    return get_cached('rom_usa', None)
 
 
 def set_rom_usa(rom):
-    settings.setValue('rom_usa', rom)
+    set_cached('rom_usa', rom)
 
 
 def get_rom_demo():
-    return settings.value('rom_demo')
+    return get_cached('rom_demo', None)
 
 
 def set_rom_demo(rom):
-    settings.setValue('rom_demo', rom)
+    set_cached('rom_demo', rom)
 
 
 def get_rom_eu():
-    return settings.value('rom_eu')
+    return get_cached('rom_eu', None)
 
 
 def set_rom_eu(rom):
-    settings.setValue('rom_eu', rom)
+    set_cached('rom_eu', rom)
 
 
 def get_rom_jp():
-    return settings.value('rom_jp')
+    return get_cached('rom_jp', None)
 
 
 def set_rom_jp(rom):
-    settings.setValue('rom_jp', rom)
+    set_cached('rom_jp', rom)
 
 
 def get_rom_demo_jp():
-    return settings.value('rom_demo_jp')
+    return get_cached('rom_demo_jp', None)
 
 def set_rom_demo_jp(rom):
-    settings.setValue('rom_demo_jp', rom)
+    set_cached('rom_demo_jp', rom)
 
 # Layouts
 
@@ -191,16 +228,12 @@ def set_layouts(layouts: List[Layout]):
         settings.setValue('geometry', layouts[i].geometry)
         settings.setValue('dock_state', layouts[i].dock_state)
     settings.endArray()
+    notifier.signal_changed.emit('layouts')
 
 
 def is_plugin_enabled(name: str) -> bool:
-    settings.beginGroup('plugins')
-    enabled = str(settings.value(name, False)).lower() == 'true'
-    settings.endGroup()
-    return enabled
+    return get_cached('plugins/' + name, False, to_bool)
 
 def set_plugin_enabled(name: str, enabled: bool) -> None:
-    settings.beginGroup('plugins')
-    settings.setValue(name, enabled)
-    settings.endGroup()
+    set_cached('plugins/' + name, enabled, to_bool)
 